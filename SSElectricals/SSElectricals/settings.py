@@ -66,6 +66,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "django.contrib.sites",  # Required for allauth
+    "django.contrib.postgres",  # Full-text / trigram product search
     
     # Django Allauth
     "allauth",
@@ -105,6 +106,7 @@ TEMPLATES = [
                 "django.contrib.messages.context_processors.messages",
                 "django.template.context_processors.media",
                 "firstApp.context_processors.site_announcements",
+                "firstApp.context_processors.header_summary",
             ],
         },
     },
@@ -141,6 +143,25 @@ else:
     }
 
 
+# Cache
+# Shared cache for version counters (typeahead index, cached fragments).
+# Set REDIS_URL in production so all gunicorn workers see the same versions;
+# without it each process falls back to its own local-memory cache.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -1,14 +1,21 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.signals import user_logged_in, user_logged_out
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db.models.signals import post_init, post_save, post_delete, pre_save
+from django.db import transaction
 from django.dispatch import receiver
 from .models import (
     CustomUser, Category, Product, ProductImage, Cart, CartItem, Order, OrderItem,
     AdminSession, AdminActivityLog, Appointment, DailySales, DailyExpenditure, 
-    PurchaseEntry, EmailLog, FinancialValidationLog
+    PurchaseEntry, EmailLog, FinancialValidationLog, Review, SiteAnnouncement,
+    ServiceType, ServicePrice, DistanceZone, Notification, UserNotification
 )
 from .utils import save_csv_entry
+from .search import refresh_search_vector
+from . import typeahead
+from . import pricing
+from . import analytics_snapshot
+from . import images
 
 
 class CustomUserAdmin(UserAdmin):
@@ -42,7 +49,7 @@ class OrderAdmin(admin.ModelAdmin):
     search_fields = ('user__phone_number', 'user__email', 'id')
     readonly_fields = ('created_at',)
     inlines = [OrderItemInline]
-    actions = ['generate_delivery_otp', 'approve_free_delivery']
+    actions = ['generate_delivery_otp', 'approve_free_delivery', 'generate_receipts']
     
     fieldsets = (
         ('Order Information', {
@@ -82,6 +89,12 @@ class OrderAdmin(admin.ModelAdmin):
             user.save()
         self.message_user(request, f"Free delivery approved for {queryset.count()} orders.")
 
+    @admin.action(description='Generate receipt numbers for confirmed orders')
+    def generate_receipts(self, request, queryset):
+        # One block of numbers for the whole selection (ReceiptSequence.allocate)
+        numbered = Order.generate_receipt_numbers(queryset.select_related('user'))
+        self.message_user(request, f"Generated receipt numbers for {len(numbered)} orders.")
+
 class AdminSessionAdmin(admin.ModelAdmin):
     list_display = ('user', 'ip_address', 'login_time', 'is_active', 'last_activity')
     list_filter = ('is_active', 'login_time')
@@ -204,12 +217,14 @@ def log_admin_logout(sender, request, user, **kwargs):
         session_key = request.session.session_key
         if session_key:
             from django.utils import timezone
+            now = timezone.now()
             AdminSession.objects.filter(
                 session_key=session_key,
                 is_active=True
             ).update(
                 is_active=False,
-                logout_time=timezone.now()
+                last_activity=now,
+                logout_time=now
             )
         
         # Log the logout activity
@@ -243,6 +258,24 @@ def log_product_save(sender, instance, created, **kwargs):
         )
 
 
+@receiver(post_save, sender=Product)
+def update_product_search_vector(sender, instance, **kwargs):
+    """Keep the full-text search document in sync with product text fields."""
+    refresh_search_vector([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def update_typeahead_on_save(sender, instance, **kwargs):
+    """Patch the in-memory typeahead index once the save is committed."""
+    transaction.on_commit(lambda: typeahead.product_saved(instance))
+
+
+@receiver(post_delete, sender=Product)
+def update_typeahead_on_delete(sender, instance, **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(lambda: typeahead.product_deleted(product_id))
+
+
 @receiver(post_delete, sender=Product)
 def log_product_delete(sender, instance, **kwargs):
     """Log product deletion."""
@@ -258,6 +291,42 @@ def log_product_delete(sender, instance, **kwargs):
         )
 
 
+# Keep denormalized product rating columns in sync with reviews
+@receiver(post_init, sender=Review)
+def remember_review_product(sender, instance, **kwargs):
+    """Note the product a review was loaded with, so moving it refreshes the old product too."""
+    instance._rating_product_id = instance.__dict__.get('product_id')
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def sync_product_rating(sender, instance, **kwargs):
+    """Recompute rating_sum/rating_count/rating_avg when a review is created, approved, edited, moved or deleted."""
+    product_ids = {instance.product_id, getattr(instance, '_rating_product_id', None)} - {None}
+    for product_id in product_ids:
+        Product(pk=product_id).refresh_rating_aggregates()
+    instance._rating_product_id = instance.product_id
+
+
+# Drop cached announcement sets whenever an announcement is created, edited, toggled or deleted
+@receiver(post_save, sender=SiteAnnouncement)
+@receiver(post_delete, sender=SiteAnnouncement)
+def invalidate_site_announcements(sender, instance, **kwargs):
+    from .context_processors import invalidate_announcement_cache
+    invalidate_announcement_cache()
+
+
+# Recompile the pricing tier table in every worker when services, prices or zones change
+@receiver(post_save, sender=ServiceType)
+@receiver(post_delete, sender=ServiceType)
+@receiver(post_save, sender=ServicePrice)
+@receiver(post_delete, sender=ServicePrice)
+@receiver(post_save, sender=DistanceZone)
+@receiver(post_delete, sender=DistanceZone)
+def invalidate_pricing_table(sender, instance, **kwargs):
+    transaction.on_commit(pricing.invalidate)
+
+
 # Track Category CRUD Operations
 @receiver(post_save, sender=Category)
 def log_category_save(sender, instance, created, **kwargs):
@@ -378,3 +447,66 @@ def log_expenses_csv(sender, instance, created, **kwargs):
         headers = ['Date', 'Online Amount', 'Cash Amount', 'Total', 'Added by', 'Description']
         save_csv_entry('expenses.csv', data, headers)
 
+
+
+# Financial rollups (manual entries only - see financial_rollups.py)
+@receiver(pre_save, sender=DailySales)
+@receiver(pre_save, sender=DailyExpenditure)
+@receiver(pre_save, sender=PurchaseEntry)
+def remember_financial_entry_date(sender, instance, **kwargs):
+    """Keep the stored date so an entry moved to another day refreshes both days."""
+    instance._rollup_old_date = None
+    if instance.pk:
+        instance._rollup_old_date = sender.objects.filter(pk=instance.pk).values_list('date', flat=True).first()
+
+
+@receiver(post_save, sender=DailySales)
+@receiver(post_save, sender=DailyExpenditure)
+@receiver(post_save, sender=PurchaseEntry)
+@receiver(post_delete, sender=DailySales)
+@receiver(post_delete, sender=DailyExpenditure)
+@receiver(post_delete, sender=PurchaseEntry)
+def update_financial_rollups(sender, instance, **kwargs):
+    from .financial_rollups import refresh_for_instance
+    old_date = getattr(instance, '_rollup_old_date', None)
+    transaction.on_commit(lambda: refresh_for_instance(instance, old_date))
+
+
+# Analytics snapshot: any sales/expense write moves the data version (see analytics_snapshot.py)
+@receiver(post_save, sender=DailySales)
+@receiver(post_delete, sender=DailySales)
+@receiver(post_save, sender=DailyExpenditure)
+@receiver(post_delete, sender=DailyExpenditure)
+def bump_analytics_version(sender, instance, **kwargs):
+    transaction.on_commit(analytics_snapshot.bump_data_version)
+
+
+# Header summary (context_processors.header_summary): unread counts follow notification changes
+@receiver(post_save, sender=UserNotification)
+@receiver(post_delete, sender=UserNotification)
+def invalidate_user_header(sender, instance, **kwargs):
+    from .context_processors import invalidate_header_summary
+    transaction.on_commit(lambda: invalidate_header_summary(instance.user_id))
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def invalidate_all_headers(sender, instance, **kwargs):
+    from .context_processors import invalidate_all_header_summaries
+    transaction.on_commit(invalidate_all_header_summaries)
+
+
+# Image derivatives (images.py): build resized copies only when a field points at a new file
+def remember_image_names(sender, instance, **kwargs):
+    images.remember(instance)
+
+
+def queue_image_derivatives(sender, instance, update_fields=None, **kwargs):
+    names = images.changed_names(instance, update_fields)
+    if names:
+        transaction.on_commit(lambda: images.enqueue(names))
+
+
+for _label in images.IMAGE_FIELDS:
+    post_init.connect(remember_image_names, sender=_label)
+    post_save.connect(queue_image_derivatives, sender=_label)
@@ -8,12 +8,16 @@ import os
 from django.conf import settings
 import pandas as pd
 from django.db.models import Sum, Count, F, Q
-from django.db import models
+from django.db import models, transaction
 from django.db.models.functions import TruncDate, TruncMonth, Coalesce
 from django.utils import timezone
 from .forms import ProductForm, ReviewForm, DailySalesForm, DailyExpenditureForm
 from django.core.mail import send_mail
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.urls import reverse
+from django.utils.html import format_html
+from django.views.decorators.http import condition
 from django.core.paginator import Paginator
 import csv
 import datetime
@@ -22,6 +26,13 @@ from datetime import timedelta
 from dateutil.relativedelta import relativedelta
 from django.utils import timezone
 import numpy as np
+from . import financial_rollups
+from . import analytics_snapshot
+from . import financial_import
+from . import report_exports
+from . import data_files
+from . import forecasting
+from .context_processors import invalidate_all_header_summaries
 
 def get_date_range_filter(range_type, custom_start=None, custom_end=None):
     """Calculate date range based on filter type."""
@@ -72,21 +83,25 @@ def admin_dashboard(request):
     # FINANCIAL METRICS - MANUAL ENTRY ONLY (NO ORDER DATA)
     # ==================================================================================
     
+    # All totals come from the monthly rollup rows (financial_rollups.py), which are
+    # maintained from manual DailySales / DailyExpenditure / PurchaseEntry records only
+    totals = financial_rollups.get_totals()
+    
     # Total Revenue: ONLY from manually entered daily sales
-    total_revenue = DailySales.objects.aggregate(Sum('total_sales'))['total_sales__sum'] or 0
+    total_revenue = totals['sales_total']
     
     # Cash vs Online breakdown from manual sales entries
-    total_cash_received = DailySales.objects.aggregate(Sum('cash_received'))['cash_received__sum'] or 0
-    total_online_received = DailySales.objects.aggregate(Sum('online_received'))['online_received__sum'] or 0
+    total_cash_received = totals['sales_cash']
+    total_online_received = totals['sales_online']
 
 
     # Expenses: From manual daily expenditure entries (using combined online + cash model)
-    total_expenses = DailyExpenditure.objects.aggregate(Sum('total'))['total__sum'] or 0
-    online_expenses = DailyExpenditure.objects.aggregate(Sum('online_amount'))['online_amount__sum'] or 0
-    cash_expenses = DailyExpenditure.objects.aggregate(Sum('cash_amount'))['cash_amount__sum'] or 0
+    total_expenses = totals['expense_total']
+    online_expenses = totals['expense_online']
+    cash_expenses = totals['expense_cash']
     
     # Purchases (Inventory Cost): From manual purchase entries
-    total_purchases = PurchaseEntry.objects.aggregate(Sum('total_cost'))['total_cost__sum'] or 0
+    total_purchases = totals['purchase_total']
 
     # Net Profit Calculation: Revenue - Expenses - Purchases (NO ORDER DATA)
     profit_loss = float(total_revenue) - float(total_expenses) - float(total_purchases)
@@ -128,32 +143,14 @@ def admin_dashboard(request):
     else:
         start_date = today - datetime.timedelta(days=30)
     
-    # Fetch DailySales for chart
-    sales_qs = DailySales.objects.all()
-    if start_date:
-        sales_qs = sales_qs.filter(date__gte=start_date)
-        
-    daily_sales_data = sales_qs.values('date') \
-        .annotate(sales=Sum('total_sales')) \
-        .order_by('date')
-
-    dates = [x['date'].strftime('%Y-%m-%d') for x in daily_sales_data]
-    sales = [float(x['sales'] or 0) for x in daily_sales_data]
-
-    # Fetch DailyExpenditure for comparison chart
-    expenses_qs = DailyExpenditure.objects.all()
-    if start_date:
-        expenses_qs = expenses_qs.filter(date__gte=start_date)
-    
-    daily_expenses_data = expenses_qs.values('date') \
-        .annotate(expense=Sum('total')) \
-        .order_by('date')
-    
-    # Create a dictionary for quick lookup
-    expenses_dict = {x['date'].strftime('%Y-%m-%d'): float(x['expense'] or 0) for x in daily_expenses_data}
+    # Daily rollup rows for the chart (one indexed range scan)
+    daily_rows = list(financial_rollups.get_daily_series(start_date))
     
-    # Match expenses to sales dates (fill with 0 if no expense for that date)
-    expenses = [expenses_dict.get(date, 0) for date in dates]
+    # Chart follows the days with a sales entry; expenses matched to those dates (0 if none)
+    sales_days = [x for x in daily_rows if x['sales_entries']]
+    dates = [x['date'].strftime('%Y-%m-%d') for x in sales_days]
+    sales = [float(x['sales_total']) for x in sales_days]
+    expenses = [float(x['expense_total']) for x in sales_days]
 
     # Category Statistics (for product management reference)
     category_stats = Product.objects.values('category__name').annotate(count=Count('id')).order_by('-count')
@@ -197,52 +194,31 @@ def admin_dashboard(request):
 @staff_required
 def admin_analytics_new(request):
     """Enhanced Analytics Dashboard with Dynamic Filters"""
-    from django.db.models import Sum
-    from django.db.models.functions import TruncMonth, TruncQuarter, TruncYear
-    import json
-    from firstApp.models import DailySales, DailyExpenditure
-    
     # Get filter parameters
     quarterly_year = request.GET.get('quarterly_year', str(timezone.now().year))
     monthly_range = request.GET.get('monthly_range', 'last_6_months')
     comparison_range = request.GET.get('comparison_range', 'last_6_months')
     expense_range = request.GET.get('expense_range', 'last_6_months')
     
-    # Helper function
-    def safe_float(val):
-        return float(val) if val else 0.0
-    
-    # Get all available years from sales data
-    available_years = DailySales.objects.dates('date', 'year', order='DESC')
-    available_years_list = [d.year for d in available_years]
+    # Every series below comes from one cached snapshot (see analytics_snapshot.py)
+    snapshot = analytics_snapshot.get_snapshot()
+    forecast = forecasting.get_forecast()
+    available_years_list = snapshot.available_years
+    totals = snapshot.totals
     
     # ===== OVERALL TOTALS (No filtering) =====
-    sales_agg = DailySales.objects.aggregate(
-        total=Sum('total_sales'),
-        online=Sum('online_received'),
-        cash=Sum('cash_received'),
-        labor=Sum('labor_charge'),
-        delivery=Sum('delivery_charge')
-    )
-    
-    expense_agg = DailyExpenditure.objects.aggregate(
-        total=Sum('total'),
-        online=Sum('online_amount'),
-        cash=Sum('cash_amount')
-    )
-    
-    sales_count = DailySales.objects.count()
-    expense_count = DailyExpenditure.objects.count()
+    sales_count = totals['sales_count']
+    expense_count = totals['expense_count']
     
-    total_sales = safe_float(sales_agg['total'])
-    total_online_sales = safe_float(sales_agg['online'])
-    total_cash_sales = safe_float(sales_agg['cash'])
-    total_labor = safe_float(sales_agg['labor'])
-    total_delivery = safe_float(sales_agg['delivery'])
+    total_sales = totals['total_sales']
+    total_online_sales = totals['total_online_sales']
+    total_cash_sales = totals['total_cash_sales']
+    total_labor = totals['total_labor']
+    total_delivery = totals['total_delivery']
     
-    total_expense = safe_float(expense_agg['total'])
-    total_online_exp = safe_float(expense_agg['online'])
-    total_cash_exp = safe_float(expense_agg['cash'])
+    total_expense = totals['total_expense']
+    total_online_exp = totals['total_online_exp']
+    total_cash_exp = totals['total_cash_exp']
     
     avg_sales = (total_sales / sales_count) if sales_count > 0 else 0.0
     avg_expense = (total_expense / expense_count) if expense_count > 0 else 0.0
@@ -258,39 +234,11 @@ def admin_analytics_new(request):
     except:
         selected_year = timezone.now().year
     
-    quarterly_sales = DailySales.objects.filter(
-        date__year=selected_year
-    ).annotate(
-        quarter=TruncQuarter('date')
-    ).values('quarter').annotate(
-        total=Sum('total_sales')
-    ).order_by('quarter')
-    
-    quarterly_list = list(quarterly_sales)
-    quarterly_labels = []
-    quarterly_values = []
-    for q in quarterly_list:
-        quarter_date = q['quarter']
-        quarter_num = (quarter_date.month - 1) // 3 + 1
-        label = f"Q{quarter_num}"
-        quarterly_labels.append(label)
-        quarterly_values.append(safe_float(q['total']))
+    quarterly_labels, quarterly_values = snapshot.quarterly.get(selected_year, ([], []))
     
     # ===== MONTHLY SALES & GROWTH (Filtered by Range) =====
     monthly_start, monthly_end = get_date_range_filter(monthly_range)
-    monthly_qs = DailySales.objects.all()
-    if monthly_start and monthly_end:
-        monthly_qs = monthly_qs.filter(date__range=[monthly_start, monthly_end])
-    
-    monthly_sales = monthly_qs.annotate(
-        month=TruncMonth('date')
-    ).values('month').annotate(
-        total=Sum('total_sales')
-    ).order_by('month')
-    
-    monthly_sales_list = list(monthly_sales)
-    monthly_sales_labels = [m['month'].strftime('%b %Y') for m in monthly_sales_list]
-    monthly_sales_values = [safe_float(m['total']) for m in monthly_sales_list]
+    monthly_sales_labels, monthly_sales_values = analytics_snapshot.monthly_sales(snapshot, monthly_start, monthly_end)
     
     # Calculate growth
     if len(monthly_sales_values) >= 2:
@@ -302,79 +250,26 @@ def admin_analytics_new(request):
     
     # ===== SALES VS EXPENSES COMPARISON (Filtered by Range) =====
     comp_start, comp_end = get_date_range_filter(comparison_range)
-    
-    sales_comp_qs = DailySales.objects.all()
-    expenses_comp_qs = DailyExpenditure.objects.all()
-    
-    if comp_start and comp_end:
-        sales_comp_qs = sales_comp_qs.filter(date__range=[comp_start, comp_end])
-        expenses_comp_qs = expenses_comp_qs.filter(date__range=[comp_start, comp_end])
-    
-    sales_comparison = sales_comp_qs.annotate(
-        month=TruncMonth('date')
-    ).values('month').annotate(
-        total=Sum('total_sales')
-    ).order_by('month')
-    
-    expenses_comparison = expenses_comp_qs.annotate(
-        month=TruncMonth('date')
-    ).values('month').annotate(
-        total=Sum('total')
-    ).order_by('month')
-    
-    comparison_labels = [s['month'].strftime('%b %Y') for s in sales_comparison]
-    comparison_sales = [safe_float(s['total']) for s in sales_comparison]
-    
-    expenses_dict = {e['month']: safe_float(e['total']) for e in expenses_comparison}
-    comparison_expenses = [expenses_dict.get(s['month'], 0) for s in sales_comparison]
+    comparison_labels, comparison_sales, comparison_expenses = analytics_snapshot.sales_vs_expenses(
+        snapshot, comp_start, comp_end
+    )
     
     # ===== DAILY EXPENSE TREND (Filtered by Range) =====
     exp_start, exp_end = get_date_range_filter(expense_range)
-    expense_trend_qs = DailyExpenditure.objects.all()
-    
-    if exp_start and exp_end:
-        expense_trend_qs = expense_trend_qs.filter(date__range=[exp_start, exp_end])
-    
-    daily_expenses = expense_trend_qs.order_by('date').values('date', 'total')
-    expense_dates = [e['date'].strftime('%Y-%m-%d') for e in daily_expenses]
-    expense_values = [safe_float(e['total']) for e in daily_expenses]
+    expense_dates, expense_values = analytics_snapshot.daily_expenses(snapshot, exp_start, exp_end)
     
     # ===== INSIGHTS (Min/Max from overall data) =====
-    min_sale_day = DailySales.objects.order_by('total_sales').first()
-    max_sale_day = DailySales.objects.order_by('-total_sales').first()
-    
-    # Best month from all time
-    all_monthly_sales = DailySales.objects.annotate(
-        month=TruncMonth('date')
-    ).values('month').annotate(
-        total=Sum('total_sales')
-    ).order_by('-total')
-    
-    if all_monthly_sales:
-        best_month = all_monthly_sales[0]
-        max_sales_month = best_month['month'].strftime('%B %Y')
-        max_sales_month_value = safe_float(best_month['total'])
-    else:
-        max_sales_month = 'N/A'
-        max_sales_month_value = 0
+    min_sale_day = snapshot.min_sale_day
+    max_sale_day = snapshot.max_sale_day
+    max_sales_month, max_sales_month_value = snapshot.best_month
     
-    # ===== WEEKDAY PERFORMANCE =====
-    weekday_sales = DailySales.objects.values('day').annotate(
-        total=Sum('total_sales')
-    ).order_by('day')
-    
-    weekday_labels = [w['day'] for w in weekday_sales]
-    weekday_values = [safe_float(w['total']) for w in weekday_sales]
+    # ===== WEEKDAY PERFORMANCE (Monday..Sunday) =====
+    weekday_labels = snapshot.weekday_labels
+    weekday_values = snapshot.weekday_values
     
     # ===== YEARLY TREND =====
-    yearly_sales = DailySales.objects.annotate(
-        year=TruncYear('date')
-    ).values('year').annotate(
-        total=Sum('total_sales')
-    ).order_by('year')
-    
-    yearly_labels = [y['year'].strftime('%Y') for y in yearly_sales]
-    yearly_values = [safe_float(y['total']) for y in yearly_sales]
+    yearly_labels = snapshot.yearly_labels
+    yearly_values = snapshot.yearly_values
     
     context = {
         # Overall stats
@@ -427,18 +322,41 @@ def admin_analytics_new(request):
         'monthly_avg_sales': sum(monthly_sales_values) / len(monthly_sales_values) if monthly_sales_values else 0,
         
         # Daily sales trend data (all time)
-        'sales_dates_json': json.dumps([s['date'].strftime('%Y-%m-%d') for s in DailySales.objects.all().order_by('date').values('date', 'total_sales')]),
-        'sales_values_json': json.dumps([safe_float(s['total_sales']) for s in DailySales.objects.all().order_by('date').values('date', 'total_sales')]),
+        'sales_dates_json': snapshot.sales_dates_json,
+        'sales_values_json': snapshot.sales_values_json,
         
         # Combined tab data
         'net_contribution': total_sales - (total_labor + total_delivery + total_expense),
         'contribution_color': 'success' if (total_sales - (total_labor + total_delivery + total_expense)) >= 0 else 'danger',
+        
+        # Forecast (see forecasting.py)
+        'forecast': forecast,
+        'forecast_json': json.dumps(forecast),
     }
     
     return render(request, 'admin/admin_analytics.html', context)
 
 
+def _analytics_api_params(request):
+    """(mode, start_date, end_date, month) strings; a ?range= preset fills in start/end dates."""
+    mode = request.GET.get('mode', 'sales')  # sales, expenses, combined
+    start_date_str = request.GET.get('start_date', '')
+    end_date_str = request.GET.get('end_date', '')
+    month_str = request.GET.get('month', '')
+    preset = request.GET.get('range', '')
+    if preset and not (start_date_str or end_date_str or month_str):
+        preset_start, preset_end = get_date_range_filter(preset)
+        if preset_start and preset_end:
+            start_date_str, end_date_str = preset_start.isoformat(), preset_end.isoformat()
+    return (mode, start_date_str, end_date_str, month_str)
+
+
+def _analytics_api_etag(request):
+    return analytics_snapshot.api_etag(_analytics_api_params(request))
+
+
 @staff_required
+@condition(etag_func=_analytics_api_etag)
 def analytics_api(request):
     """
     Unified Analytics API endpoint for dynamic filtering
@@ -447,13 +365,26 @@ def analytics_api(request):
         - start_date: YYYY-MM-DD format
         - end_date: YYYY-MM-DD format  
         - month: YYYY-MM format (overrides start_date/end_date if provided)
+        - range: 'this_month' | 'last_6_months' | 'last_year' | ... (used when no dates are given)
         - mode: 'sales' | 'expenses' | 'combined'
         
     Returns JSON with:
         - Summary cards data
         - Insight cards (best/worst days, averages)
         - Chart data for the selected period
+    
+    Responses are cached per filter set and data version (see
+    analytics_snapshot.get_api_payload); the ETag lets the browser revalidate
+    with If-None-Match and get a 304 while sales/expenses are unchanged.
     """
+    payload = analytics_snapshot.get_api_payload(_analytics_api_params(request), build_analytics_payload)
+    response = JsonResponse(payload)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def build_analytics_payload(mode, start_date_str, end_date_str, month_str):
+    """Compute the analytics_api response body for one set of filters."""
     from django.db.models import Sum, Avg, Min, Max
     from django.db.models.functions import TruncMonth, TruncYear
     from firstApp.models import DailySales, DailyExpenditure
@@ -462,12 +393,6 @@ def analytics_api(request):
     def safe_float(val):
         return float(val) if val else 0.0
     
-    # Parse filter parameters
-    start_date_str = request.GET.get('start_date', '')
-    end_date_str = request.GET.get('end_date', '')
-    month_str = request.GET.get('month', '')
-    mode = request.GET.get('mode', 'sales')  # sales, expenses, combined
-    
     # Determine date range
     start_date = None
     end_date = None
@@ -730,7 +655,14 @@ def analytics_api(request):
             'expenses': comparison_expenses,
         }
     
-    return JsonResponse(response_data)
+    # Forecast of the next 7/30 days from a common start date (independent of the date filters)
+    forecast = forecasting.get_forecast()
+    if mode == 'combined':
+        response_data['forecast'] = {key: forecast[key] for key in ('start_date', 'sales', 'expenses', 'net_totals')}
+    else:
+        response_data['forecast'] = forecast.get(mode)
+    
+    return response_data
 
 def handle_analytics_export(format_type, data):
     """
@@ -940,138 +872,57 @@ def admin_appointment_delete(request, pk):
     messages.success(request, "Appointment deleted successfully.")
     return redirect('admin_appointment_list')
 
-
-
+@staff_member_required
+def admin_analytics_files(request):
+    """Uploaded data files: upload, summary cards and a paginated raw-data table."""
+    data_dir = data_files.data_dir()
     if not os.path.exists(data_dir):
         os.makedirs(data_dir)
 
     # Handle File Upload
     if request.method == 'POST' and request.FILES.get('upload_file'):
         uploaded_file = request.FILES['upload_file']
-        if uploaded_file.name.endswith(('.xlsx', '.tsv', '.csv')):
+        if uploaded_file.name.endswith(data_files.DATA_EXTENSIONS):
             fs = FileSystemStorage(location=data_dir)
             filename = fs.save(uploaded_file.name, uploaded_file)
-            messages.success(request, f"File '{filename}' uploaded successfully.")
-            return redirect('admin_analytics')
+            try:
+                data_files.build_cache(filename)  # parse once, at upload time
+                messages.success(request, f"File '{filename}' uploaded successfully.")
+            except Exception as e:
+                messages.warning(request, f"File '{filename}' uploaded, but it could not be parsed: {e}")
+            return redirect(f"{reverse('admin_analytics_files')}?file={filename}")
         else:
             messages.error(request, "Invalid file format. Please upload .xlsx, .tsv, or .csv.")
-    
-    data_files = [f for f in os.listdir(data_dir) if f.endswith(('.xlsx', '.tsv', '.csv'))]
-    
-    context = {'files': data_files}
-    
-    selected_file = request.GET.get('file')
-    if selected_file and selected_file in data_files:
-        file_path = os.path.join(data_dir, selected_file)
-        try:
-            if selected_file.endswith('.tsv'):
-                df = pd.read_csv(file_path, sep='\t')
-            elif selected_file.endswith('.csv'):
-                df = pd.read_csv(file_path)
-            else:
-                df = pd.read_excel(file_path)
-            
-            # Basic Analysis Logic (Assuming standard columns: 'Product', 'Quantity', 'Price', 'Delivery', 'Distance')
-            # Adjust column names based on actual file structure or requirement
-            # If columns don't exist, we just show raw data
-            
-            analysis = {}
-            
-            # Normalize column names to lowercase for safer access
-            df.columns = df.columns.str.lower()
-            
-            # 1. Total Revenue
-            if 'price' in df.columns:
-                analysis['total_revenue'] = df['price'].sum()
-            elif 'total' in df.columns:
-                 analysis['total_revenue'] = df['total'].sum()
-            else:
-                 analysis['total_revenue'] = 0
-                 
-            # 2. Total Delivery Charges
-            if 'delivery' in df.columns:
-                analysis['total_delivery'] = df['delivery'].sum()
-            elif 'delivery_charge' in df.columns:
-                analysis['total_delivery'] = df['delivery_charge'].sum()
-            else:
-                analysis['total_delivery'] = 0
-                
-            # 3. Total Distance
-            if 'distance' in df.columns:
-                analysis['total_distance'] = df['distance'].sum()
-            else:
-                analysis['total_distance'] = 0
 
-            # 4. Product Sales
-            if 'product' in df.columns and 'quantity' in df.columns and 'price' in df.columns:
-               product_sales = df.groupby('product').agg({'quantity': 'sum', 'price': 'sum'}).reset_index()
-               product_sales.columns = ['name', 'quantity', 'sales']
-               analysis['product_sales'] = product_sales.to_dict('records')
-            else:
-               analysis['product_sales'] = []
+    data_files_list = data_files.list_files()
+    context = {'files': data_files_list}
 
-            # 5. Raw Data HTML
-            analysis['html_table'] = df.to_html(classes='table table-bordered table-hover mb-0', index=False)
-            
-            # 6. Trend Prediction (Linear Regression)
-            if 'date' in df.columns:
-                target_col = None
-                if 'price' in df.columns: target_col = 'price'
-                elif 'total' in df.columns: target_col = 'total'
-                elif 'sales' in df.columns: target_col = 'sales'
-                
-                if target_col:
-                    try:
-                        # Prepare data
-                        df_trend = df.copy()
-                        df_trend['date'] = pd.to_datetime(df_trend['date'])
-                        daily_data = df_trend.groupby('date')[target_col].sum().reset_index().sort_values('date')
-                        
-                        if len(daily_data) > 1:
-                            # Create ordinal dates for regression
-                            daily_data['ordinal'] = daily_data['date'].apply(lambda x: x.toordinal())
-                            
-                            X = daily_data['ordinal'].values
-                            y = daily_data[target_col].values
-                            
-                            # Linear Regression: y = mx + c
-                            slope, intercept = np.polyfit(X, y, 1)
-                            
-                            # Predictions for existing dates (Trend Line)
-                            trend_values = slope * X + intercept
-                            
-                            # Future Predictions (Next 7 days)
-                            last_date = daily_data['date'].max()
-                            future_dates = [last_date + datetime.timedelta(days=i) for i in range(1, 8)]
-                            future_ordinals = np.array([d.toordinal() for d in future_dates])
-                            future_predictions = slope * future_ordinals + intercept
-                            
-                            # Prepare Labels and Data for Chart
-                            # Labels: History + Future
-                            history_dates_str = [d.strftime('%Y-%m-%d') for d in daily_data['date']]
-                            future_dates_str = [d.strftime('%Y-%m-%d') for d in future_dates]
-                            all_labels = history_dates_str + future_dates_str
-                            
-                            actual_data = list(daily_data[target_col]) + [None] * len(future_dates)
-                            
-                            # Trend Data: History Trend + Future Predictions
-                            trend_line_data = list(trend_values) + list(future_predictions)
-                            
-                            analysis['chart_labels'] = json.dumps(all_labels)
-                            analysis['chart_actual'] = json.dumps(actual_data)
-                            analysis['chart_trend'] = json.dumps(trend_line_data)
-                            analysis['has_prediction'] = True
-                            
-                    except Exception as reg_err:
-                        print(f"Regression error: {reg_err}")
-                        
-            context['analysis'] = analysis
+    selected_file = request.GET.get('file')
+    if selected_file and selected_file in data_files_list:
+        try:
+            context['analysis'] = data_files.get_summary(selected_file)
             context['current_file'] = selected_file
-            
+            context['page_size'] = data_files.PAGE_SIZE
         except Exception as e:
             context['error'] = f"Error processing file: {str(e)}"
-            
-    return render(request, 'admin/admin_analytics.html', context)
+
+    return render(request, 'admin/admin_analytics_files.html', context)
+
+@staff_member_required
+def admin_analytics_file_rows(request):
+    """JSON page of rows from an uploaded data file (?file=&page=&page_size=)."""
+    try:
+        page = int(request.GET.get('page', 1))
+        page_size = int(request.GET.get('page_size', data_files.PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid page'}, status=400)
+    try:
+        data = data_files.get_page(request.GET.get('file', ''), page, page_size)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': f"Error processing file: {e}"}, status=500)
+    if data is None:
+        return JsonResponse({'success': False, 'error': 'File not found'}, status=404)
+    return JsonResponse(dict(data, success=True))
 
 @staff_member_required
 def admin_delete_analytics_file(request):
@@ -1089,6 +940,7 @@ def admin_delete_analytics_file(request):
             if abs_file_path.startswith(abs_data_dir) and os.path.exists(abs_file_path):
                 try:
                     os.remove(abs_file_path)
+                    data_files.forget(filename)
                     messages.success(request, f"File '{filename}' deleted successfully.")
                 except Exception as e:
                     messages.error(request, f"Error deleting file: {e}")
@@ -1097,7 +949,7 @@ def admin_delete_analytics_file(request):
         else:
              messages.error(request, "No filename provided.")
              
-    return redirect('admin_analytics')
+    return redirect('admin_analytics_files')
 
 # ------------------------------------------------------------------
 # Product Management
@@ -1326,109 +1178,106 @@ def admin_order_detail(request, pk):
         # Update Status
         if 'update_status' in request.POST:
             from decimal import Decimal
+
+            # One transaction: the receipt number is only used up if the order saves,
+            # and the emails go out once it has committed
+            with transaction.atomic():
+                new_status = request.POST.get('status')
+                confirm_pricing = request.POST.get('confirm_pricing') == '1'
             
-            new_status = request.POST.get('status')
-            confirm_pricing = request.POST.get('confirm_pricing') == '1'
-            
-            # Capture old status to detect change
-            old_status = order.status
+                # Capture old status to detect change
+                old_status = order.status
             
-            # Handle pricing confirmation (for enquiry orders)
-            if confirm_pricing and order.order_type == 'enquiry' and not order.pricing_confirmed:
-                # Mark pricing as confirmed
-                order.pricing_confirmed = True
+                # Handle pricing confirmation (for enquiry orders)
+                if confirm_pricing and order.order_type == 'enquiry' and not order.pricing_confirmed:
+                    # Mark pricing as confirmed
+                    order.pricing_confirmed = True
                 
-                # Calculate final price
-                subtotal = sum(item.price * item.quantity for item in order.items.all())
-                order.total_price = subtotal
+                    # Calculate final price
+                    subtotal = sum(item.price * item.quantity for item in order.items.all())
+                    order.total_price = subtotal
                 
-                # Ensure delivery_charge is not None
-                delivery_charge = order.delivery_charge if order.delivery_charge is not None else Decimal('0.00')
-                order.final_price = subtotal + delivery_charge
-                order.delivery_charge_status = 'CONFIRMED'
+                    # Ensure delivery_charge is not None
+                    delivery_charge = order.delivery_charge if order.delivery_charge is not None else Decimal('0.00')
+                    order.final_price = subtotal + delivery_charge
+                    order.delivery_charge_status = 'CONFIRMED'
                 
-                # NOW deduct stock (was deferred until pricing confirmed)
-                for item in order.items.all():
-                    if item.product.stock_quantity >= item.quantity:
-                        item.product.stock_quantity -= item.quantity
-                        item.product.save()
-                    else:
-                        messages.warning(request, f"Insufficient stock for {item.product.name}. Available: {item.product.stock_quantity}")
+                    # NOW deduct stock (was deferred until pricing confirmed)
+                    for item in order.items.all():
+                        if item.product.stock_quantity >= item.quantity:
+                            item.product.stock_quantity -= item.quantity
+                            item.product.save()
+                        else:
+                            messages.warning(request, f"Insufficient stock for {item.product.name}. Available: {item.product.stock_quantity}")
                 
-                # Check free delivery eligibility
-                if order.user.free_delivery_used_count == 0 and order.distance_km and order.distance_km <= 2:
-                    order.free_delivery_applied = True
-                    order.delivery_charge = Decimal('0.00')
-                    order.final_price = order.total_price
-                    order.user.free_delivery_used_count += 1
-                    order.user.save()
-                    messages.info(request, "Free delivery applied (first order within 2 KM).")
+                    # Check free delivery eligibility
+                    if order.user.free_delivery_used_count == 0 and order.distance_km and order.distance_km <= 2:
+                        order.free_delivery_applied = True
+                        order.delivery_charge = Decimal('0.00')
+                        order.final_price = order.total_price
+                        order.user.free_delivery_used_count += 1
+                        order.user.save()
+                        messages.info(request, "Free delivery applied (first order within 2 KM).")
                 
-                messages.success(request, "Pricing confirmed! Stock has been deducted.")
+                    messages.success(request, "Pricing confirmed! Stock has been deducted.")
             
-            order.status = new_status
+                order.status = new_status
             
-            # Handle status-specific actions
-            if new_status == 'Confirmed':
-                final_price = request.POST.get('final_price')
-                delivery_charge = request.POST.get('delivery_charge_status')
-                if final_price:
-                    try:
-                        order.final_price = Decimal(final_price)
-                    except:
-                        pass
-                if delivery_charge:
-                    try:
-                        order.delivery_charge = Decimal(delivery_charge)
-                    except:
-                        pass
+                # Handle status-specific actions
+                if new_status == 'Confirmed':
+                    final_price = request.POST.get('final_price')
+                    delivery_charge = request.POST.get('delivery_charge_status')
+                    if final_price:
+                        try:
+                            order.final_price = Decimal(final_price)
+                        except:
+                            pass
+                    if delivery_charge:
+                        try:
+                            order.delivery_charge = Decimal(delivery_charge)
+                        except:
+                            pass
                 
-                # Generate receipt number when order is confirmed
-                if not order.receipt_number:
-                    order.generate_receipt_number()
-                    if order.receipt_qr_data and not order.receipt_qr_code:
-                        order.generate_receipt_qr_code()
-                    messages.success(request, f"Receipt generated: {order.receipt_number}")
+                    # Generate receipt number when order is confirmed
+                    if not order.receipt_number:
+                        order.generate_receipt_number()
+                        messages.success(request, f"Receipt generated: {order.receipt_number}")
             
-            # If Out for Delivery, generate OTP
-            if new_status == 'Out for Delivery':
-                import random
-                otp = str(random.randint(100000, 999999))
-                order.delivery_otp = otp
+                # If Out for Delivery, generate OTP
+                if new_status == 'Out for Delivery':
+                    import random
+                    otp = str(random.randint(100000, 999999))
+                    order.delivery_otp = otp
                 
-                # Generate receipt if not already generated
-                if not order.receipt_number:
-                    order.generate_receipt_number()
-                    if order.receipt_qr_data and not order.receipt_qr_code:
-                        order.generate_receipt_qr_code()
+                    # Generate receipt if not already generated
+                    if not order.receipt_number:
+                        order.generate_receipt_number()
                 
-                from .email_utils import send_delivery_otp_email
-                send_delivery_otp_email(order, otp)
+                    from .email_utils import send_delivery_otp_email
+                    transaction.on_commit(lambda: send_delivery_otp_email(order, otp))
                 
-                messages.info(request, f"Delivery OTP generated and sent: {otp}")
+                    messages.info(request, f"Delivery OTP generated and sent: {otp}")
             
-            # Send status update email for status changes
-            if new_status != old_status:
-                from .email_utils import send_order_status_email, send_order_delivered_email
+                # Send status update email for status changes
+                if new_status != old_status:
+                    from .email_utils import send_order_status_email, send_order_delivered_email
                 
-                if new_status == 'Delivered':
-                    # Generate receipt if not already generated
-                    if not order.receipt_number:
-                        order.generate_receipt_number()
-                        if order.receipt_qr_data and not order.receipt_qr_code:
-                            order.generate_receipt_qr_code()
-                    send_order_delivered_email(order)
-                elif new_status == 'Out for Delivery':
-                    # Already sent OTP email above
-                    pass
-                elif new_status == 'Cancelled':
-                    send_order_status_email(order)
-                elif new_status in ['Confirmed', 'Price Shared']:
-                    # Send confirmation/price email
-                    send_order_status_email(order)
-
-            order.save()
-            messages.success(request, f"Order status updated to {new_status}")
+                    if new_status == 'Delivered':
+                        # Generate receipt if not already generated
+                        if not order.receipt_number:
+                            order.generate_receipt_number()
+                        transaction.on_commit(lambda: send_order_delivered_email(order))
+                    elif new_status == 'Out for Delivery':
+                        # Already sent OTP email above
+                        pass
+                    elif new_status == 'Cancelled':
+                        transaction.on_commit(lambda: send_order_status_email(order))
+                    elif new_status in ['Confirmed', 'Price Shared']:
+                        # Send confirmation/price email
+                        transaction.on_commit(lambda: send_order_status_email(order))
+
+                order.save()
+                messages.success(request, f"Order status updated to {new_status}")
             
         return redirect('admin_order_detail', pk=pk)
 
@@ -1572,20 +1421,6 @@ def admin_delete_daily_sales(request, pk):
     messages.success(request, "Sales record deleted.")
     return redirect('admin_daily_sales')
 
-@staff_member_required
-def admin_export_sales(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="daily_sales.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Date', 'Day', 'Total Sales', 'Online Received', 'Cash Received', 'Subtotal', 'Remark', 'Admin', 'Timestamp'])
-    
-    sales = DailySales.objects.all().order_by('-date')
-    for sale in sales:
-        writer.writerow([sale.date, sale.day, sale.total_sales, sale.online_received, sale.cash_received, sale.subtotal, sale.remark, sale.admin.username if sale.admin else 'Unknown', sale.created_at])
-        
-    return response
-
 # ------------------------------------------------------------------
 # Daily Expenditure Management
 # ------------------------------------------------------------------
@@ -1688,187 +1523,43 @@ def admin_delete_daily_expense(request, pk):
     messages.success(request, "Expense record deleted.")
     return redirect('admin_daily_expenses')
 
-@staff_member_required
-def admin_export_sales(request):
+def _export_financial_report(request, kind, list_url):
+    """CSV/TSV stream straight back; PDF/Word are built in the background (see report_exports)."""
     fmt = request.GET.get('format', 'csv')
-    sales = DailySales.objects.all().order_by('-date')
-    
-    # Define columns - updated to include labor and delivery charges
-    columns = ['Date', 'Day', 'Total Sales', 'Online', 'Cash', 'Labor Charge', 'Delivery Charge', 'Subtotal', 'Remark', 'Admin']
-    data = []
-    for sale in sales:
-        data.append([
-            str(sale.date), 
-            sale.day, 
-            str(sale.total_sales), 
-            str(sale.online_received), 
-            str(sale.cash_received),
-            str(sale.labor_charge) if sale.labor_charge is not None else '0.00',
-            str(sale.delivery_charge) if sale.delivery_charge is not None else '0.00',
-            str(sale.subtotal),
-            sale.remark, 
-            sale.admin.username if sale.admin else 'Unknown'
-        ])
-
-    if fmt == 'tsv':
-        response = HttpResponse(content_type='text/tab-separated-values')
-        response['Content-Disposition'] = 'attachment; filename="daily_sales.tsv"'
-        writer = csv.writer(response, delimiter='\t')
-        writer.writerow(columns)
-        for row in data:
-            writer.writerow(row)
-        return response
-
-    elif fmt == 'pdf':
-        from reportlab.lib.pagesizes import letter, landscape
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-        from reportlab.lib import colors
-        from reportlab.lib.styles import getSampleStyleSheet
-        
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="daily_sales.pdf"'
-        
-        # Use landscape mode for wider table with more columns
-        doc = SimpleDocTemplate(response, pagesize=landscape(letter))
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        elements.append(Paragraph("Daily Sales Report", styles['Title']))
-        
-        table_data = [columns] + data
-        t = Table(table_data)
-        t.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 0), (-1, -1), 6),
-        ]))
-        elements.append(t)
-        doc.build(elements)
-        return response
-
-    elif fmt == 'word':
-        from docx import Document
-        
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
-        response['Content-Disposition'] = 'attachment; filename="daily_sales.docx"'
-        
-        doc = Document()
-        doc.add_heading('Daily Sales Report', 0)
-        
-        table = doc.add_table(rows=1, cols=len(columns))
-        hdr_cells = table.rows[0].cells
-        for i, col in enumerate(columns):
-            hdr_cells[i].text = col
-            
-        for row in data:
-            row_cells = table.add_row().cells
-            for i, val in enumerate(row):
-                row_cells[i].text = str(val)
-                
-        doc.save(response)
-        return response
+    if fmt in report_exports.DOCUMENT_FORMATS:
+        report_exports.start_document_export(kind, fmt, request.user, site_url=request.build_absolute_uri('/'))
+        messages.info(
+            request,
+            f"Your {fmt.upper()} export is being prepared. You will get a notification "
+            "with the download link when it is ready."
+        )
+        return redirect(list_url)
+    return report_exports.stream_delimited(kind, delimiter='\t' if fmt == 'tsv' else ',')
 
-    else: # Default CSV
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="daily_sales.csv"'
-        writer = csv.writer(response)
-        writer.writerow(columns)
-        for row in data:
-            writer.writerow(row)
-        return response
+@staff_member_required
+def admin_export_sales(request):
+    return _export_financial_report(request, 'sales', 'admin_daily_sales')
 
 @staff_member_required
 def admin_export_expenses(request):
-    fmt = request.GET.get('format', 'csv')
-    expenses = DailyExpenditure.objects.all().order_by('-date')
-    
-    columns = ['Date', 'Day', 'Online Amount', 'Cash Amount', 'Total', 'Description', 'Admin']
-    data = []
-    for ex in expenses:
-        data.append([
-            str(ex.date), 
-            ex.day, 
-            str(ex.online_amount) if ex.online_amount is not None else '0.00',
-            str(ex.cash_amount) if ex.cash_amount is not None else '0.00',
-            str(ex.total),
-            ex.description, 
-            ex.admin.username if ex.admin else 'Unknown'
-        ])
-
-    if fmt == 'tsv':
-        response = HttpResponse(content_type='text/tab-separated-values')
-        response['Content-Disposition'] = 'attachment; filename="daily_expenses.tsv"'
-        writer = csv.writer(response, delimiter='\t')
-        writer.writerow(columns)
-        for row in data:
-            writer.writerow(row)
-        return response
-        
-    elif fmt == 'pdf':
-        from reportlab.lib.pagesizes import letter
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-        from reportlab.lib import colors
-        from reportlab.lib.styles import getSampleStyleSheet
-
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="daily_expenses.pdf"'
-        
-        doc = SimpleDocTemplate(response, pagesize=letter)
-        elements = []
-        styles = getSampleStyleSheet()
-        elements.append(Paragraph("Daily Expenses Report", styles['Title']))
-        
-        table_data = [columns] + data
-        t = Table(table_data)
-        t.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('FONTSIZE', (0, 0), (-1, -1), 8),
-        ]))
-        elements.append(t)
-        doc.build(elements)
-        return response
+    return _export_financial_report(request, 'expenses', 'admin_daily_expenses')
 
-    elif fmt == 'word':
-        from docx import Document
-        
-        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document')
-        response['Content-Disposition'] = 'attachment; filename="daily_expenses.docx"'
-        
-        doc = Document()
-        doc.add_heading('Daily Expenses Report', 0)
-        
-        table = doc.add_table(rows=1, cols=len(columns))
-        hdr_cells = table.rows[0].cells
-        for i, col in enumerate(columns):
-            hdr_cells[i].text = col
-            
-        for row in data:
-            row_cells = table.add_row().cells
-            for i, val in enumerate(row):
-                row_cells[i].text = str(val)
-                
-        doc.save(response)
-        return response
-
-    else: # Default CSV
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="daily_expenses.csv"'
-        writer = csv.writer(response)
-        writer.writerow(columns)
-        for row in data:
-            writer.writerow(row)
-        return response
+@staff_member_required
+def admin_export_download(request, token):
+    """Serve a finished PDF/Word export to staff."""
+    job = report_exports.get_job(token)
+    if job is None or (job['status'] == 'done' and not os.path.exists(job['path'])):
+        messages.error(request, "This export has expired. Please export again.")
+        return redirect('admin_dashboard')
+    if job['status'] == 'running':
+        messages.info(request, "This export is still being prepared. Please try again in a moment.")
+        return redirect('admin_dashboard')
+    if job['status'] == 'failed':
+        messages.error(request, "This export failed. Please export again.")
+        return redirect('admin_dashboard')
+    _, content_type = report_exports.DOCUMENT_FORMATS[job['format']]
+    return FileResponse(open(job['path'], 'rb'), as_attachment=True, filename=job['filename'],
+                        content_type=content_type)
 
 # ------------------------------------------------------------------
 # Category Management
@@ -1916,106 +1607,63 @@ def admin_category_delete(request, pk):
 # File Upload & Bulk Operations
 # ------------------------------------------------------------------
 
-def validate_columns(df, required):
-    # Normalize columns: strip, lower, replace space with underscore
-    df.columns = df.columns.astype(str).str.strip().str.lower().str.replace(' ', '_')
-    missing = [c for c in required if c not in df.columns]
-    return missing
+def _report_import(request, result, noun):
+    """Flash the outcome of a financial_import run, with a link to the error report."""
+    if result.imported:
+        messages.success(
+            request,
+            f"Successfully processed {result.imported} {noun} records "
+            f"({result.created} new, {result.updated} updated)."
+        )
+    if result.errors:
+        report_url = reverse('admin_import_error_report', args=[result.report_token])
+        messages.warning(request, format_html(
+            '{} row(s) were skipped. <a href="{}" class="alert-link">Download the error report</a>.',
+            len(result.errors), report_url,
+        ))
+    elif not result.imported:
+        messages.warning(request, "The file contained no rows to import.")
 
-@staff_member_required
-def admin_upload_sales(request):
+
+def _handle_financial_upload(request, importer, noun, list_url, title):
     if request.method == 'POST' and request.FILES.get('file'):
-        file = request.FILES['file']
         try:
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(file)
-            elif file.name.endswith('.tsv'):
-                df = pd.read_csv(file, sep='\t')
-            elif file.name.endswith('.xlsx'):
-                df = pd.read_excel(file)
-            else:
-                messages.error(request, "Invalid file format. Please upload CSV, TSV, or XLSX.")
-                return redirect('admin_daily_sales')
-
-            required = ['date', 'total_sales']
-            missing = validate_columns(df, required)
-            if missing:
-                messages.error(request, f"Missing required columns: {', '.join(missing)}")
-                return redirect('admin_daily_sales')
-                
-            count = 0
-            for _, row in df.iterrows():
-                try:
-                    date_val = pd.to_datetime(row['date']).date()
-                    DailySales.objects.update_or_create(
-                        date=date_val,
-                        defaults={
-                            'total_sales': row.get('total_sales', 0),
-                            'online_received': row.get('online_received', 0),
-                            'cash_received': row.get('cash_received', 0),
-                            'remark': row.get('remark', 'Updated via Upload'),
-                            'admin': request.user
-                        }
-                    )
-                    count += 1
-                except Exception as row_err:
-                    print(f"Skipping row: {row_err}")
-
-            messages.success(request, f"Successfully processed {count} sales records.")
-            return redirect('admin_daily_sales')
-            
+            result = importer(request.FILES['file'], request.user)
+        except financial_import.ImportFormatError as e:
+            messages.error(request, str(e))
         except Exception as e:
             messages.error(request, f"Error processing file: {e}")
-            return redirect('admin_daily_sales')
-            
-    return render(request, 'admin/admin_upload_form.html', {'title': 'Upload Daily Sales (CSV/TSV/XLSX)'})
+        else:
+            _report_import(request, result, noun)
+        return redirect(list_url)
+
+    return render(request, 'admin/admin_upload_form.html', {'title': title})
+
+
+@staff_member_required
+def admin_upload_sales(request):
+    return _handle_financial_upload(
+        request, financial_import.import_sales, 'sales', 'admin_daily_sales',
+        'Upload Daily Sales (CSV/TSV/XLSX)',
+    )
 
 @staff_member_required
 def admin_upload_expenses(request):
-    if request.method == 'POST' and request.FILES.get('file'):
-        file = request.FILES['file']
-        try:
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(file)
-            elif file.name.endswith('.tsv'):
-                df = pd.read_csv(file, sep='\t')
-            elif file.name.endswith('.xlsx'):
-                df = pd.read_excel(file)
-            else:
-                messages.error(request, "Invalid file format. Please upload CSV, TSV, or XLSX.")
-                return redirect('admin_daily_expenses')
-
-            # Required: Date, Online Amount, Cash Amount
-            # Mappable column names
-            required = ['date']
-            missing = validate_columns(df, required)
-            if missing:
-                messages.error(request, f"Missing required columns: {', '.join(missing)}")
-                return redirect('admin_daily_expenses')
-                
-            count = 0
-            for _, row in df.iterrows():
-                try:
-                    date_val = pd.to_datetime(row['date']).date()
-                    DailyExpenditure.objects.create(
-                        date=date_val,
-                        online_amount=row.get('online_amount', 0) or 0,
-                        cash_amount=row.get('cash_amount', 0) or 0,
-                        description=row.get('description', 'Imported Expense'),
-                        admin=request.user
-                    )
-                    count += 1
-                except Exception as row_err:
-                    print(f"Skipping row: {row_err}")
-                    
-            messages.success(request, f"Successfully imported {count} expense records.")
-            return redirect('admin_daily_expenses')
-            
-        except Exception as e:
-            messages.error(request, f"Error processing file: {e}")
-            return redirect('admin_daily_expenses')
-            
-    return render(request, 'admin/admin_upload_form.html', {'title': 'Upload Daily Expenses (CSV/TSV/XLSX)'})
+    return _handle_financial_upload(
+        request, financial_import.import_expenses, 'expense', 'admin_daily_expenses',
+        'Upload Daily Expenses (CSV/TSV/XLSX)',
+    )
+
+@staff_member_required
+def admin_import_error_report(request, token):
+    """Download the rows rejected by a sales/expense upload as CSV."""
+    report = financial_import.get_error_report(token)
+    if report is None:
+        messages.error(request, "This error report has expired. Upload the file again to regenerate it.")
+        return redirect('admin_daily_sales')
+    response = HttpResponse(report, content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="import_errors_{token[:8]}.csv"'
+    return response
 
 
 
@@ -2098,15 +1746,15 @@ def admin_notification_create(request):
             form.save_m2m()  # Save many-to-many relationship
             
             # Create UserNotification records for targeted users
-            target_users = notification.get_target_users_queryset()
-            created_count = 0
-            
-            for user in target_users:
-                UserNotification.objects.get_or_create(
-                    user=user,
-                    notification=notification
-                )
-                created_count += 1
+            target_ids = list(notification.get_target_users_queryset().values_list('pk', flat=True))
+            UserNotification.objects.bulk_create(
+                [UserNotification(user_id=user_id, notification=notification) for user_id in target_ids],
+                batch_size=500,
+                ignore_conflicts=True,
+            )
+            created_count = len(target_ids)
+            # bulk_create sends no signals: refresh every header's unread count at once
+            invalidate_all_header_summaries()
             
             messages.success(request, f"Notification created and sent to {created_count} user(s)!")
             
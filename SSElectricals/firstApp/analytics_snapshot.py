@@ -0,0 +1,359 @@
+"""
+Analytics snapshot for the admin analytics dashboard (admin_analytics_new).
+
+All DailySales and DailyExpenditure rows are read once (two values_list
+queries) into compact NumPy arrays; overall totals, min/max days, the best
+month, weekday, yearly and quarterly series are then derived from those arrays
+with bincount/unique instead of one aggregate query per chart. The snapshot is
+stored in the shared cache under the current data version, and every worker
+keeps the last snapshot it used in memory.
+
+The data version is bumped (receivers in admin.py) whenever a DailySales or
+DailyExpenditure row is saved or deleted; code that writes those tables
+without signals (bulk_create, queryset.update) must call bump_data_version().
+
+Range-filtered series (monthly, comparison, expense trend) depend on today's
+date, so they are sliced out of the cached arrays per request - a few
+microseconds, no queries.
+
+analytics_api responses are cached the same way, keyed on
+(mode, start_date, end_date, month) plus the data version and today's date
+(the embedded forecast is anchored on it); after every bump a
+background thread rebuilds the snapshot and the API_PRESETS responses for all
+modes so the first request after a save is already warm.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import NamedTuple
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'analytics:data_version'
+SNAPSHOT_KEY = 'analytics:snapshot:{version}'
+SNAPSHOT_TTL = 60 * 60 * 24
+
+API_CACHE_KEY = 'analytics:api:{digest}'
+API_CACHE_TTL = 60 * 60 * 24
+API_MODES = ('sales', 'expenses', 'combined')
+API_PRESETS = ('this_month', 'last_6_months', 'last_year')
+WARM_DELAY_SECONDS = 2  # let a burst of saves settle before warming
+
+WEEKDAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+_EPOCH_WEEKDAY = 3  # 1970-01-01 was a Thursday
+
+
+class Snapshot(NamedTuple):
+    version: int
+    # Daily sales, ordered by date
+    sales_dates: np.ndarray  # datetime64[D]
+    sales_total: np.ndarray
+    sales_online: np.ndarray
+    sales_cash: np.ndarray
+    sales_labor: np.ndarray
+    sales_delivery: np.ndarray
+    # Daily expenses, ordered by date
+    expense_dates: np.ndarray  # datetime64[D]
+    expense_total: np.ndarray
+    expense_online: np.ndarray
+    expense_cash: np.ndarray
+    # Derived, all time
+    totals: dict
+    min_sale_day: dict  # {'date', 'total_sales'} or None
+    max_sale_day: dict
+    best_month: tuple  # (label, total) or ('N/A', 0)
+    available_years: list  # newest first
+    weekday_labels: list  # Monday..Sunday, days with entries only
+    weekday_values: list
+    yearly_labels: list
+    yearly_values: list
+    quarterly: dict  # year -> (labels, values)
+    sales_dates_json: str
+    sales_values_json: str
+
+
+# ---- data version ----
+
+def data_version():
+    return cache.get_or_set(VERSION_KEY, 1, None)
+
+
+def bump_data_version():
+    """Called after DailySales/DailyExpenditure writes (see admin.py)."""
+    global _snapshot
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, None)
+    _snapshot = None
+    if getattr(settings, 'ANALYTICS_WARM_CACHE', True):
+        warm_in_background()
+
+
+# ---- building ----
+
+def _column(rows, index):
+    return np.fromiter((float(row[index] or 0) for row in rows), dtype=float, count=len(rows))
+
+
+def _dates(rows):
+    return np.array([row[0] for row in rows], dtype='datetime64[D]')
+
+
+def _to_date(value):
+    return value.astype('datetime64[D]').astype(datetime.date)
+
+
+def _round(values):
+    return [round(float(v), 2) for v in values]
+
+
+def group_by_month(dates, values):
+    """(month starts as datetime64[M], totals) for the months that have entries."""
+    if not len(dates):
+        return np.array([], dtype='datetime64[M]'), np.array([], dtype=float)
+    months, inverse = np.unique(dates.astype('datetime64[M]'), return_inverse=True)
+    return months, np.bincount(inverse, weights=values, minlength=len(months))
+
+
+def month_labels(months, fmt='%b %Y'):
+    return [_to_date(month).strftime(fmt) for month in months]
+
+
+def _build(version):
+    from .models import DailyExpenditure, DailySales
+
+    sales = list(DailySales.objects.order_by('date').values_list(
+        'date', 'total_sales', 'online_received', 'cash_received', 'labor_charge', 'delivery_charge'))
+    expenses = list(DailyExpenditure.objects.order_by('date').values_list(
+        'date', 'total', 'online_amount', 'cash_amount'))
+
+    sales_dates = _dates(sales)
+    sales_total = _column(sales, 1)
+    sales_online = _column(sales, 2)
+    sales_cash = _column(sales, 3)
+    sales_labor = _column(sales, 4)
+    sales_delivery = _column(sales, 5)
+    expense_dates = _dates(expenses)
+    expense_total = _column(expenses, 1)
+    expense_online = _column(expenses, 2)
+    expense_cash = _column(expenses, 3)
+
+    totals = {
+        'total_sales': sales_total.sum(),
+        'total_online_sales': sales_online.sum(),
+        'total_cash_sales': sales_cash.sum(),
+        'total_labor': sales_labor.sum(),
+        'total_delivery': sales_delivery.sum(),
+        'total_expense': expense_total.sum(),
+        'total_online_exp': expense_online.sum(),
+        'total_cash_exp': expense_cash.sum(),
+    }
+    totals = {key: round(float(value), 2) for key, value in totals.items()}
+    totals['sales_count'] = len(sales)
+    totals['expense_count'] = len(expenses)
+
+    min_sale_day = max_sale_day = None
+    best_month = ('N/A', 0)
+    weekday_labels, weekday_values = [], []
+    yearly_labels, yearly_values = [], []
+    quarterly = {}
+    available_years = []
+
+    if len(sales):
+        low, high = int(sales_total.argmin()), int(sales_total.argmax())
+        min_sale_day = {'date': sales[low][0], 'total_sales': sales_total[low]}
+        max_sale_day = {'date': sales[high][0], 'total_sales': sales_total[high]}
+
+        months, month_totals = group_by_month(sales_dates, sales_total)
+        best = int(month_totals.argmax())
+        best_month = (_to_date(months[best]).strftime('%B %Y'), round(float(month_totals[best]), 2))
+
+        weekdays = (sales_dates.astype(np.int64) + _EPOCH_WEEKDAY) % 7
+        weekday_totals = np.bincount(weekdays, weights=sales_total, minlength=7)
+        weekday_counts = np.bincount(weekdays, minlength=7)
+        for index, name in enumerate(WEEKDAY_NAMES):
+            if weekday_counts[index]:
+                weekday_labels.append(name)
+                weekday_values.append(round(float(weekday_totals[index]), 2))
+
+        years = sales_dates.astype('datetime64[Y]').astype(np.int64) + 1970
+        year_values, year_index = np.unique(years, return_inverse=True)
+        yearly_labels = [str(year) for year in year_values]
+        yearly_values = _round(np.bincount(year_index, weights=sales_total))
+        available_years = [int(year) for year in year_values[::-1]]
+
+        quarters = (sales_dates.astype('datetime64[M]').astype(np.int64) % 12) // 3
+        for year in year_values:
+            in_year = years == year
+            quarter_totals = np.bincount(quarters[in_year], weights=sales_total[in_year], minlength=4)
+            present = np.bincount(quarters[in_year], minlength=4) > 0
+            quarterly[int(year)] = (
+                [f"Q{q + 1}" for q in range(4) if present[q]],
+                _round(quarter_totals[present]),
+            )
+
+    return Snapshot(
+        version=version,
+        sales_dates=sales_dates,
+        sales_total=sales_total,
+        sales_online=sales_online,
+        sales_cash=sales_cash,
+        sales_labor=sales_labor,
+        sales_delivery=sales_delivery,
+        expense_dates=expense_dates,
+        expense_total=expense_total,
+        expense_online=expense_online,
+        expense_cash=expense_cash,
+        totals=totals,
+        min_sale_day=min_sale_day,
+        max_sale_day=max_sale_day,
+        best_month=best_month,
+        available_years=available_years,
+        weekday_labels=weekday_labels,
+        weekday_values=weekday_values,
+        yearly_labels=yearly_labels,
+        yearly_values=yearly_values,
+        quarterly=quarterly,
+        sales_dates_json=json.dumps(np.datetime_as_string(sales_dates).tolist()),
+        sales_values_json=json.dumps(sales_total.tolist()),
+    )
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def get_snapshot():
+    """The current Snapshot: this worker's copy, the shared cache, or a fresh build."""
+    global _snapshot
+    version = data_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    with _lock:
+        if _snapshot is None or _snapshot.version != version:
+            key = SNAPSHOT_KEY.format(version=version)
+            snapshot = cache.get(key)
+            if snapshot is None:
+                snapshot = _build(version)
+                cache.set(key, snapshot, SNAPSHOT_TTL)
+            _snapshot = snapshot
+        return _snapshot
+
+
+# ---- range-filtered series ----
+
+def _in_range(dates, start, end):
+    if start and end:
+        return (dates >= np.datetime64(start, 'D')) & (dates <= np.datetime64(end, 'D'))
+    return np.ones(len(dates), dtype=bool)
+
+
+def monthly_sales(snapshot, start=None, end=None):
+    """(labels, values) of monthly sales totals between start and end (all time if unset)."""
+    mask = _in_range(snapshot.sales_dates, start, end)
+    months, totals = group_by_month(snapshot.sales_dates[mask], snapshot.sales_total[mask])
+    return month_labels(months), _round(totals)
+
+
+def sales_vs_expenses(snapshot, start=None, end=None):
+    """(labels, sales, expenses) per month with sales; expenses are matched to those months."""
+    sales_mask = _in_range(snapshot.sales_dates, start, end)
+    expense_mask = _in_range(snapshot.expense_dates, start, end)
+    months, sales = group_by_month(snapshot.sales_dates[sales_mask], snapshot.sales_total[sales_mask])
+    expense_months, expenses = group_by_month(
+        snapshot.expense_dates[expense_mask], snapshot.expense_total[expense_mask])
+    matched = np.zeros(len(months))
+    if len(expense_months):
+        position = np.searchsorted(expense_months, months).clip(max=len(expense_months) - 1)
+        found = expense_months[position] == months
+        matched[found] = expenses[position[found]]
+    return month_labels(months), _round(sales), _round(matched)
+
+
+def daily_expenses(snapshot, start=None, end=None):
+    """(dates as YYYY-MM-DD, totals) of daily expenses between start and end."""
+    mask = _in_range(snapshot.expense_dates, start, end)
+    return np.datetime_as_string(snapshot.expense_dates[mask]).tolist(), snapshot.expense_total[mask].tolist()
+
+
+# ---- analytics_api responses ----
+
+def api_etag(params, version=None):
+    """ETag for an analytics_api response: the filters, the data version and the day (the forecast starts tomorrow)."""
+    if version is None:
+        version = data_version()
+    today = timezone.localdate().isoformat()
+    digest = hashlib.md5(json.dumps([version, today, *params]).encode()).hexdigest()
+    return '"%s"' % digest
+
+
+def get_api_payload(params, builder):
+    """Cached analytics_api payload for params, computed with builder(*params) on a miss."""
+    key = API_CACHE_KEY.format(digest=api_etag(params).strip('"'))
+    payload = cache.get(key)
+    if payload is None:
+        payload = builder(*params)
+        cache.set(key, payload, API_CACHE_TTL)
+    return payload
+
+
+def preset_params(mode, preset):
+    """The (mode, start_date, end_date, month) tuple analytics_api resolves ?range=preset to."""
+    from .admin_views import get_date_range_filter
+
+    start, end = get_date_range_filter(preset)
+    return (mode, start.isoformat(), end.isoformat(), '')
+
+
+def warm_caches():
+    """Rebuild the snapshot and the preset analytics_api responses for the current version."""
+    from .admin_views import build_analytics_payload
+
+    get_snapshot()
+    for preset in API_PRESETS:
+        for mode in API_MODES:
+            get_api_payload(preset_params(mode, preset), build_analytics_payload)
+
+
+_warm_state = {'running': False, 'again': False}
+_warm_lock = threading.Lock()
+
+
+def warm_in_background():
+    """Start (or re-arm) the warming thread; overlapping bumps collapse into one more pass."""
+    with _warm_lock:
+        if _warm_state['running']:
+            _warm_state['again'] = True
+            return
+        _warm_state['running'] = True
+    threading.Thread(target=_warm_loop, daemon=True).start()
+
+
+def _warm_loop():
+    from django.db import close_old_connections
+    try:
+        while True:
+            time.sleep(WARM_DELAY_SECONDS)
+            try:
+                warm_caches()
+            except Exception as e:
+                logger.error(f"Analytics cache warm-up failed: {e}")
+            with _warm_lock:
+                if not _warm_state['again']:
+                    _warm_state['running'] = False
+                    return
+                _warm_state['again'] = False
+    finally:
+        close_old_connections()
@@ -0,0 +1,94 @@
+"""
+Cart checkout: turns a user's cart into an enquiry Order.
+
+The cart is loaded once with its products (select_related), and that list is
+used for the summary, the total and the order items. place_enquiry then
+runs in a single transaction with a fixed number of queries, however many
+lines the cart has:
+
+1. lock the cart's products and check their stock (one SELECT ... FOR UPDATE);
+2. INSERT the Order;
+3. bulk_create the OrderItems;
+4. bump the user's total_orders_count with F() (no full-row save);
+5. empty the cart (and drop the user's cached header counts).
+
+Stock is only checked here; it is reduced when an admin confirms the order.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+from .context_processors import invalidate_header_summary
+
+
+class OutOfStock(Exception):
+    """One or more cart lines ask for more than is in stock."""
+
+    def __init__(self, products):
+        self.products = products  # names of the products that are short
+        super().__init__(', '.join(products))
+
+
+class CartContents:
+    """A cart's lines with their products, loaded in one query."""
+
+    def __init__(self, cart):
+        from .models import CartItem
+
+        self.cart = cart
+        self.items = list(
+            CartItem.objects.filter(cart=cart).select_related('product').order_by('pk')
+        )
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def total_price(self):
+        return sum((item.total_price for item in self.items), Decimal('0.00'))
+
+    def short_products(self):
+        """Names of products whose loaded stock is below the quantity asked for."""
+        return [item.product.name for item in self.items if item.product.stock_quantity < item.quantity]
+
+
+def _check_stock(contents):
+    """Lock the cart's products and re-check stock against the locked rows."""
+    from .models import Product
+
+    stock = dict(
+        Product.objects.select_for_update()
+        .filter(pk__in={item.product_id for item in contents})
+        .values_list('pk', 'stock_quantity')
+    )
+    short = [item.product.name for item in contents if stock.get(item.product_id, 0) < item.quantity]
+    if short:
+        raise OutOfStock(short)
+
+
+def place_enquiry(user, contents, **order_fields):
+    """Create the enquiry Order for contents and empty the cart; returns the order.
+
+    Raises OutOfStock (and writes nothing) if stock ran out since the cart was loaded.
+    """
+    from .models import CartItem, CustomUser, Order, OrderItem
+
+    with transaction.atomic():
+        _check_stock(contents)
+        order = Order.objects.create(user=user, **order_fields)
+        # Enquiry-based: prices are 0 until admin confirms
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product_id=item.product_id, quantity=item.quantity, price=Decimal('0.00'))
+            for item in contents
+        ])
+        CustomUser.objects.filter(pk=user.pk).update(total_orders_count=F('total_orders_count') + 1)
+        CartItem.objects.filter(pk__in=[item.pk for item in contents]).delete()
+        transaction.on_commit(lambda: invalidate_header_summary(user.pk))
+
+    user.total_orders_count += 1
+    contents.items = []
+    return order
@@ -0,0 +1,105 @@
+"""
+Storefront product catalogue pagination.
+
+Sorts with a stable, indexed ordering (newest, price low/high) are served with
+keyset (seek) pagination: each page is fetched with a WHERE on the last row of
+the previous page instead of OFFSET, so page 200 costs the same as page 1 and
+no COUNT(*) is needed. Other sorts fall back to Django's Paginator.
+"""
+import base64
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+
+CATALOG_PAGE_SIZE = 24
+CATALOG_MAX_PAGE_SIZE = 60
+
+# sort key -> (column, descending)
+KEYSET_SORTS = {
+    'newest': ('created_at', True),
+    'price_low': ('price', False),
+    'price_high': ('price', True),
+}
+DEFAULT_SORT = 'newest'
+
+
+def get_page_size(value):
+    """Parse a requested page size, clamped to 1..CATALOG_MAX_PAGE_SIZE."""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return CATALOG_PAGE_SIZE
+    return max(1, min(size, CATALOG_MAX_PAGE_SIZE))
+
+
+def encode_cursor(product, column):
+    """Encode the (column value, id) of the last product on a page."""
+    value = getattr(product, column)
+    raw = f"{value.isoformat() if column == 'created_at' else value}|{product.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, column):
+    """Decode a cursor back to (value, id). Returns None for malformed input."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw_value, raw_id = base64.urlsafe_b64decode(padded.encode()).decode().rsplit('|', 1)
+        value = datetime.fromisoformat(raw_value) if column == 'created_at' else Decimal(raw_value)
+        return value, int(raw_id)
+    except (ValueError, TypeError, InvalidOperation, UnicodeDecodeError):
+        return None
+
+
+class CataloguePage:
+    """One page of products, in either keyset or numbered mode."""
+
+    def __init__(self, object_list, is_keyset, has_next=False, next_cursor=None, page=None):
+        self.object_list = object_list
+        self.is_keyset = is_keyset
+        self.has_next = has_next
+        self.next_cursor = next_cursor
+        self.page = page  # django Page for numbered mode
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def paginate_catalogue(queryset, sort, cursor=None, page_number=None, page_size=CATALOG_PAGE_SIZE):
+    """
+    Paginate a product queryset for the storefront listing.
+
+    Keyset sorts order by (column, id) and read page_size + 1 rows to detect a
+    next page. Unknown cursors restart from the first page.
+    """
+    sort = sort or DEFAULT_SORT
+
+    if sort in KEYSET_SORTS:
+        column, descending = KEYSET_SORTS[sort]
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(f'{prefix}{column}', f'{prefix}id')
+
+        position = decode_cursor(cursor, column) if cursor else None
+        if position:
+            value, last_id = position
+            op = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{column}__{op}': value}) | Q(**{column: value, f'id__{op}': last_id})
+            )
+
+        rows = list(queryset[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1], column) if has_next else None
+        return CataloguePage(rows, is_keyset=True, has_next=has_next, next_cursor=next_cursor)
+
+    if sort == 'rating':
+        queryset = queryset.order_by('-rating_avg', '-rating_count', '-id')
+    # any other sort (e.g. 'relevance' from search.py) keeps the queryset's own ordering
+    page = Paginator(queryset, page_size).get_page(page_number)
+    return CataloguePage(list(page.object_list), is_keyset=False, has_next=page.has_next(), page=page)
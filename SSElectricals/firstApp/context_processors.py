@@ -2,22 +2,156 @@
 Context processors for firstApp.
 Makes certain data available to all templates.
 """
+from typing import NamedTuple
+
+from django.core.cache import cache
+from django.db import models
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+
 from .models import SiteAnnouncement
 
 
+ANNOUNCEMENT_VERSION_KEY = 'announcements:version'
+ANNOUNCEMENT_CACHE_KEY = 'announcements:{version}:{audience}'
+ANNOUNCEMENT_MAX_TTL = 60 * 60  # re-check at least hourly even with no schedule boundary
+
+
+def invalidate_announcement_cache():
+    """Bump the announcements version so every audience bucket is reloaded."""
+    try:
+        cache.incr(ANNOUNCEMENT_VERSION_KEY)
+    except ValueError:
+        cache.set(ANNOUNCEMENT_VERSION_KEY, 1, None)
+
+
+def _load_announcements(audience, now):
+    """
+    Fetch active announcements for an audience with one query.
+
+    Also looks at scheduled (not yet started) announcements to find the next
+    start_date/end_date boundary, which is when the cached set goes stale.
+    """
+    excluded = 'logged_in' if audience == 'guest' else 'guests'
+    candidates = list(
+        SiteAnnouncement.objects.filter(is_active=True)
+        .filter(models.Q(end_date__isnull=True) | models.Q(end_date__gte=now))
+        .exclude(target_audience=excluded)
+    )
+
+    active = []
+    boundaries = []
+    for announcement in candidates:
+        if announcement.start_date and announcement.start_date > now:
+            boundaries.append(announcement.start_date)
+            continue
+        active.append(announcement)
+        if announcement.end_date:
+            boundaries.append(announcement.end_date)
+
+    expires_at = min(boundaries) if boundaries else None
+    return active, expires_at
+
+
+def get_cached_announcements(audience):
+    """Active announcements for 'guest' or 'user', cached until the next schedule boundary."""
+    now = timezone.now()
+    version = cache.get_or_set(ANNOUNCEMENT_VERSION_KEY, 1, None)
+    key = ANNOUNCEMENT_CACHE_KEY.format(version=version, audience=audience)
+
+    cached = cache.get(key)
+    if cached is not None:
+        announcements, expires_at = cached
+        if expires_at is None or now < expires_at:
+            return announcements
+
+    announcements, expires_at = _load_announcements(audience, now)
+    ttl = ANNOUNCEMENT_MAX_TTL
+    if expires_at is not None:
+        ttl = max(1, min(ttl, int((expires_at - now).total_seconds()) + 1))
+    cache.set(key, (announcements, expires_at), ttl)
+    return announcements
+
+
 def site_announcements(request):
     """
     Adds active site announcements to the template context.
     """
     user = request.user if hasattr(request, 'user') else None
-    announcements = SiteAnnouncement.get_active_announcements(user)
-    
-    # Separate by position
-    center_announcements = announcements.filter(position__in=['center', 'both'])
-    toast_announcements = announcements.filter(position__in=['bottom_right', 'both'])
-    
+    audience = 'user' if user and user.is_authenticated else 'guest'
+    announcements = get_cached_announcements(audience)
+
+    # Separate by position (in Python, from the single cached fetch)
+    center_announcements = [a for a in announcements if a.position in ('center', 'both')]
+    toast_announcements = [a for a in announcements if a.position in ('bottom_right', 'both')]
+
     return {
         'site_announcements': announcements,
         'center_announcements': center_announcements,
         'toast_announcements': toast_announcements,
     }
+
+
+# ---- Header summary (cart badge, unread notifications, theme) ----
+
+HEADER_VERSION_KEY = 'header:version'  # bumped when a notification reaches many users at once
+HEADER_CACHE_KEY = 'header:{version}:{user_id}'
+HEADER_TTL = 60 * 60 * 24
+
+
+class HeaderSummary(NamedTuple):
+    cart_count: int  # cart lines
+    unread_notifications: int
+    theme: str
+
+
+def _header_key(user_id):
+    version = cache.get_or_set(HEADER_VERSION_KEY, 1, None)
+    return HEADER_CACHE_KEY.format(version=version, user_id=user_id)
+
+
+def invalidate_header_summary(user_id):
+    """Drop one user's cached header counts (after a cart change or a notification read)."""
+    cache.delete(_header_key(user_id))
+
+
+def invalidate_all_header_summaries():
+    """Bump the header version so every user's counts are reloaded (notification fan-out)."""
+    try:
+        cache.incr(HEADER_VERSION_KEY)
+    except ValueError:
+        cache.set(HEADER_VERSION_KEY, 1, None)
+
+
+def _load_header_counts(user):
+    from .models import CartItem, UserNotification
+
+    counts = CartItem.objects.filter(cart__user=user).aggregate(
+        cart_count=models.Count('pk'),
+    )
+    counts['unread_notifications'] = UserNotification.objects.filter(
+        user=user, is_read=False, notification__is_active=True,
+    ).count()
+    return counts
+
+
+def get_header_summary(user):
+    """HeaderSummary for an authenticated user; counts come from the cache when warm."""
+    key = _header_key(user.pk)
+    counts = cache.get(key)
+    if counts is None:
+        counts = _load_header_counts(user)
+        cache.set(key, counts, HEADER_TTL)
+    # The theme is a column of the user row the auth middleware already loaded
+    return HeaderSummary(theme=user.theme_preference, **counts)
+
+
+def header_summary(request):
+    """
+    Adds `header` (HeaderSummary or None for guests) for base.html.
+    Lazy, so pages that never render the header don't touch the cache.
+    """
+    user = getattr(request, 'user', None)
+    if not (user and user.is_authenticated):
+        return {'header': None}
+    return {'header': SimpleLazyObject(lambda: get_header_summary(user))}
@@ -0,0 +1,288 @@
+"""
+Uploaded analytics data files (media/data/*.csv|.tsv|.xlsx).
+
+Each upload is parsed with pandas once. The parsed frame is stored next to
+the source as a columnar file (Parquet when pyarrow is installed, otherwise a
+pandas pickle), together with a JSON summary holding the totals, product
+breakdown, trend prediction and per-column stats. Both are keyed by the
+source file's name, size and mtime, so replacing a file invalidates them
+automatically.
+
+The analytics files page renders from the summary alone. The raw rows are
+fetched page by page from admin_analytics_file_rows, served from the cached
+frame; each worker also keeps the last few frames in memory.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+DATA_EXTENSIONS = ('.xlsx', '.tsv', '.csv')
+CACHE_DIRNAME = '.cache'
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+FRAME_LRU_SIZE = 4
+SUMMARY_VERSION = 1  # bump when _summarize changes shape
+
+
+def data_dir():
+    return os.path.join(settings.MEDIA_ROOT, 'data')
+
+
+def _cache_dir():
+    return os.path.join(data_dir(), CACHE_DIRNAME)
+
+
+def list_files():
+    directory = data_dir()
+    if not os.path.isdir(directory):
+        return []
+    return sorted(f for f in os.listdir(directory) if f.endswith(DATA_EXTENSIONS))
+
+
+def source_path(filename):
+    """Absolute path of an uploaded data file, or None if the name is not one of them."""
+    if filename not in list_files():
+        return None
+    return os.path.join(data_dir(), filename)
+
+
+def _cache_stem(path):
+    stat = os.stat(path)
+    key = f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}:{SUMMARY_VERSION}"
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return os.path.join(_cache_dir(), f"{os.path.basename(path)}.{digest}")
+
+
+# ---- parsing ----
+
+def _read_source(path):
+    if path.endswith('.tsv'):
+        df = pd.read_csv(path, sep='\t')
+    elif path.endswith('.csv'):
+        df = pd.read_csv(path)
+    else:
+        df = pd.read_excel(path)
+    # Normalize column names to lowercase for safer access
+    df.columns = df.columns.astype(str).str.lower()
+    return df
+
+
+def _first_column(df, *names):
+    return next((name for name in names if name in df.columns), None)
+
+
+def _column_total(df, *names):
+    column = _first_column(df, *names)
+    if column is None:
+        return 0
+    return float(pd.to_numeric(df[column], errors='coerce').sum())
+
+
+def _trend(df, target_col):
+    """Daily totals of target_col with a linear trend and a 7-day projection."""
+    df_trend = df[['date', target_col]].copy()
+    df_trend['date'] = pd.to_datetime(df_trend['date'], errors='coerce')
+    df_trend[target_col] = pd.to_numeric(df_trend[target_col], errors='coerce')
+    daily_data = df_trend.dropna().groupby('date')[target_col].sum().sort_index()
+    if len(daily_data) <= 1:
+        return None
+
+    # Linear Regression: y = mx + c over ordinal dates
+    X = np.array([d.toordinal() for d in daily_data.index], dtype=float)
+    y = daily_data.to_numpy(dtype=float)
+    slope, intercept = np.polyfit(X, y, 1)
+
+    last_date = daily_data.index.max()
+    future_dates = [last_date + datetime.timedelta(days=i) for i in range(1, 8)]
+    future_ordinals = np.array([d.toordinal() for d in future_dates], dtype=float)
+
+    return {
+        'labels': [d.strftime('%Y-%m-%d') for d in daily_data.index] + [d.strftime('%Y-%m-%d') for d in future_dates],
+        'actual': y.tolist() + [None] * len(future_dates),
+        'trend': (slope * X + intercept).tolist() + (slope * future_ordinals + intercept).tolist(),
+    }
+
+
+def _column_stats(df):
+    stats = []
+    for column in df.columns:
+        series = df[column]
+        entry = {'name': column, 'dtype': str(series.dtype), 'non_null': int(series.notna().sum())}
+        if pd.api.types.is_numeric_dtype(series) and entry['non_null']:
+            entry.update(min=float(series.min()), max=float(series.max()), mean=float(series.mean()))
+        stats.append(entry)
+    return stats
+
+
+def _summarize(df):
+    summary = {
+        'rows': len(df),
+        'columns': list(df.columns),
+        'column_stats': _column_stats(df),
+        'total_revenue': _column_total(df, 'price', 'total'),
+        'total_delivery': _column_total(df, 'delivery', 'delivery_charge'),
+        'total_distance': _column_total(df, 'distance'),
+        'product_sales': [],
+        'trend': None,
+    }
+    if {'product', 'quantity', 'price'} <= set(df.columns):
+        product_sales = df.groupby('product').agg({'quantity': 'sum', 'price': 'sum'}).reset_index()
+        summary['product_sales'] = [
+            {'name': str(row['product']), 'quantity': float(row['quantity']), 'sales': float(row['price'])}
+            for _, row in product_sales.iterrows()
+        ]
+    target_col = _first_column(df, 'price', 'total', 'sales')
+    if 'date' in df.columns and target_col:
+        try:
+            summary['trend'] = _trend(df, target_col)
+        except Exception as e:
+            logger.warning(f"Trend prediction failed: {e}")
+    return summary
+
+
+# ---- columnar cache ----
+
+def _write_frame(df, stem):
+    """Store df as Parquet (pyarrow) or a pickle; returns the path written."""
+    try:
+        df.to_parquet(stem + '.parquet', index=False)
+        return stem + '.parquet'
+    except ImportError:
+        pass
+    except Exception as e:  # e.g. mixed-type object columns Parquet cannot encode
+        logger.info(f"Parquet cache unavailable for {stem}: {e}")
+        if os.path.exists(stem + '.parquet'):
+            os.remove(stem + '.parquet')
+    df.to_pickle(stem + '.pkl')
+    return stem + '.pkl'
+
+
+def _read_frame(stem):
+    if os.path.exists(stem + '.parquet'):
+        return pd.read_parquet(stem + '.parquet')
+    if os.path.exists(stem + '.pkl'):
+        return pd.read_pickle(stem + '.pkl')
+    return None
+
+
+def _remove_stale(filename, keep_stem=None):
+    directory = _cache_dir()
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        stem = os.path.splitext(path)[0]
+        if name.startswith(filename + '.') and stem != keep_stem:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+_frames = OrderedDict()  # stem -> DataFrame, most recently used last
+_lock = threading.Lock()
+
+
+def _remember(stem, df):
+    with _lock:
+        _frames[stem] = df
+        _frames.move_to_end(stem)
+        while len(_frames) > FRAME_LRU_SIZE:
+            _frames.popitem(last=False)
+
+
+def build_cache(filename):
+    """Parse the source file and (re)write its frame and summary; returns (df, summary)."""
+    path = source_path(filename)
+    stem = _cache_stem(path)
+    df = _read_source(path)
+    summary = _summarize(df)
+    os.makedirs(_cache_dir(), exist_ok=True)
+    _write_frame(df, stem)
+    with open(stem + '.json', 'w') as f:
+        json.dump(summary, f)
+    _remove_stale(filename, keep_stem=stem)
+    _remember(stem, df)
+    return df, summary
+
+
+def get_summary(filename):
+    """Cached summary for an uploaded file (parsing it on first use), or None if unknown."""
+    path = source_path(filename)
+    if path is None:
+        return None
+    stem = _cache_stem(path)
+    try:
+        with open(stem + '.json') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return build_cache(filename)[1]
+
+
+def get_frame(filename):
+    path = source_path(filename)
+    if path is None:
+        return None
+    stem = _cache_stem(path)
+    with _lock:
+        df = _frames.get(stem)
+        if df is not None:
+            _frames.move_to_end(stem)
+            return df
+    df = _read_frame(stem)
+    if df is None:
+        return build_cache(filename)[0]
+    _remember(stem, df)
+    return df
+
+
+def _json_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or value is pd.NaT or value is pd.NA or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def get_page(filename, page=1, page_size=PAGE_SIZE):
+    """One page of rows as JSON-ready dict, or None if the file is unknown."""
+    df = get_frame(filename)
+    if df is None:
+        return None
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    pages = max(1, math.ceil(len(df) / page_size))
+    page = max(1, min(int(page), pages))
+    chunk = df.iloc[(page - 1) * page_size:page * page_size]
+    return {
+        'file': filename,
+        'columns': list(df.columns),
+        'rows': [[_json_value(value) for value in row] for row in chunk.itertuples(index=False, name=None)],
+        'page': page,
+        'pages': pages,
+        'page_size': page_size,
+        'total_rows': len(df),
+    }
+
+
+def forget(filename):
+    """Drop every cached artefact of a data file (called when it is deleted)."""
+    with _lock:
+        for stem in [s for s in _frames if os.path.basename(s).startswith(filename + '.')]:
+            del _frames[stem]
+    _remove_stale(filename)
@@ -1,16 +1,21 @@
 """
 Professional Email Utilities for SSElectricals
 Handles all email sending with logging, retry logic, and HTML templates
+
+Emails are rendered in the request and queued as EmailLog rows (outbox);
+`python manage.py run_email_worker` delivers them in batches.
 """
 
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.template.loader import render_to_string
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
 from .models import EmailLog, Order, Appointment
 import logging
+from datetime import timedelta
 from typing import Optional, Dict, Any
-from threading import Thread
 
 logger = logging.getLogger(__name__)
 
@@ -36,7 +41,10 @@ def send_professional_email(
     high_priority: bool = False
 ) -> bool:
     """
-    Send professional HTML email with logging and error handling
+    Render a professional HTML email and queue it in the EmailLog outbox
+    
+    The template is rendered here (inside the request) and stored on a PENDING
+    EmailLog row; `manage.py run_email_worker` delivers it over SMTP.
     
     Args:
         email_type: Type of email from EmailLog.EMAIL_TYPE_CHOICES
@@ -47,10 +55,10 @@ def send_professional_email(
         order: Related order object (optional)
         appointment: Related appointment object (optional)
         attachments: List of (filename, content, mimetype) tuples
-        high_priority: Whether to set X-Priority header
+        high_priority: Whether to set X-Priority header and deliver first
     
     Returns:
-        bool: True if sent successfully, False otherwise
+        bool: True if queued successfully, False otherwise
     """
     
     # Create email log entry
@@ -60,7 +68,8 @@ def send_professional_email(
         subject=subject,
         status='PENDING',
         order=order,
-        appointment=appointment
+        appointment=appointment,
+        priority=0 if high_priority else 5,
     )
     
     try:
@@ -75,60 +84,166 @@ def send_professional_email(
         from django.utils.html import strip_tags
         text_content = strip_tags(html_content)
         
-        # Create email
-        email = EmailMultiAlternatives(
-            subject=subject,
-            body=text_content,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[recipient]
-        )
-        
-        # Attach HTML version
-        email.attach_alternative(html_content, "text/html")
+        email_log.html_body = html_content
+        email_log.text_body = text_content
         
-        # Add attachments if any
+        # Add attachments if any (stored base64-encoded in the outbox row)
         if attachments:
-            for filename, content, mimetype in attachments:
-                email.attach(filename, content, mimetype)
+            import base64
+            email_log.attachments = [
+                [filename, base64.b64encode(content if isinstance(content, bytes) else content.encode()).decode(), mimetype]
+                for filename, content, mimetype in attachments
+            ]
         
         # Set priority if high priority
         if high_priority:
-            email.extra_headers = {'X-Priority': '1'}
+            email_log.headers = {'X-Priority': '1'}
         
-        # Send email
-        email.send(fail_silently=False)
+        email_log.save(update_fields=['html_body', 'text_body', 'attachments', 'headers', 'updated_at'])
         
-        # Update log as sent
-        email_log.status = 'SENT'
-        email_log.sent_at = timezone.now()
-        email_log.save()
-        
-        logger.info(f"Email sent successfully: {email_type} to {recipient}")
+        logger.info(f"Email queued: {email_type} to {recipient}")
         return True
         
     except Exception as e:
         # Log the error
         email_log.status = 'FAILED'
         email_log.error_message = str(e)
-        email_log.retry_count += 1
         email_log.save()
         
-        logger.error(f"Failed to send email: {email_type} to {recipient}. Error: {str(e)}")
+        logger.error(f"Failed to queue email: {email_type} to {recipient}. Error: {str(e)}")
         return False
 
 
 def send_email_async(email_type, recipient, subject, template_name, context, **kwargs):
     """
-    Send email asynchronously in a separate thread
-    Use this for non-critical emails to avoid blocking
+    Queue an email for background delivery
+    Kept for existing callers; equivalent to send_professional_email now that
+    every email goes through the outbox instead of a per-mail thread.
+    """
+    return send_professional_email(email_type, recipient, subject, template_name, context, **kwargs)
+
+
+# ===================================================================
+# Outbox Worker (used by `manage.py run_email_worker`)
+# ===================================================================
+
+EMAIL_MAX_ATTEMPTS = getattr(settings, 'EMAIL_MAX_ATTEMPTS', 5)
+EMAIL_RETRY_BASE_SECONDS = getattr(settings, 'EMAIL_RETRY_BASE_SECONDS', 60)
+EMAIL_RETRY_MAX_SECONDS = 6 * 60 * 60
+EMAIL_SENDING_TIMEOUT = timedelta(minutes=10)  # reclaim rows from a crashed worker
+
+
+def email_retry_delay(retry_count: int) -> timedelta:
+    """Exponential backoff: 1, 2, 4, 8 ... minutes, capped at 6 hours"""
+    seconds = EMAIL_RETRY_BASE_SECONDS * (2 ** max(retry_count - 1, 0))
+    return timedelta(seconds=min(seconds, EMAIL_RETRY_MAX_SECONDS))
+
+
+def claim_email_batch(batch_size: int = 20) -> list:
+    """
+    Claim due outbox rows for this worker
+    
+    Uses SELECT ... FOR UPDATE SKIP LOCKED so several workers can run side by
+    side without sending the same email twice. Claimed rows are marked SENDING.
+    """
+    now = timezone.now()
+    due = (
+        Q(status__in=['PENDING', 'RETRY']) & (Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+    ) | Q(status='SENDING', updated_at__lt=now - EMAIL_SENDING_TIMEOUT)
+    
+    with transaction.atomic():
+        logs = list(
+            EmailLog.objects.select_for_update(skip_locked=True)
+            .filter(due, html_body__isnull=False)
+            .order_by('priority', 'created_at')[:batch_size]
+        )
+        if logs:
+            EmailLog.objects.filter(pk__in=[log.pk for log in logs]).update(status='SENDING', updated_at=now)
+            for email_log in logs:
+                email_log.status = 'SENDING'
+    return logs
+
+
+def build_email_message(email_log, connection=None):
+    """Rebuild an EmailMultiAlternatives from a stored outbox row"""
+    email = EmailMultiAlternatives(
+        subject=email_log.subject,
+        body=email_log.text_body or '',
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[email_log.recipient],
+        headers=email_log.headers or None,
+        connection=connection,
+    )
+    email.attach_alternative(email_log.html_body, "text/html")
+    if email_log.attachments:
+        import base64
+        for filename, content, mimetype in email_log.attachments:
+            email.attach(filename, base64.b64decode(content), mimetype)
+    return email
+
+
+def deliver_email_batch(logs: list) -> tuple:
+    """
+    Send claimed rows over a single SMTP connection and record the outcome
+    
+    Returns:
+        (sent, failed) counts
     """
-    thread = Thread(
-        target=send_professional_email,
-        args=(email_type, recipient, subject, template_name, context),
-        kwargs=kwargs
+    if not logs:
+        return 0, 0
+    
+    sent = failed = 0
+    now = timezone.now()
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+        for email_log in logs:
+            try:
+                connection.send_messages([build_email_message(email_log, connection)])
+                email_log.status = 'SENT'
+                email_log.sent_at = timezone.now()
+                email_log.error_message = None
+                email_log.next_attempt_at = None
+                sent += 1
+            except Exception as e:
+                _mark_delivery_failure(email_log, e, now)
+                failed += 1
+    except Exception as e:
+        # Could not even connect: every remaining row goes back for a retry
+        for email_log in logs:
+            if email_log.status == 'SENDING':
+                _mark_delivery_failure(email_log, e, now)
+                failed += 1
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+    
+    for email_log in logs:
+        email_log.updated_at = timezone.now()
+    EmailLog.objects.bulk_update(
+        logs, ['status', 'sent_at', 'error_message', 'retry_count', 'next_attempt_at', 'updated_at']
     )
-    thread.daemon = True
-    thread.start()
+    return sent, failed
+
+
+def _mark_delivery_failure(email_log, error, now):
+    email_log.retry_count += 1
+    email_log.error_message = str(error)
+    if email_log.retry_count >= EMAIL_MAX_ATTEMPTS:
+        email_log.status = 'FAILED'
+        email_log.next_attempt_at = None
+        logger.error(f"Giving up on email {email_log.id} to {email_log.recipient}: {error}")
+    else:
+        email_log.status = 'RETRY'
+        email_log.next_attempt_at = now + email_retry_delay(email_log.retry_count)
+        logger.warning(f"Email {email_log.id} failed (attempt {email_log.retry_count}), retrying at {email_log.next_attempt_at}")
+
+
+def process_email_batch(batch_size: int = 20) -> tuple:
+    """Claim and deliver one batch; returns (sent, failed)"""
+    return deliver_email_batch(claim_email_batch(batch_size))
 
 
 # ===================================================================
@@ -242,24 +357,27 @@ def send_appointment_complete_email(appointment: Appointment):
     )
 
 
-def retry_failed_emails(max_retries=3):
+def retry_failed_emails():
     """
-    Retry failed emails (to be called from a scheduled task)
-    """
-    failed_emails = EmailLog.objects.filter(
-        status='FAILED',
-        retry_count__lt=max_retries
-    ).order_by('created_at')[:50]  # Process 50 at a time
+    Re-queue FAILED emails that still have a stored payload (run_email_worker --requeue-failed)
     
-    for email_log in failed_emails:
-        # Mark as retry
-        email_log.status = 'RETRY'
-        email_log.save()
-        
-        # Attempt to resend based on type
-        # This would require reconstructing context from order/appointment
-        # Implement based on your retry strategy
-        logger.info(f"Retrying email: {email_log.id}")
+    FAILED rows have used up all EMAIL_MAX_ATTEMPTS, so each one starts a fresh
+    round of attempts: retry_count goes back to 0 and it is due immediately.
+    Rows whose template failed to render have no html_body and are left alone.
+    
+    Returns:
+        int: number of emails re-queued
+    """
+    now = timezone.now()
+    requeued = EmailLog.objects.filter(status='FAILED', html_body__isnull=False).update(
+        status='RETRY',
+        retry_count=0,
+        next_attempt_at=now,
+        updated_at=now,
+    )
+    if requeued:
+        logger.info(f"Re-queued {requeued} failed emails")
+    return requeued
 
 
 # ===================================================================
@@ -0,0 +1,299 @@
+"""
+Bulk import of DailySales / DailyExpenditure uploads (CSV, TSV, XLSX).
+
+Pipeline:
+1. parse    - CSV/TSV are read in chunks by pandas, XLSX row by row with
+              openpyxl in read-only mode, so large files never sit in memory
+              as one workbook object;
+2. validate - dates and amounts are coerced per column with pandas; every
+              rejected row is recorded with its spreadsheet row number;
+3. write    - valid rows (one per date; the last row wins for a repeated
+              date) are upserted with chunked
+              bulk_create(update_conflicts=True, unique_fields=['date'])
+              inside a single transaction.
+
+bulk_create does not send post_save, so after commit the financial rollups of
+the imported days are refreshed and the analytics data version is bumped here
+instead of by the receivers in admin.py. The per-upload CSV audit logs
+(daily_sales.csv / expenses.csv) are not written for imported rows.
+
+Rejected rows are kept as a CSV report in the shared cache for
+ERROR_REPORT_TTL seconds and are downloadable from the admin via
+admin_import_error_report.
+"""
+import csv
+import io
+import uuid
+from decimal import Decimal
+from typing import NamedTuple
+
+import pandas as pd
+from django.core.cache import cache
+from django.db import transaction
+
+from . import analytics_snapshot, financial_rollups
+
+
+CHUNK_ROWS = 2000  # rows parsed per pandas chunk
+BATCH_SIZE = 500  # rows per INSERT ... ON CONFLICT statement
+MAX_AMOUNT = 10 ** 8  # DecimalField(max_digits=10, decimal_places=2)
+REMARK_MAX_LENGTH = 20
+
+ERROR_REPORT_KEY = 'financial_import:errors:{token}'
+ERROR_REPORT_TTL = 60 * 60 * 24
+ERROR_REPORT_HEADERS = ['Row', 'Date', 'Column', 'Value', 'Error']
+
+
+class ImportFormatError(ValueError):
+    """The file cannot be imported at all (unsupported type, missing columns)."""
+
+
+class ImportResult(NamedTuple):
+    created: int
+    updated: int
+    errors: list  # [Row, Date, Column, Value, Error] per rejected row
+    report_token: str  # '' when there were no errors
+
+    @property
+    def imported(self):
+        return self.created + self.updated
+
+
+# ---- parse ----
+
+def normalize_columns(df):
+    """'Total Sales ' -> 'total_sales' (same rules as the old upload views)."""
+    df.columns = df.columns.astype(str).str.strip().str.lower().str.replace(' ', '_')
+    return df
+
+
+def _xlsx_chunks(file):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = ['' if cell is None else str(cell) for cell in header]
+        chunk = []
+        for row in rows:
+            chunk.append(row[:len(header)])
+            if len(chunk) == CHUNK_ROWS:
+                yield pd.DataFrame(chunk, columns=header)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header)
+    finally:
+        workbook.close()
+
+
+def read_chunks(file):
+    """DataFrame chunks of an uploaded file with normalized column names."""
+    name = file.name.lower()
+    if name.endswith('.csv'):
+        chunks = pd.read_csv(file, chunksize=CHUNK_ROWS, dtype=str, keep_default_na=False)
+    elif name.endswith('.tsv'):
+        chunks = pd.read_csv(file, sep='\t', chunksize=CHUNK_ROWS, dtype=str, keep_default_na=False)
+    elif name.endswith('.xlsx'):
+        chunks = _xlsx_chunks(file)
+    else:
+        raise ImportFormatError("Invalid file format. Please upload CSV, TSV, or XLSX.")
+    for chunk in chunks:
+        yield normalize_columns(chunk)
+
+
+# ---- validate ----
+
+def _is_blank(series):
+    return series.isna() | (series.astype(str).str.strip() == '')
+
+
+class _Validator:
+    """Collects coerced columns and per-row errors for one chunk."""
+
+    def __init__(self, df, first_row):
+        self.df = df  # RangeIndex: position within the chunk
+        self.first_row = first_row  # spreadsheet row number of position 0
+        self.valid = pd.Series(True, index=df.index)
+        self.errors = []
+
+    def row_number(self, position):
+        return self.first_row + position
+
+    def reject(self, mask, column, message):
+        mask = mask & self.valid
+        if not mask.any():
+            return
+        values = self.df[column] if column in self.df.columns else pd.Series('', index=self.df.index)
+        dates = self.df['date'] if 'date' in self.df.columns else values
+        for position in mask[mask].index:
+            self.errors.append([
+                self.row_number(position), str(dates[position]), column, str(values[position]), message,
+            ])
+        self.valid &= ~mask
+
+    def dates(self):
+        raw = self.df['date']
+        parsed = pd.to_datetime(raw, errors='coerce', format='mixed')
+        self.reject(_is_blank(raw), 'date', 'Date is required')
+        self.reject(parsed.isna(), 'date', 'Invalid date')
+        return parsed.dt.date
+
+    def amount(self, column, required=False):
+        if column not in self.df.columns:
+            return pd.Series(0.0, index=self.df.index)
+        raw = self.df[column]
+        blank = _is_blank(raw)
+        if required:
+            self.reject(blank, column, 'Amount is required')
+        text = raw.where(blank, raw.astype(str).str.replace(',', '').str.replace('₹', '').str.strip())
+        values = pd.to_numeric(text.where(~blank), errors='coerce')
+        self.reject(~blank & values.isna(), column, 'Not a number')
+        self.reject(values < 0, column, 'Amount cannot be negative')
+        self.reject(values.abs() >= MAX_AMOUNT, column, 'Amount is too large')
+        return values.fillna(0.0).round(2)
+
+    def text(self, column, default):
+        if column not in self.df.columns:
+            return pd.Series(default, index=self.df.index)
+        raw = self.df[column]
+        return raw.where(~_is_blank(raw), default).astype(str).str.strip()
+
+
+def _money(value):
+    return Decimal(f"{value:.2f}")
+
+
+def _parse(file, required, build_rows):
+    """Run parse + validate over every chunk; returns ({date: row dict}, errors)."""
+    rows, errors, first_row = {}, [], 2  # row 1 is the header
+    seen_at = {}
+    for chunk in read_chunks(file):
+        missing = [column for column in required if column not in chunk.columns]
+        if missing:
+            raise ImportFormatError(f"Missing required columns: {', '.join(missing)}")
+        chunk = chunk.reset_index(drop=True)
+        validator = _Validator(chunk, first_row)
+        for row_number, row in build_rows(validator):
+            previous = seen_at.get(row['date'])
+            if previous is not None:
+                errors.append([previous, str(row['date']), 'date', str(row['date']),
+                               f'Duplicate date; row {row_number} was imported instead'])
+            seen_at[row['date']] = row_number
+            rows[row['date']] = row
+        errors.extend(validator.errors)
+        first_row += len(chunk)
+    errors.sort(key=lambda error: error[0])
+    return rows, errors
+
+
+def _sales_rows(validator):
+    dates = validator.dates()
+    total = validator.amount('total_sales', required=True)
+    online = validator.amount('online_received')
+    cash = validator.amount('cash_received')
+    labor = validator.amount('labor_charge')
+    delivery = validator.amount('delivery_charge')
+    remark = validator.text('remark', 'Updated via Upload')
+    for position in validator.valid[validator.valid].index:
+        remark_text = remark[position]
+        long_remark = len(remark_text) > REMARK_MAX_LENGTH
+        row = {
+            'date': dates[position],
+            'total_sales': _money(total[position]),
+            'online_received': _money(online[position]),
+            'cash_received': _money(cash[position]),
+            'subtotal': _money(online[position] + cash[position]),
+            'remark': 'Other' if long_remark else remark_text,
+            'other_remark': remark_text if long_remark else None,
+        }
+        # Optional charges are only overwritten when the file has the column
+        if 'labor_charge' in validator.df.columns:
+            row['labor_charge'] = _money(labor[position])
+        if 'delivery_charge' in validator.df.columns:
+            row['delivery_charge'] = _money(delivery[position])
+        yield validator.row_number(position), row
+
+
+def _expense_rows(validator):
+    dates = validator.dates()
+    online = validator.amount('online_amount')
+    cash = validator.amount('cash_amount')
+    description = validator.text('description', 'Imported Expense')
+    for position in validator.valid[validator.valid].index:
+        yield validator.row_number(position), {
+            'date': dates[position],
+            'online_amount': _money(online[position]),
+            'cash_amount': _money(cash[position]),
+            'total': _money(online[position] + cash[position]),
+            'description': description[position],
+        }
+
+
+# ---- write ----
+
+def _upsert(model, rows, update_fields, user):
+    """Chunked INSERT ... ON CONFLICT (date) DO UPDATE; returns (created, updated)."""
+    dates = list(rows)
+    existing = set()
+    for start in range(0, len(dates), BATCH_SIZE):
+        existing.update(model.objects.filter(date__in=dates[start:start + BATCH_SIZE]).values_list('date', flat=True))
+
+    objects = [model(day=date.strftime('%A'), admin=user, **row) for date, row in sorted(rows.items())]
+    with transaction.atomic():
+        model.objects.bulk_create(
+            objects,
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['date'],
+            update_fields=['day', 'admin'] + update_fields,
+        )
+        transaction.on_commit(lambda: _after_import(dates))
+    return len(dates) - len(existing), len(existing)
+
+
+def _after_import(dates):
+    for start in range(0, len(dates), BATCH_SIZE):
+        financial_rollups.refresh_days(dates[start:start + BATCH_SIZE])
+    analytics_snapshot.bump_data_version()
+
+
+def _store_report(errors):
+    if not errors:
+        return ''
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(ERROR_REPORT_HEADERS)
+    writer.writerows(errors)
+    token = uuid.uuid4().hex
+    cache.set(ERROR_REPORT_KEY.format(token=token), output.getvalue(), ERROR_REPORT_TTL)
+    return token
+
+
+def get_error_report(token):
+    """CSV text of a stored error report, or None once it has expired."""
+    return cache.get(ERROR_REPORT_KEY.format(token=token))
+
+
+def import_sales(file, user):
+    """Import a DailySales upload; existing days are overwritten."""
+    from .models import DailySales
+
+    rows, errors = _parse(file, ['date', 'total_sales'], _sales_rows)
+    update_fields = ['total_sales', 'online_received', 'cash_received', 'subtotal', 'remark', 'other_remark']
+    columns = next(iter(rows.values()), {})  # every row has the same keys
+    update_fields += [field for field in ('labor_charge', 'delivery_charge') if field in columns]
+    created, updated = _upsert(DailySales, rows, update_fields, user) if rows else (0, 0)
+    return ImportResult(created, updated, errors, _store_report(errors))
+
+
+def import_expenses(file, user):
+    """Import a DailyExpenditure upload; existing days are overwritten."""
+    from .models import DailyExpenditure
+
+    rows, errors = _parse(file, ['date'], _expense_rows)
+    update_fields = ['online_amount', 'cash_amount', 'total', 'description']
+    created, updated = _upsert(DailyExpenditure, rows, update_fields, user) if rows else (0, 0)
+    return ImportResult(created, updated, errors, _store_report(errors))
@@ -0,0 +1,173 @@
+"""
+Financial Rollups
+
+Per-day and per-month totals of the MANUAL financial entries (DailySales,
+DailyExpenditure, PurchaseEntry), so admin_dashboard reads a handful of
+indexed rows instead of aggregating the full tables on every load.
+
+CRITICAL BUSINESS RULE (unchanged):
+===================================
+Rollups are derived exclusively from the three manual-entry models listed in
+MANUAL_ENTRY_MODELS. Orders and deliveries never feed them; any attempt to
+refresh rollups from another model is refused and logged through
+financial_guards.FinancialUpdateGuard.
+
+Maintenance:
+- post_save/post_delete receivers in admin.py call refresh_for_instance(),
+  which recomputes only the affected day(s) and month(s);
+- ``python manage.py rebuild_financial_rollups`` recomputes everything (use it
+  after raw SQL edits or bulk operations that bypass signals).
+"""
+import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from .financial_guards import FinancialUpdateGuard, ensure_manual_financial_entry_only
+
+
+ROLLUP_FIELDS = (
+    'sales_total', 'sales_online', 'sales_cash', 'labor_total', 'delivery_total', 'sales_entries',
+    'expense_total', 'expense_online', 'expense_cash', 'expense_entries',
+    'purchase_total', 'purchase_entries',
+)
+ZERO = Decimal('0.00')
+
+
+def _manual_entry_models():
+    from .models import DailyExpenditure, DailySales, PurchaseEntry
+    return (DailySales, DailyExpenditure, PurchaseEntry)
+
+
+def _as_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    return value
+
+
+def _month_start(day):
+    return day.replace(day=1)
+
+
+@ensure_manual_financial_entry_only
+def refresh_days(dates):
+    """Recompute the daily rollups for the given dates, then their months."""
+    from .models import DailyExpenditure, DailySales, FinancialDailyRollup, PurchaseEntry
+
+    dates = {_as_date(d) for d in dates if d}
+    if not dates:
+        return
+
+    rows = {day: dict.fromkeys(ROLLUP_FIELDS, ZERO) for day in dates}
+    for row in rows.values():
+        row.update(sales_entries=0, expense_entries=0, purchase_entries=0)
+
+    for entry in DailySales.objects.filter(date__in=dates).values('date').annotate(
+        total=Sum('total_sales'), online=Sum('online_received'), cash=Sum('cash_received'),
+        labor=Sum('labor_charge'), delivery=Sum('delivery_charge'), entries=Count('id'),
+    ):
+        rows[entry['date']].update(
+            sales_total=entry['total'] or ZERO, sales_online=entry['online'] or ZERO,
+            sales_cash=entry['cash'] or ZERO, labor_total=entry['labor'] or ZERO,
+            delivery_total=entry['delivery'] or ZERO, sales_entries=entry['entries'],
+        )
+
+    for entry in DailyExpenditure.objects.filter(date__in=dates).values('date').annotate(
+        total=Sum('total'), online=Sum('online_amount'), cash=Sum('cash_amount'), entries=Count('id'),
+    ):
+        rows[entry['date']].update(
+            expense_total=entry['total'] or ZERO, expense_online=entry['online'] or ZERO,
+            expense_cash=entry['cash'] or ZERO, expense_entries=entry['entries'],
+        )
+
+    for entry in PurchaseEntry.objects.filter(date__in=dates).values('date').annotate(
+        total=Sum('total_cost'), entries=Count('id'),
+    ):
+        rows[entry['date']].update(purchase_total=entry['total'] or ZERO, purchase_entries=entry['entries'])
+
+    with transaction.atomic():
+        empty = {day for day, row in rows.items()
+                 if not (row['sales_entries'] or row['expense_entries'] or row['purchase_entries'])}
+        FinancialDailyRollup.objects.filter(date__in=empty).delete()
+        FinancialDailyRollup.objects.bulk_create(
+            [FinancialDailyRollup(date=day, **row) for day, row in rows.items() if day not in empty],
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['date'],
+            update_fields=list(ROLLUP_FIELDS) + ['updated_at'],
+        )
+        refresh_months({_month_start(day) for day in dates})
+
+
+def refresh_months(months):
+    """Recompute monthly rollups from the (already current) daily rollups."""
+    from .models import FinancialDailyRollup, FinancialMonthlyRollup
+
+    months = set(months)
+    if not months:
+        return
+    month_filter = Q()
+    for month in months:
+        month_filter |= Q(date__year=month.year, date__month=month.month)
+
+    totals = {
+        entry.pop('month'): entry
+        for entry in FinancialDailyRollup.objects.filter(month_filter)
+        .annotate(month=TruncMonth('date')).values('month')
+        .annotate(**{field: Sum(field) for field in ROLLUP_FIELDS})
+    }
+    FinancialMonthlyRollup.objects.filter(month__in=months - {_as_date(m) for m in totals}).delete()
+    for month, row in totals.items():
+        FinancialMonthlyRollup.objects.update_or_create(month=_as_date(month), defaults=row)
+
+
+def refresh_for_instance(instance, old_date=None):
+    """Signal entry point: refresh the day an entry is on (and the day it moved from)."""
+    if not isinstance(instance, _manual_entry_models()):
+        FinancialUpdateGuard.log_violation(
+            violation_type='OTHER',
+            description=f"Refused to update financial rollups from {type(instance).__name__}",
+            source_module='financial_rollups.refresh_for_instance',
+        )
+        return
+    refresh_days({instance.date, old_date})
+
+
+@ensure_manual_financial_entry_only
+def rebuild_all():
+    """Drop and recompute every rollup row. Returns the number of days rolled up."""
+    from .models import FinancialDailyRollup, FinancialMonthlyRollup
+
+    dates = set()
+    for model in _manual_entry_models():
+        dates.update(_as_date(d) for d in model.objects.values_list('date', flat=True).distinct())
+
+    with transaction.atomic():
+        FinancialDailyRollup.objects.all().delete()
+        FinancialMonthlyRollup.objects.all().delete()
+        ordered = sorted(dates)
+        for start in range(0, len(ordered), 500):
+            refresh_days(ordered[start:start + 500])
+    return len(dates)
+
+
+# ---- reads ----
+
+def get_totals():
+    """All-time totals (Decimal) summed over the monthly rollup rows."""
+    from .models import FinancialMonthlyRollup
+
+    totals = FinancialMonthlyRollup.objects.aggregate(**{field: Sum(field) for field in ROLLUP_FIELDS})
+    return {field: value or (0 if field.endswith('_entries') else ZERO) for field, value in totals.items()}
+
+
+def get_daily_series(start_date=None):
+    """Daily rollup rows (oldest first), optionally from start_date onwards."""
+    from .models import FinancialDailyRollup
+
+    queryset = FinancialDailyRollup.objects.all()
+    if start_date:
+        queryset = queryset.filter(date__gte=start_date)
+    return queryset.order_by('date').values('date', 'sales_total', 'sales_entries', 'expense_total', 'expense_entries')
@@ -0,0 +1,250 @@
+"""
+Sales and expense forecasts for the analytics dashboard and analytics_api.
+
+Works on the daily series already held by the analytics snapshot (no extra
+queries). For each series:
+
+- the entries are laid out on a calendar (days without an entry are gaps,
+  not zeros) and trailing 7/30-day moving averages are taken with cumulative
+  sums;
+- a multiplicative weekday index (Monday..Sunday) is estimated over the last
+  SEASON_DAYS of data;
+- the deseasonalised series is fed through Holt's linear exponential
+  smoothing with a damped trend, and the forecast for max(HORIZONS) days is
+  (level + damped trend) * weekday index, with a band from the one-step-ahead
+  errors.
+
+Both series are forecast over the same window, starting the day after
+max(today, last sales entry, last expense entry), so late data entry doesn't
+shift "the next 7/30 days" and net totals compare like with like.
+
+Forecasts are cached per analytics data version and start date. The fitted weekday index
+and smoother state are also cached, so when a new version only appends days
+after the last fitted date (the usual case: today's entry), only those days
+are run through the recursion.
+"""
+import datetime
+import hashlib
+import threading
+
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import analytics_snapshot
+
+
+FORECAST_KEY = 'analytics:forecast:{version}:{start}'
+STATE_KEY = 'analytics:forecast:state:{series}'
+FORECAST_TTL = 60 * 60 * 24
+
+HORIZONS = (7, 30)
+HISTORY_DAYS = 90  # days of history returned for charts
+SEASON_DAYS = 182  # window used for the weekday index
+RESEASON_DAYS = 7  # new days before the weekday index is re-estimated
+ALPHA = 0.3  # level smoothing
+BETA = 0.1  # trend smoothing
+PHI = 0.95  # trend damping, so 30-day projections don't run away on a short-term slope
+BAND_Z = 1.28  # ~80% interval
+
+WEEKDAY_NAMES = analytics_snapshot.WEEKDAY_NAMES
+_EPOCH_WEEKDAY = 3  # 1970-01-01 was a Thursday
+
+
+# ---- vectorized building blocks ----
+
+def calendar_series(dates, values):
+    """(first day, array over every calendar day with NaN for days without an entry)."""
+    if not len(dates):
+        return None, np.array([], dtype=float)
+    first = dates[0]
+    offsets = (dates - first).astype(np.int64)
+    series = np.full(int(offsets[-1]) + 1, np.nan)
+    series[offsets] = values
+    return first, series
+
+
+def moving_average(series, window):
+    """Trailing mean over window days, ignoring gaps (NaN where the window is empty)."""
+    present = ~np.isnan(series)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(present, series, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(present)))
+    upper = np.arange(1, len(series) + 1)
+    lower = np.maximum(upper - window, 0)
+    window_counts = counts[upper] - counts[lower]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(window_counts > 0, (sums[upper] - sums[lower]) / window_counts, np.nan)
+
+
+def weekdays(first, length):
+    """Weekday (Monday=0) of each day in a calendar series starting at first."""
+    start = (first.astype(np.int64) + _EPOCH_WEEKDAY) % 7
+    return (start + np.arange(length)) % 7
+
+
+def weekday_index(series, days_of_week):
+    """Multiplicative weekday factors (mean 1) over the last SEASON_DAYS; 1.0 when unknown."""
+    recent = slice(max(len(series) - SEASON_DAYS, 0), len(series))
+    values, days = series[recent], days_of_week[recent]
+    present = ~np.isnan(values)
+    totals = np.bincount(days[present], weights=values[present], minlength=7)
+    counts = np.bincount(days[present], minlength=7)
+    overall = values[present].mean() if present.any() else 0.0
+    if overall <= 0:
+        return np.ones(7)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        index = np.where(counts > 0, totals / counts / overall, 1.0)
+    index = np.where(index > 0, index, 1.0)
+    return index * 7 / index.sum()
+
+
+# ---- Holt's linear smoothing (incremental) ----
+
+def _smooth(values, state):
+    """Run Holt's recursion over values (NaN = gap) from state; returns the new state."""
+    level, trend, errors, count = state['level'], state['trend'], state['sq_errors'], state['errors']
+    for value in values:
+        if level is None:
+            if not np.isnan(value):
+                level, trend = float(value), 0.0
+            continue
+        predicted = level + PHI * trend
+        if np.isnan(value):
+            level = predicted  # gap: carry the forecast forward
+            continue
+        errors += (value - predicted) ** 2
+        count += 1
+        new_level = ALPHA * value + (1 - ALPHA) * predicted
+        trend = BETA * (new_level - level) + (1 - BETA) * PHI * trend
+        level = new_level
+    return {'level': level, 'trend': trend, 'sq_errors': errors, 'errors': count}
+
+
+def _fingerprint(series):
+    return hashlib.md5(np.nan_to_num(series, nan=-1.0).tobytes()).hexdigest()
+
+
+def _fit(name, first, series, days_of_week):
+    """(weekday index, Holt state) for series, resuming from the cached fit when possible.
+
+    The cached fit is reused when the series still starts on the same day and
+    its previously fitted prefix is unchanged; only the new days are smoothed.
+    The weekday index is re-estimated (and the smoother re-run from scratch)
+    once RESEASON_DAYS new days have accumulated, or whenever history changes.
+    """
+    key = STATE_KEY.format(series=name)
+    cached = cache.get(key)
+    if (cached and cached['first'] == str(first)
+            and cached['length'] <= len(series)
+            and len(series) - cached['season_length'] < RESEASON_DAYS
+            and cached['fingerprint'] == _fingerprint(series[:cached['length']])):
+        index, state, start, season_length = (
+            np.array(cached['index']), cached['state'], cached['length'], cached['season_length'])
+    else:
+        index, start, season_length = weekday_index(series, days_of_week), 0, len(series)
+        state = {'level': None, 'trend': 0.0, 'sq_errors': 0.0, 'errors': 0}
+
+    adjusted = series[start:] / index[days_of_week[start:]]
+    state = _smooth(adjusted, state)
+    cache.set(key, {
+        'first': str(first), 'length': len(series), 'season_length': season_length,
+        'fingerprint': _fingerprint(series), 'index': index.tolist(), 'state': state,
+    }, None)
+    return index, state
+
+
+# ---- forecasts ----
+
+def _to_date(day):
+    return day.astype('datetime64[D]').astype(datetime.date)
+
+
+def _round(values):
+    return [None if np.isnan(v) else round(float(v), 2) for v in values]
+
+
+def forecast_series(name, dates, values, start=None):
+    """Forecast dict for one daily series (see module docstring), from start (default: day after its last entry)."""
+    first, series = calendar_series(dates, values)
+    horizon = max(HORIZONS)
+    if first is None or np.count_nonzero(~np.isnan(series)) < 2:
+        return None
+
+    days_of_week = weekdays(first, len(series))
+    index, state = _fit(name, first, series, days_of_week)
+
+    last_day = first + np.timedelta64(len(series) - 1, 'D')
+    if start is None:
+        start = last_day + np.timedelta64(1, 'D')
+    # Days between the last entry and the window are projected but not reported
+    lead = max(int((start - last_day).astype(np.int64)) - 1, 0)
+    steps = np.arange(lead + 1, lead + horizon + 1)
+    future_days = (days_of_week[-1] + steps) % 7
+    base = state['level'] + np.cumsum(PHI ** steps) * state['trend']
+    forecast = np.maximum(base * index[future_days], 0.0)
+    sigma = np.sqrt(state['sq_errors'] / state['errors']) if state['errors'] else 0.0
+    spread = BAND_Z * sigma * np.sqrt(steps) * index[future_days]
+
+    history = slice(max(len(series) - HISTORY_DAYS, 0), len(series))
+    history_days = first + np.arange(len(series))[history].astype('timedelta64[D]')
+    future_dates = last_day + steps.astype('timedelta64[D]')
+
+    return {
+        'last_date': _to_date(last_day).isoformat(),
+        'history': {
+            'dates': np.datetime_as_string(history_days).tolist(),
+            'values': _round(series[history]),
+            'ma7': _round(moving_average(series, 7)[history]),
+            'ma30': _round(moving_average(series, 30)[history]),
+        },
+        'weekday_index': dict(zip(WEEKDAY_NAMES, _round(index))),
+        'forecast': {
+            'dates': np.datetime_as_string(future_dates).tolist(),
+            'values': _round(forecast),
+            'lower': _round(np.maximum(forecast - spread, 0.0)),
+            'upper': _round(forecast + spread),
+        },
+        'totals': {f'next_{h}': round(float(forecast[:h].sum()), 2) for h in HORIZONS},
+    }
+
+
+def forecast_start(snapshot, today=None):
+    """First forecast day shared by both series: the day after today or the latest entry, whichever is later."""
+    days = [np.datetime64(today or timezone.localdate(), 'D')]
+    days += [dates[-1].astype('datetime64[D]') for dates in (snapshot.sales_dates, snapshot.expense_dates) if len(dates)]
+    return max(days) + np.timedelta64(1, 'D')
+
+
+def _build(snapshot, start):
+    sales = forecast_series('sales', snapshot.sales_dates, snapshot.sales_total, start)
+    expenses = forecast_series('expenses', snapshot.expense_dates, snapshot.expense_total, start)
+    net = None
+    if sales and expenses:
+        net = {key: round(sales['totals'][key] - expenses['totals'][key], 2) for key in sales['totals']}
+    return {'version': snapshot.version, 'start_date': _to_date(start).isoformat(),
+            'sales': sales, 'expenses': expenses, 'net_totals': net}
+
+
+_forecast = None
+_lock = threading.Lock()
+
+
+def get_forecast():
+    """{'start_date', 'sales', 'expenses', 'net_totals'} for the current data version and day."""
+    global _forecast
+    snapshot = analytics_snapshot.get_snapshot()
+    start = forecast_start(snapshot)
+    current = (snapshot.version, _to_date(start).isoformat())
+    forecast = _forecast
+    if forecast is not None and (forecast['version'], forecast['start_date']) == current:
+        return forecast
+
+    with _lock:
+        if _forecast is None or (_forecast['version'], _forecast['start_date']) != current:
+            key = FORECAST_KEY.format(version=snapshot.version, start=current[1])
+            forecast = cache.get(key)
+            if forecast is None:
+                forecast = _build(snapshot, start)
+                cache.set(key, forecast, FORECAST_TTL)
+            _forecast = forecast
+        return _forecast
@@ -0,0 +1,190 @@
+"""
+Geocoding and road-distance cache for utils.calculate_distance_and_price.
+
+Two layers:
+- an in-process LRU (per worker, bounded, with expiry) answering repeat
+  lookups without touching the database;
+- the GeocodeCache / DistanceCache tables, shared by all workers, keyed by a
+  normalized address string and by a rounded lat/lng grid cell respectively.
+
+Hits and misses are counted in the shared cache (see get_stats); each table
+row also keeps its own hit_count. Expired rows are ignored and can be removed
+with ``python manage.py purge_geocache``.
+"""
+import re
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+
+GEOCODE_TTL = timedelta(days=getattr(settings, 'GEOCODE_CACHE_DAYS', 90))
+GEOCODE_MISS_TTL = timedelta(days=1)  # addresses that could not be located
+DISTANCE_TTL = timedelta(days=getattr(settings, 'DISTANCE_CACHE_DAYS', 30))
+GRID_PRECISION = 3  # decimal places: ~110 m cells around Indore
+LRU_SIZE = 2048
+
+STATS_KEY = 'geocache:{kind}:{outcome}'
+STATS_KINDS = ('geocode', 'distance')
+
+NOT_FOUND = (None, None)  # cached "could not be located" result
+
+_PUNCTUATION_RE = re.compile(r'[^\w\s]')
+_SPACE_RE = re.compile(r'\s+')
+
+
+class _LRU:
+    """Small thread-safe LRU with a per-entry expiry time."""
+
+    def __init__(self, size):
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= timezone.now():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_geocode_lru = _LRU(LRU_SIZE)
+_distance_lru = _LRU(LRU_SIZE)
+
+
+def normalize_address(address):
+    """'12, M.G. Road ,Indore' -> '12 m g road indore'"""
+    text = _PUNCTUATION_RE.sub(' ', (address or '').lower())
+    return _SPACE_RE.sub(' ', text).strip()[:255]
+
+
+def grid_cell(lat, lng):
+    return f"{round(lat, GRID_PRECISION):.{GRID_PRECISION}f},{round(lng, GRID_PRECISION):.{GRID_PRECISION}f}"
+
+
+def _count(kind, outcome):
+    key = STATS_KEY.format(kind=kind, outcome=outcome)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def get_stats():
+    """{'geocode': {'hits': n, 'misses': n}, 'distance': {...}} across all workers."""
+    keys = [STATS_KEY.format(kind=k, outcome=o) for k in STATS_KINDS for o in ('hits', 'misses')]
+    values = cache.get_many(keys)
+    return {
+        kind: {
+            outcome: values.get(STATS_KEY.format(kind=kind, outcome=outcome), 0)
+            for outcome in ('hits', 'misses')
+        }
+        for kind in STATS_KINDS
+    }
+
+
+# ---- geocoding ----
+
+def get_coordinates(address):
+    """
+    Cached (lat, lng) for an address, NOT_FOUND if it is known not to resolve,
+    or None on a cache miss.
+    """
+    from .models import GeocodeCache
+
+    key = normalize_address(address)
+    cached = _geocode_lru.get(key)
+    if cached is not None:
+        _count('geocode', 'hits')
+        return cached
+
+    now = timezone.now()
+    row = GeocodeCache.objects.filter(address_key=key, expires_at__gt=now).first()
+    if row is None:
+        _count('geocode', 'misses')
+        return None
+
+    GeocodeCache.objects.filter(pk=row.pk).update(hit_count=F('hit_count') + 1)
+    value = (row.latitude, row.longitude)
+    _geocode_lru.set(key, value, row.expires_at)
+    _count('geocode', 'hits')
+    return value
+
+
+def store_coordinates(address, lat, lng, source):
+    """Remember a geocoding result; pass lat/lng None for an address that could not be located."""
+    from .models import GeocodeCache
+
+    key = normalize_address(address)
+    expires_at = timezone.now() + (GEOCODE_MISS_TTL if lat is None else GEOCODE_TTL)
+    GeocodeCache.objects.update_or_create(
+        address_key=key,
+        defaults={'latitude': lat, 'longitude': lng, 'source': source, 'expires_at': expires_at},
+    )
+    _geocode_lru.set(key, (lat, lng), expires_at)
+
+
+# ---- road distance from the shop ----
+
+def get_distance(lat, lng):
+    """Cached road distance (km) from the shop to the grid cell of (lat, lng), or None."""
+    from .models import DistanceCache
+
+    key = grid_cell(lat, lng)
+    cached = _distance_lru.get(key)
+    if cached is not None:
+        _count('distance', 'hits')
+        return cached
+
+    row = DistanceCache.objects.filter(cell_key=key, expires_at__gt=timezone.now()).first()
+    if row is None:
+        _count('distance', 'misses')
+        return None
+
+    DistanceCache.objects.filter(pk=row.pk).update(hit_count=F('hit_count') + 1)
+    _distance_lru.set(key, row.distance_km, row.expires_at)
+    _count('distance', 'hits')
+    return row.distance_km
+
+
+def store_distance(lat, lng, distance_km, source):
+    from .models import DistanceCache
+
+    key = grid_cell(lat, lng)
+    expires_at = timezone.now() + DISTANCE_TTL
+    DistanceCache.objects.update_or_create(
+        cell_key=key,
+        defaults={'distance_km': distance_km, 'source': source, 'expires_at': expires_at},
+    )
+    _distance_lru.set(key, distance_km, expires_at)
+
+
+def purge_expired():
+    """Delete expired rows from both tables; returns (geocode_rows, distance_rows)."""
+    from .models import DistanceCache, GeocodeCache
+
+    now = timezone.now()
+    geocode_deleted, _ = GeocodeCache.objects.filter(expires_at__lte=now).delete()
+    distance_deleted, _ = DistanceCache.objects.filter(expires_at__lte=now).delete()
+    return geocode_deleted, distance_deleted
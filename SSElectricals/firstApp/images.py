@@ -0,0 +1,351 @@
+"""
+Resized derivatives of uploaded images, built once per file in the background.
+
+Every image field in IMAGE_FIELDS gets thumbnail / card / detail renditions,
+each as WebP plus a JPEG fallback, written under
+derivatives/<sha1[:2]>/<sha1>/<width>x<height>.<ext> where sha1 is the hash of
+the original bytes. Paths never change once written, identical uploads share
+files, and a variant no larger than a smaller one reuses its files.
+
+admin.py remembers each instance's image names at load time and, after a save
+that points a field at a different file, hands the new name to a daemon thread
+(on commit). Saves that don't touch the image (price edits, rating updates)
+cost nothing. ``build_image_derivatives`` backfills existing files.
+
+Templates use ``{% picture %}`` / ``|image_url`` from image_tags, which fall
+back to the original file until its derivatives exist.
+
+Settings:
+    IMAGE_DERIVATIVE_QUEUE_SIZE  pending files per process (default 500); a full
+                                 queue just leaves the rest to the command
+"""
+import hashlib
+import io
+import logging
+import queue
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+logger = logging.getLogger(__name__)
+
+# model label -> image fields with derivatives (the legacy QR PNG fields are left out)
+IMAGE_FIELDS = {
+    'firstApp.CustomUser': ('profile_picture',),
+    'firstApp.Category': ('image',),
+    'firstApp.Product': ('image',),
+    'firstApp.ProductImage': ('image',),
+    'firstApp.Review': ('image',),
+    'firstApp.Notification': ('image',),
+    'firstApp.Electrician': ('profile_picture',),
+    'firstApp.Warranty': ('product_image',),
+}
+
+# variant -> longest edge in pixels, smallest first
+VARIANTS = OrderedDict([
+    ('thumbnail', 160),
+    ('card', 480),
+    ('detail', 1200),
+])
+
+# default <img sizes> per variant; the browser picks from every width in srcset
+SIZES = {
+    'thumbnail': '120px',
+    'card': '(max-width: 576px) 100vw, (max-width: 992px) 50vw, 25vw',
+    'detail': '(max-width: 992px) 100vw, 50vw',
+}
+
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+ROOT = 'derivatives'
+CACHE_KEY = 'img:derivatives:{digest}'
+CACHE_TTL = 60 * 60 * 24 * 30
+MISSING_TTL = 60  # not built yet; look again shortly
+LRU_SIZE = 1024
+IMAGE_DERIVATIVE_QUEUE_SIZE = getattr(settings, 'IMAGE_DERIVATIVE_QUEUE_SIZE', 500)
+
+_NOT_LOADED = object()  # deferred field, name unknown at load time
+
+_known = OrderedDict()  # source name -> renditions, most recently used last
+_lock = threading.Lock()
+
+_queue = queue.Queue(maxsize=IMAGE_DERIVATIVE_QUEUE_SIZE)
+_worker = None
+_worker_lock = threading.Lock()
+
+
+# ---------------------------------------------------------------------------
+# Change detection (called from the receivers in admin.py)
+# ---------------------------------------------------------------------------
+
+def _name(value):
+    return getattr(value, 'name', value) or ''
+
+
+def remember(instance):
+    """Record the image names an instance was loaded (or last saved) with."""
+    instance._image_names = {
+        field: _name(instance.__dict__[field]) if field in instance.__dict__ else _NOT_LOADED
+        for field in IMAGE_FIELDS[instance._meta.label]
+    }
+
+
+def changed_names(instance, update_fields=None):
+    """Storage names of image fields that point at a different file than at load time."""
+    previous = getattr(instance, '_image_names', {})
+    names = []
+    for field in IMAGE_FIELDS[instance._meta.label]:
+        if update_fields is not None and field not in update_fields:
+            continue
+        name = _name(instance.__dict__.get(field))
+        if name and name != previous.get(field, _NOT_LOADED):
+            names.append(name)
+    remember(instance)
+    return names
+
+
+# ---------------------------------------------------------------------------
+# Background worker
+# ---------------------------------------------------------------------------
+
+def enqueue(names):
+    """Queue storage names for derivative building on this process's worker thread."""
+    for name in names:
+        try:
+            _queue.put_nowait(name)
+        except queue.Full:
+            logger.warning(f"Image derivative queue full, {name} left for build_image_derivatives")
+            break
+    _ensure_worker()
+
+
+def pending():
+    """Number of files queued or being processed in this process."""
+    return _queue.unfinished_tasks
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_work, name='image-derivatives', daemon=True)
+            _worker.start()
+
+
+def _work():
+    while True:
+        name = _queue.get()
+        try:
+            build(name)
+        except Exception as e:
+            logger.error(f"Image derivatives for {name} failed: {e}")
+        finally:
+            close_old_connections()
+            _queue.task_done()
+
+
+# ---------------------------------------------------------------------------
+# Building
+# ---------------------------------------------------------------------------
+
+def _fit(width, height, edge):
+    """Size of (width, height) scaled down so the longest side is at most edge."""
+    scale = min(1.0, edge / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _flatten(img):
+    """JPEG has no alpha channel: composite transparent images onto white."""
+    if img.mode == 'RGB':
+        return img
+    from PIL import Image
+    background = Image.new('RGB', img.size, (255, 255, 255))
+    background.paste(img, mask=img.getchannel('A'))
+    return background
+
+
+def _encode(data, digest):
+    """Write every rendition of the image bytes and return the renditions mapping."""
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as original:
+        # Shrink to the largest variant first; for JPEGs this decodes at reduced scale
+        largest = max(VARIANTS.values())
+        original.thumbnail((largest, largest), Image.LANCZOS, reducing_gap=3.0)
+        img = ImageOps.exif_transpose(original)
+    has_alpha = img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info
+    img = img.convert('RGBA' if has_alpha else 'RGB')
+
+    renditions, written = {}, {}
+    for variant, edge in VARIANTS.items():
+        size = _fit(img.width, img.height, edge)
+        if size not in written:
+            resized = img if size == img.size else img.resize(size, Image.LANCZOS)
+            files = {}
+            for ext, pil_format, options in FORMATS:
+                path = f'{ROOT}/{digest[:2]}/{digest}/{size[0]}x{size[1]}.{ext}'
+                if not default_storage.exists(path):
+                    buffer = io.BytesIO()
+                    (resized if ext == 'webp' else _flatten(resized)).save(buffer, pil_format, **options)
+                    default_storage.save(path, ContentFile(buffer.getvalue()))
+                files[ext] = path
+            written[size] = files
+        renditions[variant] = {'width': size[0], 'height': size[1], **written[size]}
+    return renditions
+
+
+def build(name, force=False):
+    """
+    Make sure the original stored as name has derivatives; returns the ImageDerivative.
+
+    A name that already has a row is skipped (uploads get fresh names, so its
+    content can't have changed) unless force is set, in which case the file is
+    re-hashed and rebuilt only if its bytes differ.
+    """
+    from .models import ImageDerivative
+
+    existing = ImageDerivative.objects.filter(source=name).first()
+    if existing and not force:
+        return existing
+    with default_storage.open(name, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha1(data).hexdigest()
+    if existing and existing.digest == digest:
+        return existing
+
+    twin = ImageDerivative.objects.filter(digest=digest).exclude(source=name).first()
+    renditions = twin.renditions if twin else _encode(data, digest)
+    row, _ = ImageDerivative.objects.update_or_create(
+        source=name, defaults={'digest': digest, 'renditions': renditions}
+    )
+    forget(name)
+    return row
+
+
+# ---------------------------------------------------------------------------
+# Lookup
+# ---------------------------------------------------------------------------
+
+def _cache_key(name):
+    return CACHE_KEY.format(digest=hashlib.sha1(name.encode('utf-8')).hexdigest())
+
+
+def _remember(name, found):
+    with _lock:
+        _known[name] = found
+        _known.move_to_end(name)
+        while len(_known) > LRU_SIZE:
+            _known.popitem(last=False)
+
+
+def forget(name):
+    """Drop cached lookups for name (this worker's memo and the shared cache)."""
+    with _lock:
+        _known.pop(name, None)
+    cache.delete(_cache_key(name))
+
+
+def prefetch(names):
+    """Load renditions for many names at once (one cache round trip + one query), e.g. a catalogue page."""
+    from .models import ImageDerivative
+
+    with _lock:
+        names = {name for name in names if name and name not in _known}
+    if not names:
+        return
+    keys = {_cache_key(name): name for name in names}
+    cached = cache.get_many(keys)
+    for key, found in cached.items():
+        if found:
+            _remember(keys[key], found)
+    missing = [name for key, name in keys.items() if key not in cached]
+    if not missing:
+        return
+    rows = dict(ImageDerivative.objects.filter(source__in=missing).values_list('source', 'renditions'))
+    cache.set_many({_cache_key(name): rows[name] for name in rows}, CACHE_TTL)
+    cache.set_many({_cache_key(name): {} for name in missing if name not in rows}, MISSING_TTL)
+    for name, found in rows.items():
+        _remember(name, found)
+
+
+def renditions(name):
+    """{variant: {'width', 'height', 'webp', 'jpeg'}} for a stored image, or None if not built yet."""
+    from .models import ImageDerivative
+
+    if not name:
+        return None
+    with _lock:
+        found = _known.get(name)
+        if found is not None:
+            _known.move_to_end(name)
+            return found
+
+    key = _cache_key(name)
+    found = cache.get(key)
+    if found is None:
+        found = ImageDerivative.objects.filter(source=name).values_list('renditions', flat=True).first() or {}
+        cache.set(key, found, CACHE_TTL if found else MISSING_TTL)
+    if not found:
+        return None
+    _remember(name, found)  # built derivatives never change, so memoizing them is safe
+    return found
+
+
+def url(image, variant='detail'):
+    """JPEG URL of one variant of an image field file, or the original's URL."""
+    if not image:
+        return ''
+    found = renditions(image.name)
+    if found and variant in found:
+        return default_storage.url(found[variant]['jpeg'])
+    return image.url
+
+
+def srcset(found, ext):
+    """'url 160w, url 480w, ...' over the distinct sizes in a renditions mapping."""
+    seen, candidates = set(), []
+    for variant in VARIANTS:
+        entry = found.get(variant)
+        if entry and entry[ext] not in seen:
+            seen.add(entry[ext])
+            candidates.append(f"{default_storage.url(entry[ext])} {entry['width']}w")
+    return ', '.join(candidates)
+
+
+def picture(image, variant='card', sizes=None, attrs=None):
+    """
+    <picture> markup for an image field file: WebP srcset, JPEG fallback, and the
+    variant's intrinsic size so the layout doesn't shift. Plain <img> of the
+    original until derivatives exist.
+    """
+    if not image:
+        return ''
+    attrs = {'loading': 'lazy', 'decoding': 'async', **(attrs or {})}
+    found = renditions(image.name)
+    if not found or variant not in found:
+        return format_html('<img src="{}"{}>', image.url, flatatt(attrs))
+
+    entry = found[variant]
+    sizes = sizes or SIZES.get(variant, '100vw')
+    img_attrs = {
+        'src': default_storage.url(entry['jpeg']),
+        'srcset': srcset(found, 'jpeg'),
+        'sizes': sizes,
+        'width': entry['width'],
+        'height': entry['height'],
+        **attrs,
+    }
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}"><img{}></picture>',
+        srcset(found, 'webp'), sizes, flatatt(img_attrs),
+    )
@@ -0,0 +1,70 @@
+"""
+Local stand-in email backend for tests and load runs.
+
+Accepts messages without any network I/O and keeps the most recent ones in
+memory. EMAIL_STANDIN_CONNECT_LATENCY / EMAIL_STANDIN_SEND_LATENCY (seconds)
+simulate the SMTP handshake and per-message cost so queueing behaviour can be
+measured without hitting Gmail.
+
+Usage (settings):
+    PRIORITY_EMAIL_BACKEND = 'firstApp.mail_backends.StandInEmailBackend'
+"""
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.mail.backends.base import BaseEmailBackend
+
+
+sent_messages = deque(maxlen=1000)
+_lock = threading.Lock()
+_stats = {'connections': 0, 'messages': 0}
+
+
+def get_stats():
+    """Connections opened and messages accepted since the last reset."""
+    with _lock:
+        return dict(_stats)
+
+
+def reset():
+    with _lock:
+        sent_messages.clear()
+        _stats.update(connections=0, messages=0)
+
+
+class StandInEmailBackend(BaseEmailBackend):
+    """Records messages in memory instead of sending them."""
+
+    def __init__(self, fail_silently=False, **kwargs):
+        super().__init__(fail_silently=fail_silently, **kwargs)
+        self.connect_latency = getattr(settings, 'EMAIL_STANDIN_CONNECT_LATENCY', 0)
+        self.send_latency = getattr(settings, 'EMAIL_STANDIN_SEND_LATENCY', 0)
+        self.is_open = False
+
+    def open(self):
+        if self.is_open:
+            return False
+        time.sleep(self.connect_latency)
+        with _lock:
+            _stats['connections'] += 1
+        self.is_open = True
+        return True
+
+    def close(self):
+        self.is_open = False
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+        new_connection = self.open()
+        for message in email_messages:
+            time.sleep(self.send_latency)
+            message.message()  # build the MIME message as SMTP would
+            with _lock:
+                sent_messages.append(message)
+                _stats['messages'] += 1
+        if new_connection:
+            self.close()
+        return len(email_messages)
@@ -0,0 +1,75 @@
+"""
+Management command to build resized WebP/JPEG derivatives for uploaded images
+Run with: python manage.py build_image_derivatives [--force] [--prune]
+Covers every field in images.IMAGE_FIELDS. Files that already have derivatives are skipped
+unless --force, which re-hashes them and rebuilds any whose bytes changed. --prune removes
+derivatives whose original is no longer referenced by any row.
+"""
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from firstApp import images
+from firstApp.models import ImageDerivative
+
+
+class Command(BaseCommand):
+    help = 'Build resized image derivatives for every uploaded image'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Re-hash files that already have derivatives')
+        parser.add_argument('--prune', action='store_true', help='Delete derivatives of images no longer in use')
+
+    def referenced_names(self):
+        names = set()
+        for label, fields in images.IMAGE_FIELDS.items():
+            model = apps.get_model(label)
+            for field in fields:
+                names.update(
+                    model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                    .values_list(field, flat=True)
+                )
+        return names
+
+    def handle(self, *args, **options):
+        names = self.referenced_names()
+        done = ImageDerivative.objects.none() if options['force'] else ImageDerivative.objects.filter(source__in=names)
+        skipped = set(done.values_list('source', flat=True))
+
+        built = missing = failed = 0
+        for name in sorted(names - skipped):
+            if not default_storage.exists(name):
+                missing += 1
+                continue
+            try:
+                images.build(name, force=options['force'])
+                built += 1
+            except Exception as e:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'{name}: {e}'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{built} images processed, {len(skipped)} already done, {missing} missing files, {failed} failed'
+        ))
+        if options['prune']:
+            self.prune(names)
+
+    def prune(self, names):
+        stale = ImageDerivative.objects.exclude(source__in=names)
+        stale_digests = set(stale.values_list('digest', flat=True))
+        kept_digests = set(
+            ImageDerivative.objects.filter(source__in=names, digest__in=stale_digests).values_list('digest', flat=True)
+        )
+        files = 0
+        for row in stale:
+            images.forget(row.source)
+            if row.digest in kept_digests:
+                continue  # another image with the same bytes still uses these files
+            paths = {entry[ext] for entry in row.renditions.values() for ext, _, _ in images.FORMATS}
+            for path in paths:
+                if default_storage.exists(path):
+                    default_storage.delete(path)
+                    files += 1
+            kept_digests.add(row.digest)  # files gone; later duplicates have nothing left to delete
+        rows, _ = stale.delete()
+        self.stdout.write(self.style.SUCCESS(f'Pruned {rows} unused derivative sets ({files} files)'))
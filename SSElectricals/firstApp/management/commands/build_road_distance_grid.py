@@ -0,0 +1,40 @@
+"""
+Management command to (re)build the offline road-distance grid
+Run with: python manage.py build_road_distance_grid [--sample]
+Schedule it (e.g. weekly cron) with --sample to top up road-distance samples from Google.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from firstApp import road_distance
+
+
+class Command(BaseCommand):
+    help = 'Build the road-distance factor grid from cached Distance Matrix results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', action='store_true',
+                            help='Fetch road distances for lattice points without a cached sample first')
+        parser.add_argument('--spacing-km', type=float, default=1.5, help='Sample lattice spacing')
+        parser.add_argument('--radius-km', type=float, default=15.0, help='Sample up to this far from the shop')
+        parser.add_argument('--max-requests', type=int, default=40, help='Distance Matrix requests per run')
+
+    def handle(self, *args, **options):
+        if options['sample']:
+            api_key = getattr(settings, 'GOOGLE_SERVER_API_KEY', None) or getattr(settings, 'GOOGLE_PLACES_API_KEY', None)
+            if not api_key:
+                self.stdout.write(self.style.WARNING('No Google API key configured - skipping sampling'))
+            else:
+                points = road_distance.stale_cells(
+                    road_distance.sample_points(options['spacing_km'], options['radius_km'])
+                )
+                self.stdout.write(f'{len(points)} lattice points need a road distance sample')
+                stored = road_distance.fetch_samples(points, api_key, max_requests=options['max_requests'])
+                self.stdout.write(f'Stored {stored} new samples')
+
+        samples = road_distance.rebuild()
+        if not samples:
+            self.stdout.write(self.style.WARNING('No road distance samples yet - grid not written'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Built {road_distance.ROWS}x{road_distance.COLS} grid from {samples} samples at {road_distance.GRID_PATH}'
+        ))
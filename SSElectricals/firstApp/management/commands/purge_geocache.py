@@ -0,0 +1,21 @@
+"""
+Management command to drop expired geocoding/distance cache rows and show hit rates
+Run with: python manage.py purge_geocache
+"""
+from django.core.management.base import BaseCommand
+from firstApp.geocache import get_stats, purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete expired GeocodeCache/DistanceCache rows and print cache hit/miss counters'
+
+    def handle(self, *args, **options):
+        geocode_deleted, distance_deleted = purge_expired()
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {geocode_deleted} expired geocode rows and {distance_deleted} expired distance rows'
+        ))
+
+        for kind, counts in get_stats().items():
+            total = counts['hits'] + counts['misses']
+            rate = (counts['hits'] / total * 100) if total else 0
+            self.stdout.write(f"{kind}: {counts['hits']} hits, {counts['misses']} misses ({rate:.1f}% hit rate)")
@@ -0,0 +1,15 @@
+"""
+Management command to recompute the daily/monthly financial rollup tables
+Run with: python manage.py rebuild_financial_rollups
+Rollups are built from manual DailySales, DailyExpenditure and PurchaseEntry records only.
+"""
+from django.core.management.base import BaseCommand
+from firstApp.financial_rollups import rebuild_all
+
+
+class Command(BaseCommand):
+    help = 'Rebuild FinancialDailyRollup and FinancialMonthlyRollup from manual financial entries'
+
+    def handle(self, *args, **options):
+        days = rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt financial rollups for {days} days'))
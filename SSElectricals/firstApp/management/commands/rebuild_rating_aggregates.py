@@ -0,0 +1,45 @@
+"""
+Management command to rebuild denormalized product rating columns
+Run with: python manage.py rebuild_rating_aggregates
+"""
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from firstApp.models import Product, Review
+
+
+class Command(BaseCommand):
+    help = 'Recompute rating_sum, rating_count and rating_avg on every product from approved reviews'
+
+    def handle(self, *args, **options):
+        totals = {
+            row['product_id']: row
+            for row in Review.objects.filter(is_approved=True)
+            .values('product_id')
+            .annotate(total=Sum('rating'), count=Count('id'))
+        }
+
+        products = list(Product.objects.only('id', 'rating_sum', 'rating_count', 'rating_avg'))
+        changed = []
+        for product in products:
+            row = totals.get(product.id)
+            rating_sum = row['total'] if row else 0
+            rating_count = row['count'] if row else 0
+            rating_avg = (
+                (Decimal(rating_sum) / rating_count).quantize(Decimal('0.01'))
+                if rating_count else Decimal('0.00')
+            )
+            if (product.rating_sum, product.rating_count, product.rating_avg) != (rating_sum, rating_count, rating_avg):
+                product.rating_sum = rating_sum
+                product.rating_count = rating_count
+                product.rating_avg = rating_avg
+                changed.append(product)
+
+        with transaction.atomic():
+            Product.objects.bulk_update(changed, ['rating_sum', 'rating_count', 'rating_avg'], batch_size=500)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt rating aggregates: {len(changed)} of {len(products)} products updated'
+        ))
@@ -0,0 +1,19 @@
+"""
+Management command to recompute the product full-text search vectors
+Run with: python manage.py rebuild_search_index
+"""
+from django.core.management.base import BaseCommand
+from firstApp.models import Product
+from firstApp.search import product_search_vector, uses_full_text
+
+
+class Command(BaseCommand):
+    help = 'Recompute Product.search_vector for every product (PostgreSQL only)'
+
+    def handle(self, *args, **options):
+        if not uses_full_text():
+            self.stdout.write(self.style.WARNING('Full-text search needs PostgreSQL - nothing to rebuild'))
+            return
+
+        updated = Product.objects.update(search_vector=product_search_vector())
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt search vectors for {updated} products'))
@@ -0,0 +1,52 @@
+"""
+Management command to delete the legacy receipt QR PNGs now that QR codes are rendered as inline SVG
+Run with: python manage.py reclaim_qr_codes [--dry-run]
+Clears Order.receipt_qr_code / OfflineReceipt.qr_code_image and removes every file under
+media/order_qrcodes and media/receipt_qrcodes, including ones no row points to any more.
+"""
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from firstApp.models import OfflineReceipt, Order
+
+
+QR_FIELDS = (
+    (Order, 'receipt_qr_code', 'order_qrcodes'),
+    (OfflineReceipt, 'qr_code_image', 'receipt_qrcodes'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Delete legacy QR code PNG files and clear the fields that referenced them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be removed')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        files = freed = 0
+        for model, field, directory in QR_FIELDS:
+            names = set(
+                model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                .values_list(field, flat=True)
+            )
+            try:
+                _, listed = default_storage.listdir(directory)
+                names.update(f'{directory}/{name}' for name in listed)
+            except (FileNotFoundError, NotImplementedError):
+                pass
+
+            for name in sorted(names):
+                if not default_storage.exists(name):
+                    continue
+                files += 1
+                freed += default_storage.size(name)
+                if not dry_run:
+                    default_storage.delete(name)
+
+            if not dry_run:
+                # One UPDATE per model; nothing else on the rows changes
+                model.objects.exclude(**{f'{field}__isnull': True}).update(**{field: None})
+
+        verb = 'Would remove' if dry_run else 'Removed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {files} QR code files ({freed / 1024:.1f} KB)'))
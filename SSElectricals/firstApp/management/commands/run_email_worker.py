@@ -0,0 +1,41 @@
+"""
+Management command that delivers queued emails from the EmailLog outbox
+Run with: python manage.py run_email_worker
+Several workers may run at once; rows are claimed with SELECT ... FOR UPDATE SKIP LOCKED.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from firstApp.email_utils import process_email_batch, retry_failed_emails
+
+
+class Command(BaseCommand):
+    help = 'Send pending/retry emails from the EmailLog outbox in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20, help='Emails sent per SMTP connection')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the outbox once and exit')
+        parser.add_argument('--requeue-failed', action='store_true',
+                            help='Re-queue FAILED emails (retry_failed_emails) before starting')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        if options['requeue_failed']:
+            requeued = retry_failed_emails()
+            self.stdout.write(f'Re-queued {requeued} failed emails')
+
+        self.stdout.write(self.style.SUCCESS('Email worker started'))
+        try:
+            while True:
+                sent, failed = process_email_batch(batch_size)
+                if sent or failed:
+                    self.stdout.write(f'Sent {sent}, failed {failed}')
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS('Email worker stopped'))
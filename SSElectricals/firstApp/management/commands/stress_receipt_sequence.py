@@ -0,0 +1,81 @@
+"""
+Management command to hammer ReceiptSequence.allocate from many threads and check the result
+Run with: python manage.py stress_receipt_sequence --threads 8 --allocations 50 --batch 5
+Uses a scratch prefix (TST by default) whose counter row is deleted afterwards, so real
+ORD/SS numbering is untouched.
+"""
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections
+
+from firstApp.models import ReceiptSequence
+
+
+class Command(BaseCommand):
+    help = 'Allocate receipt numbers concurrently and verify there are no duplicates or gaps'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--allocations', type=int, default=50, help='Allocations per thread')
+        parser.add_argument('--batch', type=int, default=1, help='Numbers per allocation (bulk confirmation)')
+        parser.add_argument('--prefix', default='TST')
+        parser.add_argument('--retries', type=int, default=20,
+                            help='Retries per allocation on "database is locked" (SQLite only)')
+
+    def handle(self, *args, **options):
+        prefix, financial_year = options['prefix'], 'stress'
+        if prefix in (ReceiptSequence.ORDER_PREFIX, ReceiptSequence.OFFLINE_PREFIX):
+            raise CommandError(f'{prefix} is a live receipt prefix; pick a scratch one')
+        ReceiptSequence.objects.filter(prefix=prefix, financial_year=financial_year).delete()
+
+        numbers, errors, lock = [], [], threading.Lock()
+        barrier = threading.Barrier(options['threads'])
+
+        def worker():
+            barrier.wait()
+            try:
+                for _ in range(options['allocations']):
+                    for attempt in range(options['retries'] + 1):
+                        try:
+                            block = ReceiptSequence.allocate(prefix, financial_year, options['batch'])
+                            break
+                        except OperationalError:
+                            # SQLite allows one writer at a time; PostgreSQL just waits on the row lock
+                            if attempt == options['retries']:
+                                raise
+                            time.sleep(0.01 * (attempt + 1))
+                    with lock:
+                        numbers.extend(block)
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        ReceiptSequence.objects.filter(prefix=prefix, financial_year=financial_year).delete()
+
+        expected = options['threads'] * options['allocations'] * options['batch']
+        duplicates = len(numbers) - len(set(numbers))
+        missing = sorted(set(range(1, expected + 1)) - set(numbers))
+        allocations = options['threads'] * options['allocations']
+        self.stdout.write(
+            f"{len(numbers)} numbers in {allocations} allocations over {elapsed:.2f}s "
+            f"({allocations / elapsed:.0f} allocations/s)"
+        )
+        for error in errors[:5]:
+            self.stdout.write(self.style.ERROR(f'Worker failed: {error}'))
+        if errors or duplicates or missing or len(numbers) != expected:
+            raise CommandError(
+                f'{len(errors)} worker errors, {duplicates} duplicates, {len(missing)} missing numbers'
+            )
+        self.stdout.write(self.style.SUCCESS(f'1..{expected} allocated exactly once'))
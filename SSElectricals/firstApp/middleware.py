@@ -1,7 +1,21 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
 from .models import AdminSession, AdminActivityLog
 from django.contrib.sessions.models import Session
 
+# Staff last_activity is written at most once every ADMIN_ACTIVITY_FLUSH_SECONDS
+# per session instead of 2-3 queries on every request. The time of the last
+# write lives in the session itself, so any worker serving the next request
+# sees it and nothing is held in process memory.
+ADMIN_ACTIVITY_FLUSH_SECONDS = getattr(settings, 'ADMIN_ACTIVITY_FLUSH_SECONDS', 60)
+ADMIN_ACTIVITY_SESSION_KEY = '_admin_activity_written_at'
+ADMIN_SESSION_KNOWN_KEY = 'admin_session:known:{}'
+ADMIN_SESSION_KNOWN_TTL = 60 * 60
+
+
 class AdminSessionMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
@@ -10,28 +24,43 @@ class AdminSessionMiddleware:
         if request.user.is_authenticated and request.user.is_staff:
             session_key = request.session.session_key
             if session_key:
-                # Update last activity
-                AdminSession.objects.filter(session_key=session_key).update(last_activity=timezone.now())
-                
-                # Check if session exists, create if not (e.g. fresh login)
-                if not AdminSession.objects.filter(session_key=session_key).exists():
-                     # Get client IP
-                    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-                    if x_forwarded_for:
-                        ip = x_forwarded_for.split(',')[0]
-                    else:
-                        ip = request.META.get('REMOTE_ADDR')
-                        
-                    AdminSession.objects.create(
-                        user=request.user,
-                        session_key=session_key,
-                        ip_address=ip,
-                        user_agent=request.META.get('HTTP_USER_AGENT', '')[:255]
-                    )
+                self._ensure_session_record(request, session_key)
+                self._touch_last_activity(request, session_key)
 
         response = self.get_response(request)
         return response
 
+    def _touch_last_activity(self, request, session_key):
+        """UPDATE last_activity when the value stored for this session is older than the flush interval."""
+        now = time.time()
+        written_at = request.session.get(ADMIN_ACTIVITY_SESSION_KEY, 0)
+        if now - written_at < ADMIN_ACTIVITY_FLUSH_SECONDS:
+            return
+        AdminSession.objects.filter(session_key=session_key).update(last_activity=timezone.now())
+        request.session[ADMIN_ACTIVITY_SESSION_KEY] = now
+
+    def _ensure_session_record(self, request, session_key):
+        """Create the AdminSession row if missing (e.g. fresh login); the check is cached."""
+        known_key = ADMIN_SESSION_KNOWN_KEY.format(session_key)
+        if cache.get(known_key):
+            return
+
+        if not AdminSession.objects.filter(session_key=session_key).exists():
+             # Get client IP
+            x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+            if x_forwarded_for:
+                ip = x_forwarded_for.split(',')[0]
+            else:
+                ip = request.META.get('REMOTE_ADDR')
+                
+            AdminSession.objects.create(
+                user=request.user,
+                session_key=session_key,
+                ip_address=ip,
+                user_agent=request.META.get('HTTP_USER_AGENT', '')[:255]
+            )
+        cache.set(known_key, True, ADMIN_SESSION_KNOWN_TTL)
+
 class AdminActivityLogMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
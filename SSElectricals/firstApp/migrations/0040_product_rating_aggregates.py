@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:40
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model("firstApp", "Product")
+    Review = apps.get_model("firstApp", "Review")
+    rows = (
+        Review.objects.filter(is_approved=True)
+        .values("product_id")
+        .annotate(total=Sum("rating"), count=Count("id"))
+    )
+    for row in rows:
+        Product.objects.filter(pk=row["product_id"]).update(
+            rating_sum=row["total"],
+            rating_count=row["count"],
+            rating_avg=(Decimal(row["total"]) / row["count"]).quantize(Decimal("0.01")),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("firstApp", "0039_appointment_is_indore_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating_avg",
+            field=models.DecimalField(
+                db_index=True, decimal_places=2, default=0, editable=False, max_digits=3
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("firstApp", "0040_product_rating_aggregates"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["is_visible_on_website", "created_at", "id"],
+                name="firstApp_pr_is_visi_54072c_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["is_visible_on_website", "price", "id"],
+                name="firstApp_pr_is_visi_1fee11_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:05
+
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+def create_search_indexes(apps, schema_editor):
+    # GIN indexes are PostgreSQL-only; SQLite development databases skip them.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS product_search_vector_gin '
+        'ON "firstApp_product" USING gin (search_vector)'
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS product_name_trgm_gin '
+        'ON "firstApp_product" USING gin (name gin_trgm_ops)'
+    )
+    schema_editor.execute(
+        'UPDATE "firstApp_product" SET search_vector = '
+        "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(brand, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(short_description, '')), 'B') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'C')"
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS product_search_vector_gin")
+    schema_editor.execute("DROP INDEX IF EXISTS product_name_trgm_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("firstApp", "0041_product_catalogue_keyset_indexes"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="product",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("firstApp", "0042_product_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="emaillog",
+            name="attachments",
+            field=models.JSONField(
+                blank=True,
+                default=list,
+                help_text="[filename, base64 content, mimetype] triples",
+            ),
+        ),
+        migrations.AddField(
+            model_name="emaillog",
+            name="headers",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name="emaillog",
+            name="html_body",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="emaillog",
+            name="next_attempt_at",
+            field=models.DateTimeField(
+                blank=True, help_text="Earliest time the worker may (re)try", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="emaillog",
+            name="priority",
+            field=models.PositiveSmallIntegerField(
+                default=5, help_text="Lower is delivered first"
+            ),
+        ),
+        migrations.AddField(
+            model_name="emaillog",
+            name="text_body",
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="emaillog",
+            name="email_type",
+            field=models.CharField(
+                choices=[
+                    ("ORDER_STATUS", "Order Status Update"),
+                    ("ORDER_RECEIPT", "Order Receipt"),
+                    ("DELIVERY_OTP", "Delivery OTP"),
+                    ("ORDER_DELIVERED", "Order Delivered"),
+                    ("APPOINTMENT_STATUS", "Appointment Status Update"),
+                    ("APPOINTMENT_COMPLETE", "Appointment Complete"),
+                    ("OTP_VERIFICATION", "OTP Verification"),
+                    ("WARRANTY", "Warranty"),
+                ],
+                max_length=30,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="emaillog",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("PENDING", "Pending"),
+                    ("SENDING", "Sending"),
+                    ("SENT", "Sent"),
+                    ("FAILED", "Failed"),
+                    ("RETRY", "Retry"),
+                ],
+                default="PENDING",
+                max_length=20,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="emaillog",
+            index=models.Index(
+                fields=["status", "priority", "next_attempt_at"],
+                name="firstApp_em_status_4d2a06_idx",
+            ),
+        ),
+    ]
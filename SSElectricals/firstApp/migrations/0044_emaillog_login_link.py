@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("firstApp", "0043_emaillog_outbox"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="emaillog",
+            name="email_type",
+            field=models.CharField(
+                choices=[
+                    ("ORDER_STATUS", "Order Status Update"),
+                    ("ORDER_RECEIPT", "Order Receipt"),
+                    ("DELIVERY_OTP", "Delivery OTP"),
+                    ("ORDER_DELIVERED", "Order Delivered"),
+                    ("APPOINTMENT_STATUS", "Appointment Status Update"),
+                    ("APPOINTMENT_COMPLETE", "Appointment Complete"),
+                    ("OTP_VERIFICATION", "OTP Verification"),
+                    ("LOGIN_LINK", "One-Tap Login Link"),
+                    ("WARRANTY", "Warranty"),
+                ],
+                max_length=30,
+            ),
+        ),
+    ]
@@ -0,0 +1,190 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:55
+
+from django.db import migrations, models
+
+
+def backfill_rollups(apps, schema_editor):
+    """Populate the rollup tables from existing manual entries (same as rebuild_financial_rollups)."""
+    import datetime
+    from collections import defaultdict
+    from decimal import Decimal
+
+    from django.db.models import Count, Sum
+
+    DailySales = apps.get_model("firstApp", "DailySales")
+    DailyExpenditure = apps.get_model("firstApp", "DailyExpenditure")
+    PurchaseEntry = apps.get_model("firstApp", "PurchaseEntry")
+    FinancialDailyRollup = apps.get_model("firstApp", "FinancialDailyRollup")
+    FinancialMonthlyRollup = apps.get_model("firstApp", "FinancialMonthlyRollup")
+
+    zero = Decimal("0.00")
+    days = defaultdict(dict)
+    for row in DailySales.objects.values("date").annotate(
+        sales_total=Sum("total_sales"),
+        sales_online=Sum("online_received"),
+        sales_cash=Sum("cash_received"),
+        labor_total=Sum("labor_charge"),
+        delivery_total=Sum("delivery_charge"),
+        sales_entries=Count("id"),
+    ):
+        days[row.pop("date")].update(row)
+    for row in DailyExpenditure.objects.values("date").annotate(
+        expense_total=Sum("total"),
+        expense_online=Sum("online_amount"),
+        expense_cash=Sum("cash_amount"),
+        expense_entries=Count("id"),
+    ):
+        days[row.pop("date")].update(row)
+    for row in PurchaseEntry.objects.values("date").annotate(
+        purchase_total=Sum("total_cost"), purchase_entries=Count("id")
+    ):
+        days[row.pop("date")].update(row)
+
+    months = defaultdict(lambda: defaultdict(lambda: zero))
+    daily_rows = []
+    for day, values in days.items():
+        if isinstance(day, datetime.datetime):
+            day = day.date()
+        values = {
+            key: value if value is not None else zero for key, value in values.items()
+        }
+        daily_rows.append(FinancialDailyRollup(date=day, **values))
+        for key, value in values.items():
+            months[day.replace(day=1)][key] += value
+    FinancialDailyRollup.objects.bulk_create(daily_rows, batch_size=500)
+    FinancialMonthlyRollup.objects.bulk_create(
+        [
+            FinancialMonthlyRollup(month=month, **values)
+            for month, values in months.items()
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("firstApp", "0045_geocode_distance_cache"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FinancialDailyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "sales_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "sales_online",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "sales_cash",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "labor_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "delivery_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("sales_entries", models.PositiveIntegerField(default=0)),
+                (
+                    "expense_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "expense_online",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "expense_cash",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("expense_entries", models.PositiveIntegerField(default=0)),
+                (
+                    "purchase_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("purchase_entries", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("date", models.DateField(unique=True)),
+            ],
+            options={
+                "ordering": ["date"],
+            },
+        ),
+        migrations.CreateModel(
+            name="FinancialMonthlyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "sales_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "sales_online",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "sales_cash",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "labor_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "delivery_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("sales_entries", models.PositiveIntegerField(default=0)),
+                (
+                    "expense_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "expense_online",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "expense_cash",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("expense_entries", models.PositiveIntegerField(default=0)),
+                (
+                    "purchase_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("purchase_entries", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "month",
+                    models.DateField(help_text="First day of the month", unique=True),
+                ),
+            ],
+            options={
+                "ordering": ["month"],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
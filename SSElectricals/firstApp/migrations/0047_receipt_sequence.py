@@ -0,0 +1,69 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:16
+
+from django.db import migrations, models
+
+
+def seed_sequences(apps, schema_editor):
+    """Start each counter after the highest number already issued in that financial year."""
+    from django.db.models import Max
+
+    Order = apps.get_model("firstApp", "Order")
+    OfflineReceipt = apps.get_model("firstApp", "OfflineReceipt")
+    ReceiptSequence = apps.get_model("firstApp", "ReceiptSequence")
+
+    rows = []
+    for row in (
+        Order.objects.exclude(receipt_number__isnull=True)
+        .exclude(financial_year__isnull=True)
+        .values("financial_year")
+        .annotate(last=Max("receipt_sequence"))
+    ):
+        rows.append(
+            ReceiptSequence(
+                prefix="ORD",
+                financial_year=row["financial_year"],
+                last_value=row["last"] or 0,
+            )
+        )
+    for row in OfflineReceipt.objects.values("financial_year").annotate(
+        last=Max("sequence_number")
+    ):
+        rows.append(
+            ReceiptSequence(
+                prefix="SS",
+                financial_year=row["financial_year"],
+                last_value=row["last"] or 0,
+            )
+        )
+    ReceiptSequence.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("firstApp", "0046_financial_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReceiptSequence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("prefix", models.CharField(max_length=10)),
+                ("financial_year", models.CharField(max_length=10)),
+                ("last_value", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "unique_together": {("prefix", "financial_year")},
+            },
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
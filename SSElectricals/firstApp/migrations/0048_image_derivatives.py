@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("firstApp", "0047_receipt_sequence"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImageDerivative",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("source", models.CharField(max_length=255, unique=True)),
+                (
+                    "digest",
+                    models.CharField(
+                        db_index=True,
+                        help_text="SHA-1 of the original file",
+                        max_length=40,
+                    ),
+                ),
+                ("renditions", models.JSONField(default=dict)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
 from django.conf import settings
 from django.utils import timezone
 
@@ -80,19 +81,22 @@ class Product(models.Model):
     is_visible_on_website = models.BooleanField(default=False, help_text="Show this product on the website (default: hidden)")
     created_at = models.DateTimeField(auto_now_add=True)
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        
-        if self.image:
-            try:
-                from PIL import Image
-                img = Image.open(self.image.path)
-                if img.height > 800 or img.width > 800:
-                    output_size = (800, 800)
-                    img.thumbnail(output_size)
-                    img.save(self.image.path)
-            except Exception as e:
-                pass
+    # Denormalized rating aggregates (approved reviews only), kept in sync by Review signals
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0, editable=False, db_index=True)
+
+    # Full-text document for search.py, refreshed on save (PostgreSQL only)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination for the storefront catalogue (see catalog.py)
+            models.Index(fields=['is_visible_on_website', 'created_at', 'id']),
+            models.Index(fields=['is_visible_on_website', 'price', 'id']),
+        ]
+        # GIN indexes on search_vector and name (gin_trgm_ops) are created in
+        # migration 0042 on PostgreSQL only, so SQLite development still migrates.
 
     def __str__(self):
         return self.name
@@ -103,14 +107,30 @@ class Product(models.Model):
 
     @property
     def average_rating(self):
-        reviews = self.reviews.all()
-        if reviews:
-            return sum([r.rating for r in reviews]) / len(reviews)
-        return 0
+        return float(self.rating_avg)
 
     @property
     def review_count(self):
-        return self.reviews.count()
+        return self.rating_count
+
+    def refresh_rating_aggregates(self):
+        """Recompute stored rating columns from approved reviews (1 aggregate + 1 UPDATE, no save())"""
+        from decimal import Decimal
+        totals = self.reviews.filter(is_approved=True).aggregate(
+            total=models.Sum('rating'), count=models.Count('id')
+        )
+        self.rating_sum = totals['total'] or 0
+        self.rating_count = totals['count'] or 0
+        self.rating_avg = (
+            (Decimal(self.rating_sum) / self.rating_count).quantize(Decimal('0.01'))
+            if self.rating_count else Decimal('0.00')
+        )
+        # Use update() so Product.save() side effects (search vector, activity log) don't run
+        Product.objects.filter(pk=self.pk).update(
+            rating_sum=self.rating_sum,
+            rating_count=self.rating_count,
+            rating_avg=self.rating_avg,
+        )
     
     # TASK 1: Stock status properties
     @property
@@ -138,20 +158,6 @@ class ProductImage(models.Model):
     image = models.ImageField(upload_to='product_gallery/')
     created_at = models.DateTimeField(auto_now_add=True)
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        
-        if self.image:
-            try:
-                from PIL import Image
-                img = Image.open(self.image.path)
-                if img.height > 800 or img.width > 800:
-                    output_size = (800, 800)
-                    img.thumbnail(output_size)
-                    img.save(self.image.path)
-            except Exception as e:
-                pass
-
     def __str__(self):
         return f"Image for {self.product.name}"
 
@@ -256,7 +262,7 @@ class Order(models.Model):
     receipt_number = models.CharField(max_length=50, unique=True, blank=True, null=True, db_index=True)
     financial_year = models.CharField(max_length=10, blank=True, null=True, help_text="e.g., 2024-25")
     receipt_sequence = models.IntegerField(blank=True, null=True, help_text="Sequential number within FY")
-    receipt_qr_code = models.ImageField(upload_to='order_qrcodes/', blank=True, null=True)
+    receipt_qr_code = models.ImageField(upload_to='order_qrcodes/', blank=True, null=True)  # legacy PNG, see reclaim_qr_codes
     receipt_qr_data = models.TextField(blank=True, null=True)
     receipt_generated_at = models.DateTimeField(blank=True, null=True)
 
@@ -309,59 +315,56 @@ class Order(models.Model):
         return str(date.today().year)[2:]  # Returns '25' for 2025, '26' for 2026
     
     def generate_receipt_number(self):
-        """Generate FY-based receipt number for order"""
+        """Generate FY-based receipt number for order (the caller saves the order in the same transaction.atomic())"""
         if not self.receipt_number and self.status in ['Confirmed', 'Out for Delivery', 'Delivered']:
             # Get current FY
             self.financial_year = self.get_current_financial_year()
             
-            # Get last order receipt in this FY
-            last_order = Order.objects.filter(
-                financial_year=self.financial_year
-            ).exclude(receipt_number__isnull=True).order_by('-receipt_sequence').first()
-            
-            seq = (last_order.receipt_sequence + 1) if last_order else 1
-            
-            self.receipt_sequence = seq
-            self.receipt_number = f"ORD/{self.financial_year}/{seq:04d}"  # ORD prefix for orders
-            self.receipt_generated_at = timezone.now()
-            
-            # Generate QR code data
-            self.receipt_qr_data = (
-                f"Order Receipt: {self.receipt_number}\n"
-                f"Amount: ₹{self.grand_total}\n"
-                f"Date: {self.created_at.strftime('%d-%m-%Y')}\n"
-                f"Customer: {self.user.get_full_name() or self.user.username}"
-            )
-            
-            self.save()
+            seq = ReceiptSequence.next_value(ReceiptSequence.ORDER_PREFIX, self.financial_year)
+            self._apply_receipt_number(seq)
     
-    def generate_receipt_qr_code(self):
-        """Generate QR code image for order receipt"""
-        if not self.receipt_qr_data:
-            return
+    def _apply_receipt_number(self, seq):
+        self.receipt_sequence = seq
+        self.receipt_number = f"{ReceiptSequence.ORDER_PREFIX}/{self.financial_year}/{seq:04d}"  # ORD prefix for orders
+        self.receipt_generated_at = timezone.now()
         
-        try:
-            import qrcode
-            from io import BytesIO
-            from django.core.files import File
-            
-            # Create QR code
-            qr = qrcode.QRCode(version=1, box_size=10, border=5)
-            qr.add_data(self.receipt_qr_data)
-            qr.make(fit=True)
-            
-            img = qr.make_image(fill_color="black", back_color="white")
-            
-            # Save to file
-            buffer = BytesIO()
-            img.save(buffer, format='PNG')
-            filename = f'order_receipt_{self.receipt_number.replace("/", "_")}.png'
-            self.receipt_qr_code.save(filename, File(buffer), save=False)
-            buffer.close()
-            
-            self.save()
-        except ImportError:
-            pass  # qrcode library not installed
+        # Generate QR code data
+        self.receipt_qr_data = (
+            f"Order Receipt: {self.receipt_number}\n"
+            f"Amount: ₹{self.grand_total}\n"
+            f"Date: {self.created_at.strftime('%d-%m-%Y')}\n"
+            f"Customer: {self.user.get_full_name() or self.user.username}"
+        )
+    
+    @classmethod
+    def generate_receipt_numbers(cls, orders):
+        """
+        Bulk confirmation: number every eligible order from one allocated block
+        and save them with a single bulk_update. Returns the orders numbered.
+        """
+        financial_year = cls.get_current_financial_year()
+        pending = [
+            order for order in orders
+            if not order.receipt_number and order.status in ['Confirmed', 'Out for Delivery', 'Delivered']
+        ]
+        if not pending:
+            return []
+        from django.db import transaction
+        with transaction.atomic():
+            block = ReceiptSequence.allocate(ReceiptSequence.ORDER_PREFIX, financial_year, len(pending))
+            for order, seq in zip(pending, block):
+                order.financial_year = financial_year
+                order._apply_receipt_number(seq)
+            cls.objects.bulk_update(pending, [
+                'financial_year', 'receipt_sequence', 'receipt_number', 'receipt_generated_at', 'receipt_qr_data',
+            ])
+        return pending
+    
+    @property
+    def receipt_qr_svg(self):
+        """Inline SVG QR code of receipt_qr_data, rendered on demand (see qr_codes.py)"""
+        from .qr_codes import svg
+        return svg(self.receipt_qr_data)
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
@@ -532,25 +535,16 @@ class ServiceType(models.Model):
         """
         Get the appropriate charge based on distance.
         Returns (charge, is_confirmed) tuple.
+        Slabs are resolved by the shared pricing engine (pricing.py).
         """
-        if self.pricing_mode == 'confirm':
-            return (None, False)  # Price to be confirmed
-        
-        # Check distance ranges (smallest to largest)
-        if distance_km is not None:
-            if distance_km <= 0.5 and self.charge_within_500m:
-                return (float(self.charge_within_500m), True)
-            elif distance_km <= 1 and self.charge_within_1km:
-                return (float(self.charge_within_1km), True)
-            elif distance_km <= 3 and self.charge_within_3km:
-                return (float(self.charge_within_3km), True)
-            elif distance_km <= 5 and self.charge_within_5km:
-                return (float(self.charge_within_5km), True)
-            elif distance_km <= 7 and self.charge_within_7km:
-                return (float(self.charge_within_7km), True)
-        
-        # Fallback to default charge
-        return (float(self.default_charge), True)
+        from . import pricing
+        if self.pk is None:
+            return pricing.charge_for_tiers(pricing.compile_service(self), distance_km)
+        quote = pricing.service_charge(self.pk, distance_km)
+        if quote is None:
+            # Not in this worker's table yet (e.g. saved in an open transaction)
+            return pricing.charge_for_tiers(pricing.compile_service(self), distance_km)
+        return quote
 
 
 # 6b. Distance-Based Pricing Zones
@@ -587,15 +581,9 @@ class DistanceZone(models.Model):
     
     @classmethod
     def get_zone_for_distance(cls, distance_km):
-        """Get the appropriate zone for a given distance."""
-        try:
-            return cls.objects.filter(
-                min_distance_km__lte=distance_km,
-                max_distance_km__gt=distance_km,
-                is_active=True
-            ).first()
-        except cls.DoesNotExist:
-            return None
+        """Get the appropriate zone for a given distance (from the cached pricing table)."""
+        from . import pricing
+        return pricing.get_zone_for_distance(distance_km)
 
 
 # 6c. Area to Region Mapping (for showing cities in regions)
@@ -729,18 +717,12 @@ class ServicePrice(models.Model):
         Get pricing for a service type and area.
         Returns dict with base_price, min_service_charge, max_service_charge.
         """
+        from . import pricing
         zone = cls.get_zone_for_area(area)
-        try:
-            price = cls.objects.get(service_type=service_type, zone=zone, is_active=True)
-            return {
-                'found': True,
-                'base_price': float(price.base_price),
-                'min_service_charge': float(price.min_service_charge),
-                'max_service_charge': float(price.max_service_charge),
-                'zone': zone,
-                'zone_display': price.get_zone_display(),
-            }
-        except cls.DoesNotExist:
+        price = pricing.get_area_price(service_type, zone)  # cached table, no query
+        if price is not None:
+            return dict(price)
+        else:
             # Return default pricing if not configured
             return {
                 'found': False,
@@ -1089,10 +1071,13 @@ class EmailLog(models.Model):
         ('APPOINTMENT_STATUS', 'Appointment Status Update'),
         ('APPOINTMENT_COMPLETE', 'Appointment Complete'),
         ('OTP_VERIFICATION', 'OTP Verification'),
+        ('LOGIN_LINK', 'One-Tap Login Link'),
+        ('WARRANTY', 'Warranty'),
     ]
     
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),
+        ('SENDING', 'Sending'),
         ('SENT', 'Sent'),
         ('FAILED', 'Failed'),
         ('RETRY', 'Retry'),
@@ -1107,6 +1092,14 @@ class EmailLog(models.Model):
     order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='email_logs')
     appointment = models.ForeignKey(Appointment, on_delete=models.SET_NULL, null=True, blank=True, related_name='email_logs')
     
+    # Outbox payload (rendered in the request, delivered by run_email_worker)
+    html_body = models.TextField(blank=True, null=True)
+    text_body = models.TextField(blank=True, null=True)
+    headers = models.JSONField(default=dict, blank=True)
+    attachments = models.JSONField(default=list, blank=True, help_text="[filename, base64 content, mimetype] triples")
+    priority = models.PositiveSmallIntegerField(default=5, help_text="Lower is delivered first")
+    next_attempt_at = models.DateTimeField(null=True, blank=True, help_text="Earliest time the worker may (re)try")
+    
     # Tracking
     sent_at = models.DateTimeField(null=True, blank=True)
     error_message = models.TextField(blank=True, null=True)
@@ -1120,6 +1113,7 @@ class EmailLog(models.Model):
         indexes = [
             models.Index(fields=['status', 'created_at']),
             models.Index(fields=['email_type', 'recipient']),
+            models.Index(fields=['status', 'priority', 'next_attempt_at']),
         ]
     
     def __str__(self):
@@ -1166,6 +1160,57 @@ class FinancialValidationLog(models.Model):
     def __str__(self):
         return f"{self.violation_type} - {self.detected_at.strftime('%Y-%m-%d %H:%M')}"
 
+# 13b. Financial Rollups (derived from manual entries only)
+class FinancialRollupFields(models.Model):
+    """
+    Totals of the manual financial entries for one period.
+    Maintained by financial_rollups.py from DailySales, DailyExpenditure and
+    PurchaseEntry only - never from orders.
+    """
+    sales_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    sales_online = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    sales_cash = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    labor_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    delivery_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    sales_entries = models.PositiveIntegerField(default=0)
+
+    expense_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expense_online = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expense_cash = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    expense_entries = models.PositiveIntegerField(default=0)
+
+    purchase_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    purchase_entries = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def profit(self):
+        return self.sales_total - self.expense_total - self.purchase_total
+
+
+class FinancialDailyRollup(FinancialRollupFields):
+    date = models.DateField(unique=True)
+
+    class Meta:
+        ordering = ['date']
+
+    def __str__(self):
+        return f"Rollup {self.date}"
+
+
+class FinancialMonthlyRollup(FinancialRollupFields):
+    month = models.DateField(unique=True, help_text="First day of the month")
+
+    class Meta:
+        ordering = ['month']
+
+    def __str__(self):
+        return f"Rollup {self.month:%Y-%m}"
+
 # 14. One-Tap Email Login Tokens
 class EmailLoginToken(models.Model):
     """
@@ -1214,6 +1259,73 @@ class EmailLoginToken(models.Model):
         self.save()
 
 
+# Receipt numbering: one counter row per (prefix, financial year)
+class ReceiptSequence(models.Model):
+    """
+    Allocates receipt sequence numbers for Order (ORD/..) and OfflineReceipt (SS/..).
+
+    allocate() bumps last_value with a single UPDATE ... RETURNING in the
+    caller's transaction, so concurrent confirmations get distinct numbers
+    (the row lock serialises them) instead of racing on the unique
+    receipt_number, and a rolled-back allocation gives its numbers back.
+    """
+    ORDER_PREFIX = 'ORD'
+    OFFLINE_PREFIX = 'SS'
+
+    prefix = models.CharField(max_length=10)
+    financial_year = models.CharField(max_length=10)
+    last_value = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [['prefix', 'financial_year']]
+
+    def __str__(self):
+        return f"{self.prefix}/{self.financial_year} at {self.last_value}"
+
+    @classmethod
+    def _bump(cls, prefix, financial_year, count):
+        """Add count to the counter and return its new value, or None if the row doesn't exist yet."""
+        from django.db import connection
+
+        # UPDATE ... RETURNING: PostgreSQL, and SQLite from 3.35. Not keyed on
+        # can_return_columns_from_insert, which is about INSERT (MariaDB has that only)
+        if connection.vendor == 'postgresql' or (
+            connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 35)
+        ):
+            table = connection.ops.quote_name(cls._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {table} SET last_value = last_value + %s "
+                    f"WHERE prefix = %s AND financial_year = %s RETURNING last_value",
+                    [count, prefix, financial_year],
+                )
+                row = cursor.fetchone()
+            return row[0] if row else None
+        counter = cls.objects.filter(prefix=prefix, financial_year=financial_year)
+        if not counter.update(last_value=models.F('last_value') + count):
+            return None
+        return counter.values_list('last_value', flat=True).get()
+
+    @classmethod
+    def allocate(cls, prefix, financial_year, count=1):
+        """Reserve count consecutive numbers; returns them as a range."""
+        from django.db import transaction
+
+        if count < 1:
+            return range(0)
+        with transaction.atomic():
+            last = cls._bump(prefix, financial_year, count)
+            if last is None:
+                # First number of a new financial year
+                cls.objects.get_or_create(prefix=prefix, financial_year=financial_year)
+                last = cls._bump(prefix, financial_year, count)
+        return range(last - count + 1, last + 1)
+
+    @classmethod
+    def next_value(cls, prefix, financial_year):
+        return cls.allocate(prefix, financial_year)[0]
+
+
 # 15. Offline Receipt / Manual Billing System
 class OfflineReceipt(models.Model):
     """
@@ -1290,7 +1402,7 @@ class OfflineReceipt(models.Model):
     
     # QR Code Data
     qr_code_data = models.TextField(blank=True, null=True, help_text="Data encoded in receipt QR code")
-    qr_code_image = models.ImageField(upload_to='receipt_qrcodes/', blank=True, null=True)
+    qr_code_image = models.ImageField(upload_to='receipt_qrcodes/', blank=True, null=True)  # legacy PNG, see reclaim_qr_codes
     
     # PDF Storage
     pdf_file = models.FileField(upload_to='receipt_pdfs/', blank=True, null=True)
@@ -1335,13 +1447,7 @@ class OfflineReceipt(models.Model):
     @staticmethod
     def get_next_sequence_number(financial_year):
         """Get next sequence number for given FY"""
-        last_receipt = OfflineReceipt.objects.filter(
-            financial_year=financial_year
-        ).order_by('-sequence_number').first()
-        
-        if last_receipt:
-            return last_receipt.sequence_number + 1
-        return 1
+        return ReceiptSequence.next_value(ReceiptSequence.OFFLINE_PREFIX, financial_year)
     
     def save(self, *args, **kwargs):
         """Auto-generate FY-based receipt number on creation"""
@@ -1349,13 +1455,20 @@ class OfflineReceipt(models.Model):
             # Get current FY
             self.financial_year = self.get_current_financial_year()
             
-            # Get next sequence number
-            self.sequence_number = self.get_next_sequence_number(self.financial_year)
-            
             # Generate receipt number: SS/25/0001 (year/sequence)
-            prefix = "SS"  # Shop initials (configurable)
-            self.receipt_number = f"{prefix}/{self.financial_year}/{self.sequence_number:04d}"
+            prefix = ReceiptSequence.OFFLINE_PREFIX  # Shop initials (configurable)
+            from django.db import transaction
+            with transaction.atomic():
+                # Allocate and insert together: a failed insert hands the number back
+                self.sequence_number = self.get_next_sequence_number(self.financial_year)
+                self.receipt_number = f"{prefix}/{self.financial_year}/{self.sequence_number:04d}"
+                self._fill_qr_data()
+                return super().save(*args, **kwargs)
         
+        self._fill_qr_data()
+        super().save(*args, **kwargs)
+    
+    def _fill_qr_data(self):
         # Auto-generate QR code data
         if not self.qr_code_data:
             self.qr_code_data = (
@@ -1364,8 +1477,6 @@ class OfflineReceipt(models.Model):
                 f"Date: {timezone.now().strftime('%d-%m-%Y')}\n"
                 f"Shop: {self.shop_name}"
             )
-        
-        super().save(*args, **kwargs)
     
     def void_receipt(self, admin_user, reason):
         """Mark receipt as void"""
@@ -1447,31 +1558,11 @@ class OfflineReceipt(models.Model):
         avg_pct = sum(item.discount_percentage for item in items_with_mrp) / len(items_with_mrp)
         return round(avg_pct, 1)
     
-    def generate_qr_code(self):
-        """Generate QR code image for receipt"""
-        try:
-            import qrcode
-            from io import BytesIO
-            from django.core.files import File
-            
-            # Create QR code
-            qr = qrcode.QRCode(version=1, box_size=10, border=5)
-            qr.add_data(self.qr_code_data)
-            qr.make(fit=True)
-            
-            img = qr.make_image(fill_color="black", back_color="white")
-            
-            # Save to file
-            buffer = BytesIO()
-            img.save(buffer, format='PNG')
-            filename = f'receipt_{self.receipt_number.replace("/", "_")}.png'
-            self.qr_code_image.save(filename, File(buffer), save=False)
-            buffer.close()
-            
-            self.save()
-        except ImportError:
-            pass  # qrcode library not installed
-
+    @property
+    def qr_code_svg(self):
+        """Inline SVG QR code of qr_code_data, rendered on demand (see qr_codes.py)"""
+        from .qr_codes import svg
+        return svg(self.qr_code_data)
 
 
 class ReceiptItem(models.Model):
@@ -1938,3 +2029,53 @@ class Warranty(models.Model):
             warranty_expiry_date__lt=today,
             status='ACTIVE'
         ).update(status='EXPIRED')
+
+
+class GeocodeCache(models.Model):
+    """
+    Cached geocoding results keyed by a normalized address string (see geocache.py).
+    A row with no coordinates records an address that could not be located.
+    """
+    address_key = models.CharField(max_length=255, unique=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    source = models.CharField(max_length=20, help_text="google / nominatim")
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.address_key} -> {self.latitude}, {self.longitude}"
+
+
+class DistanceCache(models.Model):
+    """
+    Cached road distance from the shop, keyed by a rounded lat/lng grid cell (~110 m).
+    """
+    cell_key = models.CharField(max_length=40, unique=True)
+    distance_km = models.FloatField()
+    source = models.CharField(max_length=20, help_text="google")
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.cell_key}: {self.distance_km} KM"
+
+
+class ImageDerivative(models.Model):
+    """
+    Resized WebP/JPEG copies of one uploaded image (see images.py).
+
+    source is the original's storage name; renditions maps each variant
+    (thumbnail, card, detail) to {'width', 'height', 'webp', 'jpeg'}, the last
+    two being storage names under derivatives/ that embed the SHA-1 of the
+    original, so they never change once written.
+    """
+    source = models.CharField(max_length=255, unique=True)
+    digest = models.CharField(max_length=40, db_index=True, help_text="SHA-1 of the original file")
+    renditions = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.source
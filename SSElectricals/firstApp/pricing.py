@@ -0,0 +1,281 @@
+"""
+Distance-based pricing engine for delivery and electrician service charges.
+
+All slab logic lives here:
+- product delivery charges (checkout, utils.calculate_distance_and_price);
+- ServiceType charges per distance slab (book appointment, forms, admin);
+- DistanceZone lookup;
+- the ServicePrice area matrix (ServicePrice.get_price) and the JSON price
+  matrix served to the booking page (views.service_price_matrix).
+
+ServiceType, ServicePrice and DistanceZone rows are compiled once per worker
+into an immutable PricingTable of sorted tier bounds that is searched with
+bisect, so a quote costs a few microseconds and no queries. Saving or deleting
+any of them bumps a version key in the shared cache (receivers in admin.py);
+each worker compares its table's version with the cache at most every
+VERSION_CHECK_SECONDS and recompiles when it changed.
+"""
+import hashlib
+import json
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from typing import NamedTuple, Optional, Tuple
+
+from django.core.cache import cache
+from django.db.models import Max
+
+
+VERSION_KEY = 'pricing:version'
+VERSION_CHECK_SECONDS = 2
+
+# Product delivery: (max km inclusive, charge). Beyond the last tier: out of range.
+DELIVERY_TIERS = ((3.0, 50), (5.0, 70), (7.0, 80))
+DELIVERY_MAX_KM = DELIVERY_TIERS[-1][0]
+FREE_DELIVERY_MAX_KM = 2.0  # first order within this distance ships free
+
+# ServiceType slabs: (max km inclusive, slab label, model field)
+SERVICE_SLABS = (
+    (0.5, '500m', 'charge_within_500m'),
+    (1.0, '1km', 'charge_within_1km'),
+    (3.0, '3km', 'charge_within_3km'),
+    (5.0, '5km', 'charge_within_5km'),
+    (7.0, '7km', 'charge_within_7km'),
+)
+SERVICE_SLAB_ABOVE = 'above_7km'
+_SLAB_BOUNDS = tuple(bound for bound, _, _ in SERVICE_SLABS)
+_DELIVERY_BOUNDS = tuple(bound for bound, _ in DELIVERY_TIERS)
+
+
+class ServiceTiers(NamedTuple):
+    """One ServiceType compiled for lookups (only slabs with a charge set)."""
+    id: int
+    name: str
+    pricing_mode: str
+    is_active: bool
+    default_charge: float
+    bounds: Tuple[float, ...]
+    charges: Tuple[float, ...]
+
+
+class PricingTable(NamedTuple):
+    version: int
+    services: dict  # id -> ServiceTiers
+    zone_mins: Tuple[float, ...]
+    zones: tuple  # DistanceZone instances, ordered by min_distance_km
+    zones_disjoint: bool
+    area_prices: dict  # (service_type, zone) -> ServicePrice.get_price() dict
+    last_modified: object  # latest ServiceType/ServicePrice updated_at (datetime or None)
+    matrix_json: str  # serialized price matrix for the booking page
+    etag: str
+
+
+# ---- compiling ----
+
+def compile_service(service):
+    """Build the tier tuple for one ServiceType instance."""
+    bounds, charges = [], []
+    for bound, _, field in SERVICE_SLABS:
+        charge = getattr(service, field)
+        if charge:  # unset or zero slabs fall through to the next one
+            bounds.append(bound)
+            charges.append(float(charge))
+    return ServiceTiers(
+        id=service.pk,
+        name=service.name,
+        pricing_mode=service.pricing_mode,
+        is_active=service.is_active,
+        default_charge=float(service.default_charge),
+        bounds=tuple(bounds),
+        charges=tuple(charges),
+    )
+
+
+def _compile(version):
+    from .models import DistanceZone, ServicePrice, ServiceType
+
+    services = {service.pk: compile_service(service) for service in ServiceType.objects.all()}
+    zones = tuple(DistanceZone.objects.filter(is_active=True).order_by('min_distance_km', 'pk'))
+    zones_disjoint = all(
+        zones[i].max_distance_km <= zones[i + 1].min_distance_km for i in range(len(zones) - 1)
+    )
+    area_prices = {
+        (price.service_type, price.zone): {
+            'found': True,
+            'base_price': float(price.base_price),
+            'min_service_charge': float(price.min_service_charge),
+            'max_service_charge': float(price.max_service_charge),
+            'zone': price.zone,
+            'zone_display': price.get_zone_display(),
+        }
+        for price in ServicePrice.objects.filter(is_active=True)
+    }
+
+    timestamps = [
+        ServiceType.objects.aggregate(latest=Max('updated_at'))['latest'],
+        ServicePrice.objects.aggregate(latest=Max('updated_at'))['latest'],
+    ]
+    timestamps = [t for t in timestamps if t is not None]
+    last_modified = max(timestamps) if timestamps else None
+
+    matrix_json = json.dumps(_build_matrix(services, area_prices), separators=(',', ':'))
+    # Hash of the payload: also changes on deletes, which don't move max(updated_at)
+    etag = '"%s"' % hashlib.md5(matrix_json.encode()).hexdigest()
+
+    return PricingTable(
+        version=version,
+        services=services,
+        zone_mins=tuple(float(zone.min_distance_km) for zone in zones),
+        zones=zones,
+        zones_disjoint=zones_disjoint,
+        area_prices=area_prices,
+        last_modified=last_modified,
+        matrix_json=matrix_json,
+        etag=etag,
+    )
+
+
+def _build_matrix(services, area_prices):
+    """Everything the booking page needs to price any service/distance locally."""
+    return {
+        'slabs': [{'key': label, 'max_km': bound} for bound, label, _ in SERVICE_SLABS]
+                 + [{'key': SERVICE_SLAB_ABOVE, 'max_km': None}],
+        'services': [
+            {
+                'id': tiers.id,
+                'name': tiers.name,
+                'pricing_mode': tiers.pricing_mode,
+                'requires_confirmation': tiers.pricing_mode == 'confirm',
+                'default_charge': tiers.default_charge,
+                # [max km inclusive, charge]: first tier with max_km >= distance, else default_charge
+                'tiers': [list(tier) for tier in zip(tiers.bounds, tiers.charges)],
+            }
+            for tiers in sorted(services.values(), key=lambda t: t.name)
+            if tiers.is_active
+        ],
+        'area_prices': [
+            dict(price, service_type=service_type)
+            for (service_type, _), price in sorted(area_prices.items())
+        ],
+    }
+
+
+_table = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _remote_version():
+    return cache.get_or_set(VERSION_KEY, 1, None)
+
+
+def get_table():
+    """This worker's PricingTable, recompiled when the shared version moves on."""
+    global _table, _checked_at
+    table = _table
+    now = time.monotonic()
+    if table is not None and now - _checked_at < VERSION_CHECK_SECONDS:
+        return table
+
+    version = _remote_version()
+    if table is None or table.version != version:
+        with _lock:
+            if _table is None or _table.version != version:
+                _table = _compile(version)
+            table = _table
+    _checked_at = now
+    return table
+
+
+def invalidate():
+    """Called when ServiceType/ServicePrice/DistanceZone rows change (see admin.py)."""
+    global _table
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, None)
+    _table = None
+
+
+# ---- quotes ----
+
+def delivery_charge_for_distance(distance_km):
+    """Delivery charge in rupees for a road distance, or None when out of range."""
+    index = bisect_left(_DELIVERY_BOUNDS, distance_km)
+    if index == len(DELIVERY_TIERS):
+        return None
+    return DELIVERY_TIERS[index][1]
+
+
+def quote_delivery(distance_km):
+    """
+    Delivery quote used by checkout and calculate_distance_and_price.
+
+    Returns (distance_km rounded to 2 places, charge, error_message); charge is
+    0 with an error message when the address is beyond DELIVERY_MAX_KM.
+    """
+    distance_km = round(float(distance_km), 2)
+    charge = delivery_charge_for_distance(distance_km)
+    if charge is None:
+        return distance_km, 0, f"Out of delivery range. Distance: {distance_km} KM (max {DELIVERY_MAX_KM:g} KM)."
+    return distance_km, charge, None
+
+
+def distance_slab(distance_km):
+    """Slab label ('500m', '1km', ... 'above_7km', or 'default' when distance is unknown)."""
+    if distance_km is None:
+        return 'default'
+    index = bisect_left(_SLAB_BOUNDS, distance_km)
+    if index == len(SERVICE_SLABS):
+        return SERVICE_SLAB_ABOVE
+    return SERVICE_SLABS[index][1]
+
+
+def charge_for_tiers(tiers, distance_km):
+    """(charge, is_confirmed) for compiled ServiceTiers; charge is None for 'confirm' services."""
+    if tiers.pricing_mode == 'confirm':
+        return (None, False)  # Price to be confirmed
+    if distance_km is not None:
+        index = bisect_left(tiers.bounds, distance_km)
+        if index < len(tiers.bounds):
+            return (tiers.charges[index], True)
+    # Fallback to default charge
+    return (tiers.default_charge, True)
+
+
+def get_service(service_id, active_only=True) -> Optional[ServiceTiers]:
+    try:
+        tiers = get_table().services.get(int(service_id))
+    except (TypeError, ValueError):
+        return None
+    if tiers is None or (active_only and not tiers.is_active):
+        return None
+    return tiers
+
+
+def service_charge(service_id, distance_km):
+    """(charge, is_confirmed) for a ServiceType id, or None if there is no such service."""
+    tiers = get_service(service_id, active_only=False)
+    if tiers is None:
+        return None
+    return charge_for_tiers(tiers, distance_km)
+
+
+def get_zone_for_distance(distance_km):
+    """Active DistanceZone with min <= distance < max (lowest min wins), or None."""
+    table = get_table()
+    distance_km = float(distance_km)
+    if table.zones_disjoint:
+        index = bisect_right(table.zone_mins, distance_km) - 1
+        if index >= 0 and distance_km < float(table.zones[index].max_distance_km):
+            return table.zones[index]
+        return None
+    for zone in table.zones:
+        if float(zone.min_distance_km) <= distance_km < float(zone.max_distance_km):
+            return zone
+    return None
+
+
+def get_area_price(service_type, zone):
+    """Active ServicePrice for a service/zone as a get_price() dict, or None."""
+    return get_table().area_prices.get((service_type, zone))
@@ -0,0 +1,176 @@
+"""
+In-process priority queue for time-critical emails (login OTPs, one-tap links).
+
+Views hand a ready-built message to ``enqueue`` and return immediately. A small
+pool of daemon threads per worker process drains the queue, each holding one
+persistent SMTP connection that is reused across messages and closed after a
+period of inactivity, so the TLS/AUTH handshake is paid once rather than per
+login.
+
+Every message gets an EmailLog row (status SENDING while it is in memory) that
+records the outcome. If the queue is full, or delivery fails twice in a row,
+the row is handed over to the database outbox (PENDING/RETRY) and
+``run_email_worker`` delivers it instead.
+
+Settings:
+    PRIORITY_EMAIL_BACKEND      backend for the pool (default: EMAIL_BACKEND);
+                                use firstApp.mail_backends.StandInEmailBackend
+                                for tests and load runs
+    PRIORITY_EMAIL_WORKERS      sender threads per process (default 2)
+    PRIORITY_EMAIL_QUEUE_SIZE   maximum queued messages per process (default 200)
+    PRIORITY_EMAIL_IDLE_SECONDS close an idle SMTP connection after this long (default 60)
+"""
+import itertools
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_EMAIL_BACKEND = getattr(settings, 'PRIORITY_EMAIL_BACKEND', None)
+PRIORITY_EMAIL_WORKERS = getattr(settings, 'PRIORITY_EMAIL_WORKERS', 2)
+PRIORITY_EMAIL_QUEUE_SIZE = getattr(settings, 'PRIORITY_EMAIL_QUEUE_SIZE', 200)
+PRIORITY_EMAIL_IDLE_SECONDS = getattr(settings, 'PRIORITY_EMAIL_IDLE_SECONDS', 60)
+
+_queue = queue.PriorityQueue(maxsize=PRIORITY_EMAIL_QUEUE_SIZE)
+_sequence = itertools.count()  # FIFO order within the same priority
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def enqueue(message, email_type, priority=0):
+    """
+    Log and queue an EmailMultiAlternatives for immediate background delivery.
+
+    Returns True once the message is accepted (in memory or in the outbox).
+    """
+    from .models import EmailLog
+
+    html_body = message.alternatives[0][0] if message.alternatives else None
+    email_log = EmailLog.objects.create(
+        email_type=email_type,
+        recipient=message.to[0],
+        subject=message.subject,
+        status='SENDING',
+        html_body=html_body,
+        text_body=message.body,
+        priority=priority,
+    )
+
+    try:
+        _queue.put_nowait((priority, next(_sequence), email_log.pk, message))
+    except queue.Full:
+        # Overloaded: let run_email_worker deliver it from the database
+        EmailLog.objects.filter(pk=email_log.pk).update(status='PENDING')
+        logger.warning(f"Priority email queue full, email {email_log.pk} moved to outbox")
+        return True
+
+    _ensure_workers()
+    return True
+
+
+def pending():
+    """Number of messages queued or being sent in this process."""
+    return _queue.unfinished_tasks
+
+
+def wait_until_idle(timeout=None):
+    """Block until this process's queue is drained (for load runs and shutdown)."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while _queue.unfinished_tasks:
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def _ensure_workers():
+    if len(_workers) >= PRIORITY_EMAIL_WORKERS:
+        return
+    with _workers_lock:
+        while len(_workers) < PRIORITY_EMAIL_WORKERS:
+            worker = threading.Thread(target=_run_worker, name=f'priority-mail-{len(_workers)}', daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+
+class _PooledConnection:
+    """One persistent mail connection owned by a single sender thread."""
+
+    def __init__(self):
+        self.connection = None
+
+    def send(self, message):
+        if self.connection is None:
+            self.connection = get_connection(PRIORITY_EMAIL_BACKEND, fail_silently=False)
+            self.connection.open()
+        message.connection = self.connection
+        self.connection.send_messages([message])
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+
+def _run_worker():
+    pooled = _PooledConnection()
+    while True:
+        try:
+            _, _, log_id, message = _queue.get(timeout=PRIORITY_EMAIL_IDLE_SECONDS)
+        except queue.Empty:
+            pooled.close()
+            continue
+
+        try:
+            _deliver(pooled, log_id, message)
+        except Exception as e:
+            logger.error(f"Priority email {log_id} could not be recorded: {e}")
+        finally:
+            _queue.task_done()
+            close_old_connections()
+
+
+def _deliver(pooled, log_id, message):
+    from .models import EmailLog
+
+    try:
+        pooled.send(message)
+    except Exception:
+        # The server may have dropped an idle connection: reconnect once
+        pooled.close()
+        try:
+            pooled.send(message)
+        except Exception as e:
+            pooled.close()
+            _hand_over(log_id, e)
+            return
+
+    EmailLog.objects.filter(pk=log_id).update(
+        status='SENT', sent_at=timezone.now(), updated_at=timezone.now()
+    )
+
+
+def _hand_over(log_id, error):
+    """Record the failure and leave the email for run_email_worker's backoff schedule."""
+    from .email_utils import email_retry_delay
+    from .models import EmailLog
+
+    now = timezone.now()
+    EmailLog.objects.filter(pk=log_id).update(
+        status='RETRY',
+        retry_count=1,
+        error_message=str(error),
+        next_attempt_at=now + email_retry_delay(1),
+        updated_at=now,
+    )
+    logger.warning(f"Priority email {log_id} failed ({error}), moved to outbox for retry")
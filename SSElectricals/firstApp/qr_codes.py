@@ -0,0 +1,106 @@
+"""
+Receipt QR codes rendered on demand as inline SVG.
+
+Order.receipt_qr_data / OfflineReceipt.qr_code_data are encoded when a
+receipt page asks for them (Order.receipt_qr_svg, OfflineReceipt.qr_code_svg)
+instead of being written to media/ as PNGs on every confirmation. The SVG is
+a single <path> with one subpath per horizontal run of dark modules, a couple
+of KB per receipt.
+
+Rendered markup is memoized per worker in a bounded LRU and shared between
+workers through the cache, both keyed by a hash of the encoded text, so a
+receipt is rendered once however often it is printed. The run-length data
+the SVG is built from (runs()) is memoized separately, since receipt_pdf.py
+draws it directly.
+"""
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+
+CACHE_KEY = 'qr:svg:{digest}'
+CACHE_TTL = 60 * 60 * 24 * 30
+LRU_SIZE = 256
+BORDER = 2  # quiet zone, in modules
+
+_svgs = OrderedDict()  # digest -> markup, most recently used last
+_lock = threading.Lock()
+
+
+def _digest(data):
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+@functools.lru_cache(maxsize=LRU_SIZE)
+def runs(data):
+    """(size, ((x, y, length), ...)) horizontal runs of dark modules, border included.
+
+    Encoding (mostly the mask pattern search) is the slow part, so the result is
+    memoized; receipt_pdf draws from it directly.
+    """
+    import qrcode
+
+    qr = qrcode.QRCode(border=BORDER, error_correction=qrcode.constants.ERROR_CORRECT_M)
+    qr.add_data(data)
+    qr.make(fit=True)
+    matrix = qr.get_matrix()
+    size = len(matrix)
+
+    found = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < size:
+            if row[x]:
+                start = x
+                while x < size and row[x]:
+                    x += 1
+                found.append((start, y, x - start))
+            else:
+                x += 1
+    return size, tuple(found)
+
+
+def _render(data):
+    size, dark = runs(data)
+    path = ''.join(f"M{x} {y}h{length}v1h-{length}z" for x, y, length in dark)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'shape-rendering="crispEdges" role="img" aria-label="Receipt QR">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path d="{path}" fill="#000"/></svg>'
+    )
+
+
+def _remember(digest, markup):
+    with _lock:
+        _svgs[digest] = markup
+        _svgs.move_to_end(digest)
+        while len(_svgs) > LRU_SIZE:
+            _svgs.popitem(last=False)
+
+
+def svg(data):
+    """Inline SVG markup (safe for templates) encoding data; '' for empty data."""
+    if not data:
+        return ''
+    digest = _digest(data)
+    with _lock:
+        markup = _svgs.get(digest)
+        if markup is not None:
+            _svgs.move_to_end(digest)
+            return mark_safe(markup)
+
+    key = CACHE_KEY.format(digest=digest)
+    markup = cache.get(key)
+    if markup is None:
+        try:
+            markup = _render(data)
+        except ImportError:
+            return ''  # qrcode library not installed
+        cache.set(key, markup, CACHE_TTL)
+    _remember(digest, markup)
+    return mark_safe(markup)
@@ -0,0 +1,470 @@
+"""
+PDF receipts for OfflineReceipt and Order, drawn directly with the
+reportlab canvas.
+
+Fonts (DejaVu Sans when available, for the rupee sign; Helvetica otherwise),
+column positions and colours are set up once per worker in a _Layout, so a
+receipt costs one canvas pass of a few milliseconds. QR codes are drawn as
+vector rectangles from qr_codes.runs(), no images involved.
+
+Batch mode renders every receipt of a financial year or date range:
+
+- as one multi-page PDF, written to a temporary file and streamed back with
+  FileResponse;
+- as a zip of one PDF per receipt, streamed entry by entry while the
+  receipts are read from the database in chunks.
+"""
+import io
+import os
+import tempfile
+import threading
+import zipfile
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from . import qr_codes
+
+
+BATCH_CHUNK_SIZE = 200
+
+# (regular, bold) TTF pairs tried in order; settings.RECEIPT_PDF_FONTS is tried first
+FONT_CANDIDATES = (
+    ('/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'),
+    ('/usr/share/fonts/dejavu/DejaVuSans.ttf', '/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf'),
+    ('/Library/Fonts/DejaVuSans.ttf', '/Library/Fonts/DejaVuSans-Bold.ttf'),
+)
+
+SHOP_NAME = 'Shiv Shakti Electrical'
+SHOP_ADDRESS = 'B-115, Abhinandan Nagar, Indore (M.P.)'
+SHOP_PHONE = '+91-9993149226'
+
+
+class ReceiptLine(NamedTuple):
+    name: str
+    quantity: str
+    mrp: str
+    price: str
+    total: str
+
+
+class ReceiptData(NamedTuple):
+    """Everything drawn on one receipt, independent of the source model."""
+    filename: str
+    title: str
+    number: str
+    date: str
+    shop: list  # header lines under the shop name
+    customer: list
+    lines: list  # ReceiptLine
+    totals: list  # (label, amount) pairs; the last one is the grand total
+    qr_data: str
+    notes: str
+    void: bool
+
+
+# ---- source models -> ReceiptData ----
+
+def _safe_filename(number, fallback):
+    return (number or fallback).replace('/', '_') + '.pdf'
+
+
+def from_offline(receipt, currency):
+    items = receipt.items.all()  # prefetched in batch mode
+    lines = [
+        ReceiptLine(
+            item.item_name,
+            f"{item.quantity.normalize():f}",
+            currency(item.mrp) if item.mrp else '-',
+            currency(item.unit_price),
+            currency(item.line_total),
+        )
+        for item in items
+    ]
+    totals = [('Subtotal', currency(receipt.subtotal))]
+    if receipt.discount_amount:
+        totals.append(('Discount', '-' + currency(receipt.discount_amount)))
+    if receipt.tax_amount:
+        totals.append(('Tax', currency(receipt.tax_amount)))
+    totals.append(('Grand Total', currency(receipt.grand_total)))
+
+    shop = [line for line in (receipt.shop_address, receipt.shop_phone) if line]
+    if receipt.shop_gst:
+        shop.append(f"GST: {receipt.shop_gst}")
+    customer = [line for line in (receipt.buyer_name, receipt.buyer_phone, receipt.buyer_email,
+                                  receipt.buyer_address) if line]
+    return ReceiptData(
+        filename=_safe_filename(receipt.receipt_number, f'receipt_{receipt.pk}'),
+        title=receipt.shop_name or SHOP_NAME,
+        number=receipt.receipt_number,
+        date=timezone.localtime(receipt.created_at).strftime('%d-%b-%Y'),
+        shop=shop,
+        customer=customer,
+        lines=lines,
+        totals=totals,
+        qr_data=receipt.qr_code_data or '',
+        notes='',
+        void=receipt.status == receipt.ReceiptStatus.VOID,
+    )
+
+
+def from_order(order, currency):
+    items = list(order.items.all())  # prefetched with products in batch mode
+    lines = []
+    for item in items:
+        product = item.product
+        lines.append(ReceiptLine(
+            product.name + (f" ({product.brand})" if product.brand else ''),
+            str(item.quantity),
+            currency(product.price),
+            currency(item.price),
+            currency(item.price * item.quantity),
+        ))
+    items_total = sum((item.price * item.quantity for item in items), Decimal('0.00'))
+    totals = [('Items', currency(items_total))]
+    if order.delivery_charge:
+        totals.append(('Delivery', currency(order.delivery_charge)))
+    grand_total = order.grand_total
+    totals.append(('Grand Total', currency(grand_total) if grand_total is not None else 'Pending'))
+
+    user = order.user
+    customer = [line for line in (user.get_full_name() or user.username, getattr(user, 'phone_number', ''),
+                                  user.email, order.address) if line]
+    return ReceiptData(
+        filename=_safe_filename(order.receipt_number, f'order_{order.pk}'),
+        title=SHOP_NAME,
+        number=order.receipt_number or f'Order #{order.pk}',
+        date=timezone.localtime(order.created_at).strftime('%d-%b-%Y'),
+        shop=[SHOP_ADDRESS, SHOP_PHONE],
+        customer=customer,
+        lines=lines,
+        totals=totals,
+        qr_data=order.receipt_qr_data or '',
+        notes=order.user_notes or '',
+        void=order.status == 'Cancelled',
+    )
+
+
+# ---- layout (built once per worker) ----
+
+class _Layout:
+    def __init__(self):
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.units import mm
+
+        self.regular, self.bold, unicode_font = self._register_fonts()
+        self.rupee = '₹' if unicode_font else 'Rs. '
+        self.page_width, self.page_height = A4
+        self.margin = 15 * mm
+        self.bottom = 20 * mm
+        self.row_height = 6 * mm
+        self.qr_size = 24 * mm
+        width = self.page_width - 2 * self.margin
+        # S.No., Item, Qty, MRP, Price, Total: right edges of the numeric columns
+        self.columns = {
+            'index': self.margin + 2 * mm,
+            'name': self.margin + 12 * mm,
+            'quantity': self.margin + width * 0.60,
+            'mrp': self.margin + width * 0.74,
+            'price': self.margin + width * 0.87,
+            'total': self.margin + width - 2 * mm,
+        }
+        self.name_width = width * 0.60 - 22 * mm
+        self.header_fill = colors.HexColor('#232f3e')
+        self.stripe_fill = colors.HexColor('#f5f5f5')
+        self.void_colour = colors.Color(0.86, 0.21, 0.27, alpha=0.25)
+        self.white, self.black, self.grey = colors.white, colors.black, colors.HexColor('#666666')
+
+    @staticmethod
+    def _register_fonts():
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        candidates = list(FONT_CANDIDATES)
+        configured = getattr(settings, 'RECEIPT_PDF_FONTS', None)
+        if configured:
+            candidates.insert(0, tuple(configured))
+        for regular, bold in candidates:
+            if os.path.exists(regular) and os.path.exists(bold):
+                try:
+                    pdfmetrics.registerFont(TTFont('ReceiptSans', regular))
+                    pdfmetrics.registerFont(TTFont('ReceiptSans-Bold', bold))
+                    return 'ReceiptSans', 'ReceiptSans-Bold', True
+                except Exception:
+                    continue
+        return 'Helvetica', 'Helvetica-Bold', False
+
+    def currency(self, value):
+        return f"{self.rupee}{Decimal(value or 0):,.2f}"
+
+    def fit(self, text, font, size, width):
+        from reportlab.pdfbase.pdfmetrics import stringWidth
+
+        if stringWidth(text, font, size) <= width:
+            return text
+        while text and stringWidth(text + '…', font, size) > width:
+            text = text[:-1]
+        return text + '…'
+
+
+_layout = None
+_layout_lock = threading.Lock()
+
+
+def get_layout():
+    global _layout
+    if _layout is None:
+        with _layout_lock:
+            if _layout is None:
+                _layout = _Layout()
+    return _layout
+
+
+# ---- drawing ----
+
+def _draw_qr(canvas, layout, data, x, y):
+    size, dark = qr_codes.runs(data)
+    module = layout.qr_size / size
+    path = canvas.beginPath()  # one fill for every run rather than one per rect
+    for column, row, length in dark:
+        path.rect(x + column * module, y + layout.qr_size - (row + 1) * module, length * module, module)
+    canvas.setFillColor(layout.black)
+    canvas.drawPath(path, stroke=0, fill=1)
+
+
+def _draw_header(canvas, layout, receipt, continued=False):
+    top = layout.page_height - layout.margin
+    canvas.setFillColor(layout.black)
+    canvas.setFont(layout.bold, 16)
+    canvas.drawString(layout.margin, top - 14, receipt.title)
+    canvas.setFont(layout.regular, 9)
+    y = top - 28
+    for line in receipt.shop:
+        canvas.drawString(layout.margin, y, line)
+        y -= 11
+    if receipt.qr_data and not continued:
+        _draw_qr(canvas, layout, receipt.qr_data, layout.page_width - layout.margin - layout.qr_size,
+                 top - layout.qr_size)
+
+    y = min(y, top - layout.qr_size) - 14
+    canvas.setFont(layout.bold, 11)
+    label = 'Receipt ' + receipt.number + (' (continued)' if continued else '')
+    canvas.drawString(layout.margin, y, label)
+    canvas.setFont(layout.regular, 9)
+    canvas.drawRightString(layout.page_width - layout.margin, y, f"Date: {receipt.date}")
+    y -= 16
+    if not continued:
+        canvas.setFont(layout.bold, 9)
+        canvas.drawString(layout.margin, y, 'Bill To:')
+        canvas.setFont(layout.regular, 9)
+        for line in receipt.customer:
+            y -= 11
+            canvas.drawString(layout.margin, y, layout.fit(line, layout.regular, 9, layout.page_width / 2))
+        y -= 16
+    return y
+
+
+def _draw_table_header(canvas, layout, y):
+    columns = layout.columns
+    canvas.setFillColor(layout.header_fill)
+    canvas.rect(layout.margin, y - layout.row_height + 4, layout.page_width - 2 * layout.margin,
+                layout.row_height, stroke=0, fill=1)
+    canvas.setFillColor(layout.white)
+    canvas.setFont(layout.bold, 8)
+    canvas.drawString(columns['index'], y - 8, '#')
+    canvas.drawString(columns['name'], y - 8, 'Item')
+    for key, title in (('quantity', 'Qty'), ('mrp', 'MRP'), ('price', 'Price'), ('total', 'Total')):
+        canvas.drawRightString(columns[key], y - 8, title)
+    canvas.setFillColor(layout.black)
+    return y - layout.row_height
+
+
+def _draw_void(canvas, layout):
+    canvas.saveState()
+    canvas.setFillColor(layout.void_colour)
+    canvas.setFont(layout.bold, 110)
+    canvas.translate(layout.page_width / 2, layout.page_height / 2)
+    canvas.rotate(35)
+    canvas.drawCentredString(0, 0, 'VOID')
+    canvas.restoreState()
+
+
+def draw_receipt(canvas, receipt, layout=None):
+    """Draw receipt on canvas, starting a new page for it and for any overflow."""
+    layout = layout or get_layout()
+    columns = layout.columns
+    y = _draw_table_header(canvas, layout, _draw_header(canvas, layout, receipt))
+    canvas.setFont(layout.regular, 8)
+    for index, line in enumerate(receipt.lines, 1):
+        if y < layout.bottom + layout.row_height:
+            if receipt.void:
+                _draw_void(canvas, layout)
+            canvas.showPage()
+            y = _draw_table_header(canvas, layout, _draw_header(canvas, layout, receipt, continued=True))
+            canvas.setFont(layout.regular, 8)
+        if index % 2 == 0:
+            canvas.setFillColor(layout.stripe_fill)
+            canvas.rect(layout.margin, y - layout.row_height + 4, layout.page_width - 2 * layout.margin,
+                        layout.row_height, stroke=0, fill=1)
+            canvas.setFillColor(layout.black)
+        baseline = y - 8
+        canvas.drawString(columns['index'], baseline, str(index))
+        canvas.drawString(columns['name'], baseline, layout.fit(line.name, layout.regular, 8, layout.name_width))
+        canvas.drawRightString(columns['quantity'], baseline, line.quantity)
+        canvas.drawRightString(columns['mrp'], baseline, line.mrp)
+        canvas.drawRightString(columns['price'], baseline, line.price)
+        canvas.drawRightString(columns['total'], baseline, line.total)
+        y -= layout.row_height
+
+    # Totals, notes and footer need roughly this much room
+    needed = layout.row_height * (len(receipt.totals) + 4)
+    if y - needed < layout.bottom:
+        if receipt.void:
+            _draw_void(canvas, layout)
+        canvas.showPage()
+        y = _draw_header(canvas, layout, receipt, continued=True)
+
+    y -= 6
+    for position, (label, amount) in enumerate(receipt.totals):
+        grand = position == len(receipt.totals) - 1
+        canvas.setFont(layout.bold if grand else layout.regular, 10 if grand else 9)
+        canvas.drawRightString(columns['price'], y - 8, label)
+        canvas.drawRightString(columns['total'], y - 8, amount)
+        y -= layout.row_height
+
+    canvas.setFont(layout.regular, 8)
+    canvas.setFillColor(layout.grey)
+    if receipt.notes:
+        y -= 4
+        canvas.drawString(layout.margin, y - 8, layout.fit(f"Notes: {receipt.notes}", layout.regular, 8,
+                                                          layout.page_width - 2 * layout.margin))
+    canvas.drawCentredString(layout.page_width / 2, layout.bottom - 8, 'Thank You for Shopping!')
+    canvas.setFillColor(layout.black)
+    if receipt.void:
+        _draw_void(canvas, layout)
+    canvas.showPage()
+
+
+def _new_canvas(target, title):
+    from reportlab.pdfgen.canvas import Canvas
+
+    layout = get_layout()
+    canvas = Canvas(target, pagesize=(layout.page_width, layout.page_height), pageCompression=1)
+    canvas.setTitle(title)
+    canvas.setAuthor(SHOP_NAME)
+    return canvas
+
+
+def render(receipt):
+    """PDF bytes of a single ReceiptData."""
+    buffer = io.BytesIO()
+    canvas = _new_canvas(buffer, receipt.number)
+    draw_receipt(canvas, receipt)
+    canvas.save()
+    return buffer.getvalue()
+
+
+def render_offline(receipt):
+    return render(from_offline(receipt, get_layout().currency))
+
+
+def render_order(order):
+    return render(from_order(order, get_layout().currency))
+
+
+def pdf_response(receipt_data, inline=True):
+    response = HttpResponse(render(receipt_data), content_type='application/pdf')
+    disposition = 'inline' if inline else 'attachment'
+    response['Content-Disposition'] = f'{disposition}; filename="{receipt_data.filename}"'
+    return response
+
+
+# ---- batch ----
+
+def batch_queryset(kind, financial_year=None, date_from=None, date_to=None):
+    """Receipts to include in a batch, oldest first, with their lines prefetched."""
+    from .models import OfflineReceipt, Order
+
+    if kind == 'orders':
+        queryset = (Order.objects.exclude(receipt_number__isnull=True)
+                    .select_related('user').prefetch_related('items__product')
+                    .order_by('financial_year', 'receipt_sequence'))
+    else:
+        queryset = (OfflineReceipt.objects.prefetch_related('items')
+                    .order_by('financial_year', 'sequence_number'))
+    if financial_year:
+        queryset = queryset.filter(financial_year=financial_year)
+    if date_from:
+        queryset = queryset.filter(created_at__date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(created_at__date__lte=date_to)
+    return queryset
+
+
+def _iter_receipts(kind, queryset):
+    convert = from_order if kind == 'orders' else from_offline
+    currency = get_layout().currency
+    # iterator(chunk_size) keeps prefetch_related working one chunk at a time
+    for obj in queryset.iterator(chunk_size=BATCH_CHUNK_SIZE):
+        yield convert(obj, currency)
+
+
+def batch_pdf_response(kind, queryset, filename):
+    """One multi-page PDF of every receipt in queryset, spooled to disk and streamed."""
+    spool = tempfile.TemporaryFile(suffix='.pdf')
+    canvas = _new_canvas(spool, filename)
+    count = 0
+    for receipt in _iter_receipts(kind, queryset):
+        draw_receipt(canvas, receipt)
+        count += 1
+    if not count:
+        canvas.setFont(get_layout().regular, 12)
+        canvas.drawString(72, get_layout().page_height - 72, 'No receipts match the selected filters.')
+        canvas.showPage()
+    canvas.save()
+    spool.seek(0)
+    return FileResponse(spool, as_attachment=True, filename=f'{filename}.pdf', content_type='application/pdf')
+
+
+class _ZipStream(io.RawIOBase):
+    """Unseekable sink for ZipFile; the caller drains what was written after each entry."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def batch_zip_response(kind, queryset, filename):
+    """Zip of one PDF per receipt, streamed as each entry is written."""
+    def entries():
+        sink = _ZipStream()
+        seen = set()
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for receipt in _iter_receipts(kind, queryset):
+                name = receipt.filename
+                if name in seen:  # e.g. two orders without a receipt number yet
+                    name = f"{len(seen)}_{name}"
+                seen.add(name)
+                # PDFs are already compressed; storing them keeps this fast
+                archive.writestr(name, render(receipt))
+                yield sink.drain()
+        yield sink.drain()
+
+    response = StreamingHttpResponse(entries(), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.zip"'
+    return response
@@ -0,0 +1,269 @@
+"""
+Daily sales / expenses exports.
+
+- CSV and TSV are streamed: rows come from values_list(...).iterator() in
+  EXPORT_CHUNK_SIZE chunks and are written straight into a
+  StreamingHttpResponse, so memory stays flat however many years of data
+  there are.
+- PDF and Word documents are built by a background thread into
+  MEDIA_ROOT/exports/<token>/. The requesting admin gets a notification with
+  a download link (admin_export_download), which serves the file to staff
+  only - exports are never exposed under MEDIA_URL.
+
+Job state is a small job.json written next to the output, so a download link
+works from any worker and survives cache eviction. A job still "running" after
+EXPORT_JOB_TIMEOUT is reported as failed (its thread died with its worker).
+Folders older than EXPORT_RETENTION are removed whenever a new job starts.
+"""
+import csv
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_DIR = 'exports'
+EXPORT_RETENTION = 60 * 60 * 24
+EXPORT_JOB_TIMEOUT = 30 * 60
+JOB_FILE = 'job.json'
+_TOKEN_RE = re.compile(r'^[0-9a-f]{32}$')
+
+DOCUMENT_FORMATS = {
+    'pdf': ('pdf', 'application/pdf'),
+    'word': ('docx', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'),
+}
+
+
+def _money(value):
+    return str(value) if value is not None else '0.00'
+
+
+EXPORTS = {
+    'sales': {
+        'title': 'Daily Sales Report',
+        'filename': 'daily_sales',
+        'columns': ['Date', 'Day', 'Total Sales', 'Online', 'Cash', 'Labor Charge', 'Delivery Charge',
+                    'Subtotal', 'Remark', 'Admin'],
+        'fields': ('date', 'day', 'total_sales', 'online_received', 'cash_received', 'labor_charge',
+                   'delivery_charge', 'subtotal', 'remark', 'admin__username'),
+        'landscape': True,
+        'font_size': 6,
+    },
+    'expenses': {
+        'title': 'Daily Expenses Report',
+        'filename': 'daily_expenses',
+        'columns': ['Date', 'Day', 'Online Amount', 'Cash Amount', 'Total', 'Description', 'Admin'],
+        'fields': ('date', 'day', 'online_amount', 'cash_amount', 'total', 'description', 'admin__username'),
+        'landscape': False,
+        'font_size': 8,
+    },
+}
+
+
+def _queryset(kind):
+    from .models import DailyExpenditure, DailySales
+
+    model = DailySales if kind == 'sales' else DailyExpenditure
+    # admin__username pulls the admin through a single LEFT JOIN; no model instances are built
+    return model.objects.order_by('-date').values_list(*EXPORTS[kind]['fields'])
+
+
+_TEXT_FIELDS = ('day', 'remark', 'description')
+
+
+def iter_rows(kind):
+    """Formatted export rows, newest date first, fetched EXPORT_CHUNK_SIZE at a time."""
+    fields = EXPORTS[kind]['fields'][:-1]  # the last one is admin__username
+    for *values, username in _queryset(kind).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        row = []
+        for field, value in zip(fields, values):
+            if field == 'date':
+                row.append(str(value))
+            elif field in _TEXT_FIELDS:
+                row.append(value)
+            else:
+                row.append(_money(value))
+        row.append(username or 'Unknown')
+        yield row
+
+
+# ---- streamed CSV / TSV ----
+
+class _Echo:
+    """File-like object whose write() hands the line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def stream_delimited(kind, delimiter=','):
+    """StreamingHttpResponse with the export as CSV (or TSV with delimiter='\\t')."""
+    spec = EXPORTS[kind]
+    writer = csv.writer(_Echo(), delimiter=delimiter)
+    extension, content_type = ('tsv', 'text/tab-separated-values') if delimiter == '\t' else ('csv', 'text/csv')
+
+    def lines():
+        yield writer.writerow(spec['columns'])
+        for row in iter_rows(kind):
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(lines(), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{spec["filename"]}.{extension}"'
+    return response
+
+
+# ---- PDF / Word documents ----
+
+def build_pdf(kind, path):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import landscape, letter
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import LongTable, Paragraph, SimpleDocTemplate, TableStyle
+
+    spec = EXPORTS[kind]
+    pagesize = landscape(letter) if spec['landscape'] else letter
+    doc = SimpleDocTemplate(path, pagesize=pagesize)
+    styles = getSampleStyleSheet()
+
+    # LongTable + repeatRows: splits across pages cheaply and repeats the header
+    table = LongTable([spec['columns']] + list(iter_rows(kind)), repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTSIZE', (0, 0), (-1, -1), spec['font_size']),
+    ]))
+    doc.build([Paragraph(spec['title'], styles['Title']), table])
+
+
+def build_word(kind, path):
+    from docx import Document
+
+    spec = EXPORTS[kind]
+    doc = Document()
+    doc.add_heading(spec['title'], 0)
+
+    table = doc.add_table(rows=1, cols=len(spec['columns']))
+    for cell, column in zip(table.rows[0].cells, spec['columns']):
+        cell.text = column
+    for row in iter_rows(kind):
+        for cell, value in zip(table.add_row().cells, row):
+            cell.text = str(value)
+    doc.save(path)
+
+
+_BUILDERS = {'pdf': build_pdf, 'word': build_word}
+
+
+def _export_root():
+    return os.path.join(settings.MEDIA_ROOT, EXPORT_DIR)
+
+
+def _job_dir(token):
+    return os.path.join(_export_root(), token)
+
+
+def get_job(token):
+    """{'status': 'running'|'done'|'failed', 'kind', 'format', 'path', 'filename', ...} or None."""
+    if not _TOKEN_RE.match(token or ''):
+        return None
+    try:
+        with open(os.path.join(_job_dir(token), JOB_FILE)) as f:
+            job = json.load(f)
+    except (OSError, ValueError):
+        return None
+    job['path'] = os.path.join(_job_dir(token), job['filename'])
+    if job['status'] == 'running' and time.time() - job['updated_at'] > EXPORT_JOB_TIMEOUT:
+        job['status'] = 'failed'  # the worker running it went away
+    return job
+
+
+def _set_job(token, **job):
+    """Write job.json atomically (a reader never sees half a file)."""
+    folder = _job_dir(token)
+    os.makedirs(folder, exist_ok=True)
+    state = {key: value for key, value in job.items() if key != 'path'}
+    state['updated_at'] = time.time()
+    tmp_path = os.path.join(folder, f'.{JOB_FILE}.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, os.path.join(folder, JOB_FILE))
+
+
+def purge_old_exports():
+    """Remove export folders older than EXPORT_RETENTION."""
+    root = _export_root()
+    if not os.path.isdir(root):
+        return
+    cutoff = time.time() - EXPORT_RETENTION
+    for name in os.listdir(root):
+        folder = os.path.join(root, name)
+        if os.path.isdir(folder) and os.path.getmtime(folder) < cutoff:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+def start_document_export(kind, fmt, user, site_url=''):
+    """Queue a PDF/Word export for user; returns the job token. site_url makes the link absolute."""
+    extension, _ = DOCUMENT_FORMATS[fmt]
+    token = uuid.uuid4().hex
+    filename = f"{EXPORTS[kind]['filename']}_{time.strftime('%Y%m%d')}.{extension}"
+    job = {'status': 'running', 'kind': kind, 'format': fmt, 'filename': filename,
+           'path': os.path.join(_job_dir(token), filename), 'user_id': user.pk,
+           'site_url': site_url.rstrip('/')}
+    _set_job(token, **job)
+    threading.Thread(target=_run_job, args=(token, job), daemon=True).start()
+    return token
+
+
+def _run_job(token, job):
+    from django.db import close_old_connections
+    try:
+        purge_old_exports()
+        _BUILDERS[job['format']](job['kind'], job['path'])
+    except Exception as e:
+        logger.error(f"{job['kind']} {job['format']} export failed: {e}")
+        _set_job(token, **dict(job, status='failed', error=str(e)))
+        _notify(token, job, failed=True)
+    else:
+        _set_job(token, **dict(job, status='done'))
+        _notify(token, job)
+    finally:
+        close_old_connections()
+
+
+def _notify(token, job, failed=False):
+    """Drop a personal notification for the admin who asked for the export."""
+    from .models import CustomUser, Notification, UserNotification
+
+    user = CustomUser.objects.filter(pk=job['user_id']).first()
+    if user is None:
+        return
+    title = EXPORTS[job['kind']]['title']
+    if failed:
+        message = f"The {job['format'].upper()} export of the {title.lower()} failed. Please try again."
+    else:
+        url = job['site_url'] + reverse('admin_export_download', args=[token])
+        message = f"Your {title.lower()} ({job['format'].upper()}) is ready: {url}"
+    notification = Notification.objects.create(
+        title=f"{title} export {'failed' if failed else 'ready'}",
+        message=message,
+        target_type='INDIVIDUAL',
+        created_by=user,
+    )
+    notification.target_users.add(user)
+    UserNotification.objects.create(user=user, notification=notification)
@@ -0,0 +1,344 @@
+"""
+Offline road-distance engine for the Indore service area.
+
+Road distance from the shop is modelled as ``geodesic distance x road factor``.
+The road factor varies across the city (river crossings, ring roads, one-way
+stretches), so it is stored on a grid of ~200 m cells covering the service
+bounding box (22.5-23.0 N, 75.5-76.2 E) and bilinearly interpolated at lookup
+time. A lookup is a few array reads and one haversine - no network call.
+
+The grid is built from known road distances: every DistanceCache row (Google
+Distance Matrix results collected by calculate_distance_and_price) is a
+sample, and ``python manage.py build_road_distance_grid --sample`` can fetch
+more on a coarse lattice. Samples are blended by inverse-distance weighting;
+cells far from any sample fall back to the median factor.
+
+Each worker loads the grid file once (and re-checks its mtime every
+GRID_RELOAD_SECONDS). Web workers never rebuild it: the management command
+fetches new samples and writes a fresh file, and a file older than
+GRID_MAX_AGE is only logged.
+
+Once a grid exists, calculate_distance_and_price answers from it instead of
+calling Distance Matrix, so customer lookups stop adding samples. From then on
+``build_road_distance_grid --sample`` is the only source of new ones and must
+be scheduled (e.g. weekly cron). A grid is never written from zero samples -
+it would be a flat DEFAULT_ROAD_FACTOR that replaces the API everywhere.
+"""
+import logging
+import math
+import os
+import time
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .utils import SHOP_LAT, SHOP_LNG
+
+logger = logging.getLogger(__name__)
+
+LAT_MIN, LAT_MAX = 22.5, 23.0
+LNG_MIN, LNG_MAX = 75.5, 76.2
+CELL_KM = 0.2
+
+KM_PER_DEG_LAT = 111.32
+KM_PER_DEG_LNG = 111.32 * math.cos(math.radians((LAT_MIN + LAT_MAX) / 2))
+LAT_STEP = CELL_KM / KM_PER_DEG_LAT
+LNG_STEP = CELL_KM / KM_PER_DEG_LNG
+ROWS = int(math.ceil((LAT_MAX - LAT_MIN) / LAT_STEP)) + 1
+COLS = int(math.ceil((LNG_MAX - LNG_MIN) / LNG_STEP)) + 1
+
+DEFAULT_ROAD_FACTOR = 1.3  # typical urban detour ratio, used before any samples exist
+MIN_FACTOR, MAX_FACTOR = 1.0, 3.0
+INFLUENCE_KM = 2.0  # samples further away than this barely affect a cell
+MIN_SAMPLES = 5
+
+GRID_PATH = getattr(
+    settings, 'ROAD_DISTANCE_GRID_PATH', os.path.join(settings.MEDIA_ROOT, 'data', 'road_distance_grid.npz')
+)
+GRID_MAX_AGE = getattr(settings, 'ROAD_DISTANCE_GRID_MAX_AGE', 7 * 24 * 60 * 60)
+GRID_RELOAD_SECONDS = 60
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in km (works on floats or NumPy arrays)."""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 6371.0088 * 2 * np.arcsin(np.sqrt(a))
+
+
+def _haversine_scalar(lat, lng):
+    # math-module version for single lookups (NumPy call overhead dominates for scalars)
+    lat1, lng1, lat2, lng2 = map(math.radians, (SHOP_LAT, SHOP_LNG, lat, lng))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 6371.0088 * 2 * math.asin(math.sqrt(a))
+
+
+def in_service_area(lat, lng):
+    return LAT_MIN <= lat <= LAT_MAX and LNG_MIN <= lng <= LNG_MAX
+
+
+# ---- building ----
+
+def collect_samples():
+    """(lats, lngs, factors) arrays from cached Google road distances."""
+    from .models import DistanceCache
+
+    lats, lngs, factors = [], [], []
+    for cell_key, distance_km in DistanceCache.objects.filter(source='google').values_list('cell_key', 'distance_km'):
+        lat, lng = (float(v) for v in cell_key.split(','))
+        if not in_service_area(lat, lng):
+            continue
+        straight = _haversine_scalar(lat, lng)
+        if straight < 0.3:
+            continue  # next door to the shop: the ratio is mostly noise
+        lats.append(lat)
+        lngs.append(lng)
+        factors.append(min(max(distance_km / straight, MIN_FACTOR), MAX_FACTOR))
+    return np.array(lats), np.array(lngs), np.array(factors)
+
+
+def build_grid(lats, lngs, factors, tile_cells=10):
+    """
+    Interpolate sample factors onto the full grid (inverse-distance weighting).
+
+    Only samples within INFLUENCE_KM of a cell count towards it; a prior weight
+    pulls cells with no nearby samples toward the median factor. Samples are
+    binned into INFLUENCE_KM squares and the grid is filled one tile at a time
+    from the 3x3 surrounding bins, so memory stays at tile x local samples.
+    """
+    base = float(np.median(factors)) if len(factors) >= MIN_SAMPLES else DEFAULT_ROAD_FACTOR
+    grid = np.full((ROWS, COLS), base, dtype=np.float32)
+    if len(factors) == 0:
+        return grid, base
+
+    sample_y = ((lats - LAT_MIN) * KM_PER_DEG_LAT).astype(np.float32)
+    sample_x = ((lngs - LNG_MIN) * KM_PER_DEG_LNG).astype(np.float32)
+    factors = np.asarray(factors, dtype=np.float32)
+    prior_weight = np.float32(1.0 / INFLUENCE_KM ** 2)
+    influence2 = np.float32(INFLUENCE_KM ** 2)
+
+    bins = {}
+    for index, key in enumerate(zip(
+        np.floor(sample_y / INFLUENCE_KM).astype(int), np.floor(sample_x / INFLUENCE_KM).astype(int)
+    )):
+        bins.setdefault(key, []).append(index)
+
+    cells_y = np.arange(ROWS, dtype=np.float32) * CELL_KM
+    cells_x = np.arange(COLS, dtype=np.float32) * CELL_KM
+
+    def bin_range(cells):
+        # bins holding the tile's cells, plus one on either side
+        return range(int(cells[0] // INFLUENCE_KM) - 1, int(cells[-1] // INFLUENCE_KM) + 2)
+
+    for row in range(0, ROWS, tile_cells):
+        cell_y = cells_y[row:row + tile_cells]
+        for col in range(0, COLS, tile_cells):
+            cell_x = cells_x[col:col + tile_cells]
+            nearby = [i for by in bin_range(cell_y) for bx in bin_range(cell_x) for i in bins.get((by, bx), ())]
+            if not nearby:
+                continue  # stays at the base factor
+            # (rows, cols, nearby samples) squared distances in km
+            d2 = (cell_y[:, None, None] - sample_y[nearby]) ** 2 + (cell_x[None, :, None] - sample_x[nearby]) ** 2
+            weights = np.where(d2 <= influence2, 1.0 / (d2 + np.float32(0.01)), np.float32(0))
+            weighted = weights @ factors[nearby] + prior_weight * base
+            grid[row:row + len(cell_y), col:col + len(cell_x)] = weighted / (weights.sum(axis=2) + prior_weight)
+    return grid, base
+
+
+def save_grid(grid, base_factor, sample_count, path=GRID_PATH):
+    """Write the grid atomically so workers never read a half-written file."""
+    import tempfile
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # Unique temp file in the target directory, so concurrent builds can't interleave writes
+    fd, tmp_path = tempfile.mkstemp(prefix='.road_distance_grid.', suffix='.npz', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(
+                f,
+                factors=grid,
+                bounds=np.array([LAT_MIN, LAT_MAX, LNG_MIN, LNG_MAX, CELL_KM, SHOP_LAT, SHOP_LNG]),
+                info=np.array([base_factor, sample_count, time.time()]),
+            )
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def rebuild(path=GRID_PATH):
+    """Rebuild the grid from the cached samples and save it. Returns the sample count (0 = nothing saved)."""
+    lats, lngs, factors = collect_samples()
+    if len(factors) == 0:
+        logger.warning("No road distance samples; not writing a grid (run build_road_distance_grid --sample)")
+        return 0
+    grid, base = build_grid(lats, lngs, factors)
+    save_grid(grid, base, len(factors), path)
+    _engine.load(force=True)
+    logger.info(f"Road distance grid rebuilt from {len(factors)} samples (base factor {base:.2f})")
+    return len(factors)
+
+
+# ---- lookups ----
+
+class RoadDistanceEngine:
+    """Holds one worker's copy of the factor grid."""
+
+    def __init__(self):
+        self.factors = None
+        self.built_at = 0
+        self.mtime = None
+        self._checked_at = 0
+
+    def load(self, force=False):
+        """(Re)load the grid file if it changed; cheap enough to call on every lookup."""
+        now = time.monotonic()
+        if not force and now - self._checked_at < GRID_RELOAD_SECONDS:
+            return self.factors is not None
+        self._checked_at = now
+        try:
+            mtime = os.path.getmtime(GRID_PATH)
+        except OSError:
+            return False
+        if force or mtime != self.mtime:
+            try:
+                with np.load(GRID_PATH) as data:
+                    bounds = tuple(data['bounds'])
+                    if bounds != (LAT_MIN, LAT_MAX, LNG_MIN, LNG_MAX, CELL_KM, SHOP_LAT, SHOP_LNG):
+                        logger.warning("Road distance grid was built for different bounds; ignoring it")
+                        return False
+                    self.factors = data['factors']
+                    self.built_at = float(data['info'][2])
+                    self.mtime = mtime
+            except Exception as e:
+                logger.error(f"Could not load road distance grid: {e}")
+                return self.factors is not None
+            if time.time() - self.built_at > GRID_MAX_AGE:
+                logger.warning("Road distance grid is out of date; run build_road_distance_grid --sample")
+        return True
+
+    def factor_at(self, lat, lng):
+        """Bilinearly interpolated road factor at a point inside the bounding box."""
+        y = (lat - LAT_MIN) / LAT_STEP
+        x = (lng - LNG_MIN) / LNG_STEP
+        row = min(int(y), ROWS - 2)
+        col = min(int(x), COLS - 2)
+        dy, dx = y - row, x - col
+        f = self.factors
+        top = f[row, col] * (1 - dx) + f[row, col + 1] * dx
+        bottom = f[row + 1, col] * (1 - dx) + f[row + 1, col + 1] * dx
+        return float(top * (1 - dy) + bottom * dy)
+
+    def estimate(self, lat, lng):
+        if not self.load() or not in_service_area(lat, lng):
+            return None
+        return round(_haversine_scalar(lat, lng) * self.factor_at(lat, lng), 2)
+
+    def estimate_many(self, lats, lngs):
+        """Vectorized estimate for arrays of points; NaN outside the service area."""
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        result = np.full(lats.shape, np.nan)
+        if not self.load():
+            return result
+        inside = (lats >= LAT_MIN) & (lats <= LAT_MAX) & (lngs >= LNG_MIN) & (lngs <= LNG_MAX)
+        y = (lats[inside] - LAT_MIN) / LAT_STEP
+        x = (lngs[inside] - LNG_MIN) / LNG_STEP
+        row = np.minimum(y.astype(int), ROWS - 2)
+        col = np.minimum(x.astype(int), COLS - 2)
+        dy, dx = y - row, x - col
+        f = self.factors
+        factor = (
+            (f[row, col] * (1 - dx) + f[row, col + 1] * dx) * (1 - dy)
+            + (f[row + 1, col] * (1 - dx) + f[row + 1, col + 1] * dx) * dy
+        )
+        result[inside] = np.round(haversine_km(SHOP_LAT, SHOP_LNG, lats[inside], lngs[inside]) * factor, 2)
+        return result
+
+
+_engine = RoadDistanceEngine()
+
+
+def estimate_distance_km(lat, lng):
+    """
+    Estimated road distance (km) from the shop, or None when no grid has been
+    built yet or the point is outside the service area.
+    """
+    return _engine.estimate(lat, lng)
+
+
+def estimate_many(lats, lngs):
+    return _engine.estimate_many(lats, lngs)
+
+
+def grid_age():
+    """Seconds since the loaded grid was built (None if there is no grid)."""
+    if not _engine.load(force=True):
+        return None
+    return time.time() - _engine.built_at
+
+
+def sample_points(spacing_km=1.5, max_radius_km=15.0):
+    """Coarse lattice of (lat, lng) points around the shop to sample with Distance Matrix."""
+    points = []
+    steps = int(max_radius_km // spacing_km)
+    for i in range(-steps, steps + 1):
+        for j in range(-steps, steps + 1):
+            lat = SHOP_LAT + i * spacing_km / KM_PER_DEG_LAT
+            lng = SHOP_LNG + j * spacing_km / KM_PER_DEG_LNG
+            if in_service_area(lat, lng) and 0.3 < _haversine_scalar(lat, lng) <= max_radius_km:
+                points.append((lat, lng))
+    return points
+
+
+def stale_cells(points):
+    """Filter sample points whose grid cell has no unexpired cached road distance."""
+    from .geocache import grid_cell
+    from .models import DistanceCache
+
+    known = set(
+        DistanceCache.objects.filter(expires_at__gt=timezone.now(), source='google').values_list('cell_key', flat=True)
+    )
+    return [p for p in points if grid_cell(*p) not in known]
+
+
+def fetch_samples(points, api_key, batch_size=25, max_requests=None):
+    """
+    Fetch road distances for sample points from the Distance Matrix API
+    (up to 25 destinations per request) and store them in DistanceCache.
+
+    Returns the number of samples stored.
+    """
+    import requests
+    from . import geocache
+
+    stored = 0
+    origin = f"{SHOP_LAT},{SHOP_LNG}"
+    for request_number, start in enumerate(range(0, len(points), batch_size)):
+        if max_requests is not None and request_number >= max_requests:
+            break
+        batch = points[start:start + batch_size]
+        destinations = '|'.join(f"{lat:.6f},{lng:.6f}" for lat, lng in batch)
+        try:
+            response = requests.get(
+                "https://maps.googleapis.com/maps/api/distancematrix/json",
+                params={'origins': origin, 'destinations': destinations, 'mode': 'driving', 'key': api_key},
+                timeout=10,
+            )
+            data = response.json()
+        except Exception as e:
+            logger.error(f"Distance Matrix sampling failed: {e}")
+            continue
+        if data.get('status') != 'OK' or not data.get('rows'):
+            logger.error(f"Distance Matrix sampling error: {data.get('status')}")
+            continue
+        for (lat, lng), element in zip(batch, data['rows'][0]['elements']):
+            if element.get('status') == 'OK':
+                geocache.store_distance(lat, lng, round(element['distance']['value'] / 1000.0, 2), source='google')
+                stored += 1
+    return stored
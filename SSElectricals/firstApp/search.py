@@ -0,0 +1,77 @@
+"""
+Product search shared by product_list, ajax_search and search_products_api.
+
+On PostgreSQL products are matched against the stored ``search_vector``
+(tsvector, GIN-indexed) with prefix terms, plus pg_trgm similarity on the name
+for typo tolerance, and ranked by ts_rank + similarity. Other databases (local
+SQLite development) fall back to icontains over the plain-text fields.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connection
+from django.db.models import F, Q
+
+
+SEARCH_CONFIG = 'english'
+
+
+def uses_full_text():
+    """Full-text search needs PostgreSQL (tsvector + pg_trgm)."""
+    return connection.vendor == 'postgresql'
+
+
+def product_search_vector():
+    """Weighted document for a product: name/brand (A), summary (B), HTML description (C)."""
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('brand', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('short_description', weight='B', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def refresh_search_vector(product_ids):
+    """Recompute search_vector for the given products with a single UPDATE."""
+    if not uses_full_text():
+        return
+    from .models import Product
+    Product.objects.filter(pk__in=product_ids).update(search_vector=product_search_vector())
+
+
+def _prefix_tsquery(query):
+    """Turn free text into a raw tsquery of AND-ed prefix terms: 'led bulb' -> 'led:* & bulb:*'."""
+    terms = re.findall(r'\w+', query.lower())
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def search_products(queryset, query):
+    """
+    Filter and rank a Product queryset by a search string.
+
+    Returns the queryset unchanged for an empty query. Results are ordered by
+    relevance; slice the result for typeahead use.
+    """
+    query = (query or '').strip()
+    if not query:
+        return queryset
+
+    if not uses_full_text():
+        return queryset.filter(
+            Q(name__icontains=query) | Q(brand__icontains=query) | Q(short_description__icontains=query)
+        ).order_by('name', 'id')
+
+    similarity = TrigramSimilarity('name', query)
+    raw_query = _prefix_tsquery(query)
+    if not raw_query:
+        # Only punctuation typed: nothing for the tsvector, rely on trigram match
+        return queryset.filter(name__trigram_similar=query).annotate(
+            search_rank=similarity
+        ).order_by('-search_rank', 'id')
+
+    ts_query = SearchQuery(raw_query, search_type='raw', config=SEARCH_CONFIG)
+    return queryset.filter(
+        Q(search_vector=ts_query) | Q(name__trigram_similar=query)
+    ).annotate(
+        search_rank=SearchRank(F('search_vector'), ts_query) + similarity
+    ).order_by('-search_rank', 'id')
@@ -0,0 +1,24 @@
+"""
+Template helpers for resized images (see firstApp/images.py).
+
+    {% load image_tags %}
+    {% picture product.image 'card' class="card-img-top" alt=product.name %}
+    <a href="{{ review.image|image_url:'detail' }}">
+"""
+from django import template
+
+from firstApp import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def picture(image, variant='card', sizes=None, **attrs):
+    """<picture> with WebP/JPEG srcsets for an image field; extra keyword arguments become <img> attributes."""
+    return images.picture(image, variant, sizes=sizes, attrs=attrs)
+
+
+@register.filter
+def image_url(image, variant='detail'):
+    """URL of one variant of an image field (JPEG), or of the original until it is built."""
+    return images.url(image, variant)
@@ -0,0 +1,238 @@
+"""
+In-process typeahead index for ajax_search.
+
+Each worker keeps the visible products (id, name, brand, final price, image
+URL) in memory with a token-prefix map, so keystroke suggestions are answered
+without a database query.
+
+Freshness:
+- Product post_save/post_delete receivers (admin.py) patch this worker's index
+  directly and bump a version counter in the shared cache, recording which
+  product changed under that version.
+- Other workers compare their local version with the cache on each lookup and
+  reload only the changed products; if the change log has expired they rebuild
+  the whole index in a background thread and keep serving the previous one.
+- While the index is cold (new worker) lookups return None and the caller uses
+  the database search path.
+"""
+import logging
+import re
+import threading
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'typeahead:version'
+CHANGE_KEY = 'typeahead:change:{}'
+CHANGE_TTL = 60 * 60  # 1 hour
+MAX_CATCH_UP = 100  # beyond this many missed changes, rebuild instead of patching
+MIN_PREFIX = 2
+MAX_PREFIX = 12
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def _tokens(text):
+    return _TOKEN_RE.findall((text or '').lower())
+
+
+def _matches(entry, term):
+    """True if a name/brand token of entry starts with term (False for a vanished entry)."""
+    return bool(entry) and any(tok.startswith(term) for tok in _tokens(entry['name']) + _tokens(entry['brand']))
+
+
+class TypeaheadIndex:
+    """
+    Token-prefix index over visible products. Reads are lock-free; writes hold a lock.
+
+    Live writes (apply/discard) never mutate a prefix set in place: they store a
+    new set under the key, so a concurrent suggest() iterating the old one is
+    unaffected. rebuild() fills private structures and swaps them in whole.
+    """
+
+    def __init__(self):
+        self.version = None  # None = cold
+        self.entries = {}
+        self.prefixes = {}
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    # ---- building ----
+
+    @staticmethod
+    def _entry(product):
+        return {
+            'id': product.id,
+            'name': product.name,
+            'brand': product.brand or '',
+            'price': float(product.final_price),
+            'image': product.image.url if product.image else '',
+        }
+
+    def _add(self, entry, prefixes, in_place=False):
+        for token in set(_tokens(entry['name']) + _tokens(entry['brand'])):
+            for size in range(MIN_PREFIX, min(len(token), MAX_PREFIX) + 1):
+                key = token[:size]
+                if in_place:  # only for an index nobody is reading yet
+                    prefixes.setdefault(key, set()).add(entry['id'])
+                else:
+                    prefixes[key] = prefixes.get(key, frozenset()) | {entry['id']}
+
+    def _remove(self, product_id, prefixes):
+        old = self.entries.get(product_id)
+        if not old:
+            return
+        for token in set(_tokens(old['name']) + _tokens(old['brand'])):
+            for size in range(MIN_PREFIX, min(len(token), MAX_PREFIX) + 1):
+                key = token[:size]
+                ids = prefixes.get(key)
+                if ids and product_id in ids:
+                    remaining = ids - {product_id}
+                    if remaining:
+                        prefixes[key] = remaining
+                    else:
+                        prefixes.pop(key, None)
+
+    def rebuild(self):
+        """Load all visible products from the database and swap in a fresh index."""
+        from .models import Product
+        version = _remote_version()
+        products = Product.objects.filter(is_visible_on_website=True).only(
+            'id', 'name', 'brand', 'price', 'discount_price', 'image'
+        )
+        entries, prefixes = {}, {}
+        for product in products.iterator(chunk_size=1000):
+            entry = self._entry(product)
+            entries[entry['id']] = entry
+            self._add(entry, prefixes, in_place=True)
+        with self._lock:
+            self.entries, self.prefixes, self.version = entries, prefixes, version
+            self._rebuilding = False
+
+    def rebuild_in_background(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._safe_rebuild, daemon=True).start()
+
+    def _safe_rebuild(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception("Typeahead index rebuild failed")
+            with self._lock:
+                self._rebuilding = False
+
+    def apply(self, product):
+        """Insert/replace one product (or drop it if no longer visible)."""
+        with self._lock:
+            self._remove(product.id, self.prefixes)
+            self.entries.pop(product.id, None)
+            if product.is_visible_on_website:
+                entry = self._entry(product)
+                self.entries[entry['id']] = entry
+                self._add(entry, self.prefixes)
+
+    def discard(self, product_id):
+        with self._lock:
+            self._remove(product_id, self.prefixes)
+            self.entries.pop(product_id, None)
+
+    def catch_up(self, remote):
+        """Reload the products changed between our version and the cache's version."""
+        from .models import Product
+        missed = remote - self.version
+        if missed <= 0 or missed > MAX_CATCH_UP:
+            self.rebuild_in_background()
+            return
+        keys = [CHANGE_KEY.format(v) for v in range(self.version + 1, remote + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            self.rebuild_in_background()
+            return
+        changed_ids = set(changes.values())
+        fresh = {p.id: p for p in Product.objects.filter(pk__in=changed_ids)}
+        for product_id in changed_ids:
+            if product_id in fresh:
+                self.apply(fresh[product_id])
+            else:
+                self.discard(product_id)
+        self.version = remote
+
+    # ---- querying ----
+
+    def suggest(self, query, limit=5):
+        """Return up to `limit` entries whose name/brand tokens start with every query token."""
+        terms = [t for t in _tokens(query) if len(t) >= MIN_PREFIX]
+        if not terms:
+            return []
+        prefixes, entries = self.prefixes, self.entries
+        candidates = None
+        for term in terms:
+            ids = prefixes.get(term[:MAX_PREFIX], set())
+            if len(term) > MAX_PREFIX:
+                ids = {i for i in ids if _matches(entries.get(i), term)}
+            candidates = ids if candidates is None else candidates & ids
+            if not candidates:
+                return []
+        query_lower = query.strip().lower()
+        # .get: a product discarded since the prefix lookup just drops out
+        found = [entry for entry in map(entries.get, candidates) if entry]
+        ranked = sorted(
+            found,
+            key=lambda e: (not e['name'].lower().startswith(query_lower), e['name'].lower(), e['id'])
+        )
+        return ranked[:limit]
+
+
+_index = TypeaheadIndex()
+
+
+def _remote_version():
+    return cache.get_or_set(VERSION_KEY, 0, None)
+
+
+def _bump_version(product_id):
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 0, None)
+        version = cache.incr(VERSION_KEY)
+    cache.set(CHANGE_KEY.format(version), product_id, CHANGE_TTL)
+    return version
+
+
+def suggest(query, limit=5):
+    """
+    Typeahead suggestions from the in-memory index.
+
+    Returns None when the index is cold so the caller can fall back to the
+    database; the index is then built in the background.
+    """
+    if _index.version is None:
+        _index.rebuild_in_background()
+        return None
+    remote = _remote_version()
+    if remote != _index.version:
+        _index.catch_up(remote)
+    return _index.suggest(query, limit)
+
+
+def product_saved(product):
+    """Product post_save hook: patch the local index and publish the change."""
+    version = _bump_version(product.id)
+    if _index.version is not None:
+        _index.apply(product)
+        if _index.version == version - 1:
+            _index.version = version
+
+
+def product_deleted(product_id):
+    """Product post_delete hook: drop it locally and publish the change."""
+    version = _bump_version(product_id)
+    if _index.version is not None:
+        _index.discard(product_id)
+        if _index.version == version - 1:
+            _index.version = version
@@ -60,6 +60,8 @@ urlpatterns = [
     path('shop-admin/activity-log/', admin_views.admin_activity_log_view, name='admin_activity_log'),
     path('shop-admin/terminate-session/<int:session_id>/', admin_views.terminate_session, name='terminate_session'),
     path('shop-admin/analytics/', admin_views.admin_analytics_new, name='admin_analytics'),
+    path('shop-admin/analytics/files/', admin_views.admin_analytics_files, name='admin_analytics_files'),
+    path('shop-admin/analytics/files/rows/', admin_views.admin_analytics_file_rows, name='admin_analytics_file_rows'),
     path('shop-admin/analytics/delete/', admin_views.admin_delete_analytics_file, name='admin_delete_analytics_file'),
     
      # Receipt Management
@@ -70,10 +72,12 @@ urlpatterns = [
     path('shop-admin/receipt/<int:receipt_id>/void/', views.void_receipt, name='void_receipt'),
     path('shop-admin/receipt/<int:receipt_id>/correct/', views.create_correction, name='create_correction'),
     path('shop-admin/receipt/<int:receipt_id>/pdf/', views.receipt_pdf, name='receipt_pdf'),
+    path('shop-admin/receipt/pdf/batch/', views.receipt_pdf_batch, name='receipt_pdf_batch'),
     path('api/products/search/', views.search_products_api, name='search_products_api'),
     
     # Order Receipt
     path('shop-admin/orders/<int:order_id>/receipt-print/', views.order_receipt_print, name='order_receipt_print'),
+    path('shop-admin/orders/<int:order_id>/receipt-pdf/', views.order_receipt_pdf, name='order_receipt_pdf'),
     
     # Admin Product Management
     path('shop-admin/products/', admin_views.admin_product_list, name='admin_product_list'),
@@ -111,6 +115,8 @@ urlpatterns = [
     path('shop-admin/expenses/delete/<int:pk>/', admin_views.admin_delete_daily_expense, name='admin_delete_daily_expense'),
     path('shop-admin/expenses/export/', admin_views.admin_export_expenses, name='admin_export_expenses'),
     path('shop-admin/expenses/upload/', admin_views.admin_upload_expenses, name='admin_upload_expenses'),
+    path('shop-admin/import-errors/<str:token>/', admin_views.admin_import_error_report, name='admin_import_error_report'),
+    path('shop-admin/exports/<str:token>/', admin_views.admin_export_download, name='admin_export_download'),
     
     # Appointment URLs
     path('book-appointment/', views.book_appointment, name='book_appointment'),
@@ -118,6 +124,7 @@ urlpatterns = [
     path('my-appointments/', views.my_appointments, name='my_appointments'),
     path('cancel-appointment/<int:pk>/', views.cancel_appointment, name='cancel_appointment'),
     path('api/service-price/', views.get_service_price, name='get_service_price'),
+    path('api/service-prices/', views.service_price_matrix, name='service_price_matrix'),
     
     # Admin Appointment URLs
     path('shop-admin/appointments/', admin_views.admin_appointment_list, name='admin_appointment_list'),
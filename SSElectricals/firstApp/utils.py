@@ -1,6 +1,7 @@
 from django.core.mail import EmailMultiAlternatives
 from django.conf import settings
 from django.utils.html import strip_tags
+from . import priority_mail
 
 def mask_email(email):
     """
@@ -138,10 +139,10 @@ Shiv Shakti Electrical, Indore (M.P.)
     try:
         msg = EmailMultiAlternatives(subject, text_content, email_from, recipient_list)
         msg.attach_alternative(html_content, "text/html")
-        msg.send()
-        return True
+        # Delivered in the background over a pooled SMTP connection (see priority_mail.py)
+        return priority_mail.enqueue(msg, 'OTP_VERIFICATION')
     except Exception as e:
-        print(f"Error sending email: {e}")
+        print(f"Error queueing email: {e}")
         return False
 
 def send_onetap_login_email(email, login_url):
@@ -271,10 +272,9 @@ Shiv Shakti Electrical, Indore (M.P.)
     try:
         msg = EmailMultiAlternatives(subject, text_content, email_from, recipient_list)
         msg.attach_alternative(html_content, "text/html")
-        msg.send()
-        return True
+        return priority_mail.enqueue(msg, 'LOGIN_LINK')
     except Exception as e:
-        print(f"Error sending one-tap login email: {e}")
+        print(f"Error queueing one-tap login email: {e}")
         return False
 
 def send_order_status_email(order):
@@ -295,25 +295,92 @@ from geopy.geocoders import Nominatim
 from geopy.distance import geodesic
 from django.conf import settings
 import requests
+from . import geocache
 
 # Approximate location for Shiv Shakti Electrical, Indore
 SHOP_LAT = 22.7624113
 SHOP_LNG = 75.8692938
 
+def _google_geocode(search_address, api_key):
+    """Google Geocoding API -> (lat, lng), or None if the address was not found or the call failed."""
+    try:
+        geocode_url = f"https://maps.googleapis.com/maps/api/geocode/json?address={requests.utils.quote(search_address)}&key={api_key}&region=in"
+        
+        print(f"[Distance Calc] Calling Geocoding API...")
+        geocode_response = requests.get(geocode_url, timeout=10)
+        geocode_data = geocode_response.json()
+        
+        print(f"[Distance Calc] Geocoding status: {geocode_data.get('status', 'Unknown')}")
+        
+        if geocode_data['status'] == 'OK' and geocode_data['results']:
+            location = geocode_data['results'][0]['geometry']['location']
+            print(f"[Distance Calc] Geocoded to: {location['lat']}, {location['lng']}")
+            return location['lat'], location['lng']
+        
+        error_msg = geocode_data.get('error_message', geocode_data.get('status', 'No results'))
+        print(f"[Distance Calc] Geocoding failed: {error_msg}")
+    except requests.exceptions.Timeout:
+        print("[Distance Calc] Google Geocoding Timeout!")
+    except Exception as e:
+        print(f"[Distance Calc] Google Geocoding Exception: {e}")
+    return None
+
+
+def _google_road_distance(user_lat, user_lng, api_key):
+    """Google Distance Matrix API -> driving distance from the shop in km, or None."""
+    try:
+        origin = f"{SHOP_LAT},{SHOP_LNG}"
+        destination = f"{user_lat},{user_lng}"
+        
+        distance_url = f"https://maps.googleapis.com/maps/api/distancematrix/json?origins={origin}&destinations={destination}&mode=driving&key={api_key}"
+        
+        print(f"[Distance Calc] Calling Distance Matrix API...")
+        distance_response = requests.get(distance_url, timeout=10)
+        distance_data = distance_response.json()
+        
+        print(f"[Distance Calc] Distance Matrix status: {distance_data.get('status', 'Unknown')}")
+        
+        if distance_data['status'] != 'OK':
+            print(f"[Distance Calc] Distance Matrix API Error: {distance_data}")
+            return None
+        
+        if distance_data['rows'] and distance_data['rows'][0]['elements']:
+            element = distance_data['rows'][0]['elements'][0]
+            
+            print(f"[Distance Calc] Element status: {element.get('status', 'Unknown')}")
+            
+            if element['status'] == 'OK':
+                # Road distance in meters to km
+                distance_km = round(element['distance']['value'] / 1000.0, 2)  # Round to 2 decimals
+                
+                # Duration info
+                duration_text = element.get('duration', {}).get('text', 'N/A')
+                print(f"[OK] [Distance Calc] ROAD Distance: {distance_km} KM, ETA: {duration_text}")
+                return distance_km
+            
+            print(f"[Distance Calc] Element Error: {element['status']}")
+    except requests.exceptions.Timeout:
+        print("[Distance Calc] Distance Matrix Timeout!")
+    except Exception as e:
+        print(f"[Distance Calc] Distance Matrix Exception: {e}")
+    return None
+
+
 def calculate_distance_and_price(user_address):
     """
     Calculate ROAD distance using Google Maps Distance Matrix API.
     This gives actual driving distance, not straight-line distance.
     
+    Geocoding results (by normalized address) and road distances (by ~110 m
+    grid cell) are cached in geocache.py, so repeat addresses and nearby
+    customers resolve without any outbound call. Uncached points are estimated
+    from the offline road-factor grid (road_distance.py) when one has been built.
+    
     Returns: (distance_km, price, error_message, latitude, longitude)
     """
     # Use server API key for backend calls (no HTTP referer restrictions)
     api_key = getattr(settings, 'GOOGLE_SERVER_API_KEY', None) or getattr(settings, 'GOOGLE_PLACES_API_KEY', None)
     
-    user_lat = None
-    user_lng = None
-    distance_km = 0
-    
     # Ensure Indore is in the address for accurate results
     search_address = user_address
     if "indore" not in search_address.lower():
@@ -323,80 +390,49 @@ def calculate_distance_and_price(user_address):
     
     print(f"[Distance Calc] Input: '{user_address}' -> Search: '{search_address}'")
     
-    # Try Google APIs if key exists
-    if api_key:
-        try:
-            # Step 1: Geocode the address to get coordinates
-            geocode_url = f"https://maps.googleapis.com/maps/api/geocode/json?address={requests.utils.quote(search_address)}&key={api_key}&region=in"
-            
-            print(f"[Distance Calc] Calling Geocoding API...")
-            geocode_response = requests.get(geocode_url, timeout=10)
-            geocode_data = geocode_response.json()
-            
-            print(f"[Distance Calc] Geocoding status: {geocode_data.get('status', 'Unknown')}")
-            
-            if geocode_data['status'] == 'OK' and geocode_data['results']:
-                location = geocode_data['results'][0]['geometry']['location']
-                user_lat = location['lat']
-                user_lng = location['lng']
-                
-                print(f"[Distance Calc] Geocoded to: {user_lat}, {user_lng}")
-                
-                # Validate the result is in Indore area (approximate bounds check)
-                if not (22.5 <= user_lat <= 23.0 and 75.5 <= user_lng <= 76.2):
-                    print(f"[Distance Calc] WARNING: Location outside Indore bounds!")
-                    return 0, 0, "Address appears to be outside Indore service area. Please verify.", user_lat, user_lng
-                
-                # Step 2: Use Distance Matrix API for ROAD distance
-                origin = f"{SHOP_LAT},{SHOP_LNG}"
-                destination = f"{user_lat},{user_lng}"
-                
-                distance_url = f"https://maps.googleapis.com/maps/api/distancematrix/json?origins={origin}&destinations={destination}&mode=driving&key={api_key}"
-                
-                print(f"[Distance Calc] Calling Distance Matrix API...")
-                distance_response = requests.get(distance_url, timeout=10)
-                distance_data = distance_response.json()
-                
-                print(f"[Distance Calc] Distance Matrix status: {distance_data.get('status', 'Unknown')}")
-                
-                if distance_data['status'] == 'OK':
-                    if distance_data['rows'] and distance_data['rows'][0]['elements']:
-                        element = distance_data['rows'][0]['elements'][0]
-                        
-                        print(f"[Distance Calc] Element status: {element.get('status', 'Unknown')}")
-                        
-                        if element['status'] == 'OK':
-                            # Road distance in meters to km
-                            distance_value = element['distance']['value']
-                            distance_km = round(distance_value / 1000.0, 2)  # Round to 2 decimals
-                            
-                            # Duration info
-                            duration_text = element.get('duration', {}).get('text', 'N/A')
-                            print(f"[OK] [Distance Calc] ROAD Distance: {distance_km} KM, ETA: {duration_text}")
-                            
-                            return _calculate_price(distance_km, user_lat, user_lng)
-                        else:
-                            print(f"[Distance Calc] Element Error: {element['status']}")
-                            # Fall through to geodesic calculation
-                else:
-                    print(f"[Distance Calc] Distance Matrix API Error: {distance_data}")
-                    # Fall through to geodesic calculation
-            else:
-                error_msg = geocode_data.get('error_message', geocode_data.get('status', 'No results'))
-                print(f"[Distance Calc] Geocoding failed: {error_msg}")
-                # Fall through to Geopy fallback
-                
-        except requests.exceptions.Timeout:
-            print("[Distance Calc] Google API Timeout!")
-        except Exception as e:
-            print(f"[Distance Calc] Google API Exception: {e}")
-            # Fall through to Geopy fallback
+    # Step 1: Coordinates (cache, then Google Geocoding)
+    coords = geocache.get_coordinates(search_address)
+    if coords == geocache.NOT_FOUND:
+        # Recently failed with every geocoder; don't ask them again yet
+        print(f"[Distance Calc] Geocode cache: address could not be located")
+        return 0, 0, "Address could not be located. Please provide a valid Indore address with landmark.", None, None
+    elif coords is not None:
+        print(f"[Distance Calc] Geocode cache hit: {coords}")
+    elif api_key:
+        coords = _google_geocode(search_address, api_key)
+        if coords:
+            geocache.store_coordinates(search_address, coords[0], coords[1], source='google')
     else:
         print("[Distance Calc] No API key found, using Geopy fallback")
     
-    # Fallback 1: If we have coordinates but Distance Matrix failed, use geodesic
-    if user_lat and user_lng:
-        from geopy.distance import geodesic
+    if coords:
+        user_lat, user_lng = coords
+        
+        # Validate the result is in Indore area (approximate bounds check)
+        if not (22.5 <= user_lat <= 23.0 and 75.5 <= user_lng <= 76.2):
+            print(f"[Distance Calc] WARNING: Location outside Indore bounds!")
+            return 0, 0, "Address appears to be outside Indore service area. Please verify.", user_lat, user_lng
+        
+        # Step 2: ROAD distance (cache, then Distance Matrix)
+        distance_km = geocache.get_distance(user_lat, user_lng)
+        if distance_km is not None:
+            print(f"[OK] [Distance Calc] Distance cache hit: {distance_km} KM")
+            return _calculate_price(distance_km, user_lat, user_lng)
+        
+        # Offline estimate from the precomputed road-factor grid (no outbound call)
+        from .road_distance import estimate_distance_km
+        distance_km = estimate_distance_km(user_lat, user_lng)
+        if distance_km is not None:
+            print(f"[OK] [Distance Calc] Grid estimate: {distance_km} KM")
+            return _calculate_price(distance_km, user_lat, user_lng)
+        
+        if api_key:
+            distance_km = _google_road_distance(user_lat, user_lng, api_key)
+            if distance_km is not None:
+                geocache.store_distance(user_lat, user_lng, distance_km, source='google')
+                return _calculate_price(distance_km, user_lat, user_lng)
+        
+        # Fallback 1: If we have coordinates but Distance Matrix failed, use geodesic
         user_coords = (user_lat, user_lng)
         shop_coords = (SHOP_LAT, SHOP_LNG)
         distance_km = round(geodesic(shop_coords, user_coords).km, 2)  # Round to 2 decimals
@@ -405,9 +441,6 @@ def calculate_distance_and_price(user_address):
     
     # Fallback 2: Geopy (Nominatim) for geocoding + geodesic distance
     try:
-        from geopy.geocoders import Nominatim
-        from geopy.distance import geodesic
-        
         print("[Distance Calc] Using Geopy fallback for geocoding...")
         geolocator = Nominatim(user_agent="sselectricals_app_v2", timeout=10)
         
@@ -434,10 +467,12 @@ def calculate_distance_and_price(user_address):
                 print(f"[Distance Calc] WARNING: Geopy distance too far ({distance_km}km)")
                 return 0, 0, f"Address location seems incorrect (calculated: {distance_km} KM). Please verify or use a landmark.", None, None
             
+            geocache.store_coordinates(search_address, location.latitude, location.longitude, source='nominatim')
             print(f"[WARN] [Distance Calc] Geopy GEODESIC: {distance_km} KM (straight-line)")
             return _calculate_price(distance_km, location.latitude, location.longitude)
         else:
             print(f"[Distance Calc] Geopy geocoding failed for: {search_query}")
+            geocache.store_coordinates(search_address, None, None, source='nominatim')
             return 0, 0, "Address could not be located. Please provide a valid Indore address with landmark.", None, None
             
     except Exception as e:
@@ -446,21 +481,10 @@ def calculate_distance_and_price(user_address):
 
 
 def _calculate_price(distance_km, lat=None, lng=None):
-    """Calculate delivery price based on distance."""
-    # Ensure distance is rounded to 2 decimal places
-    distance_km = round(float(distance_km), 2)
-    price = 0
-    
-    if distance_km <= 3:
-        price = 50
-    elif distance_km <= 5:
-        price = 70
-    elif distance_km <= 7:
-        price = 80
-    else:
-        return distance_km, 0, f"Out of delivery range. Distance: {distance_km} KM (max 7 KM).", lat, lng
-    
-    return distance_km, price, None, lat, lng
+    """Calculate delivery price based on distance (slabs in pricing.DELIVERY_TIERS)."""
+    from .pricing import quote_delivery
+    distance_km, price, error = quote_delivery(distance_km)
+    return distance_km, price, error, lat, lng
 
 
 
@@ -6,6 +6,7 @@ from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Q
+from django.db import transaction
 from datetime import timedelta
 from .models import EmailLoginToken
 from .utils import send_onetap_login_email, mask_email, get_client_ip
@@ -15,6 +16,11 @@ from .models import (
 )
 from .forms import CustomUserCreationForm, CustomUserUpdateForm, CheckoutForm, AppointmentForm, EmailSignupForm, EmailLoginForm, OTPVerificationForm, AccountDeletionForm, ForgotPasswordForm, ResetPasswordForm, CancelOrderForm, ReviewForm
 from .utils import send_otp_email, calculate_distance_and_price
+from .road_distance import estimate_distance_km
+from . import pricing
+from . import cart_checkout
+from . import images
+from .context_processors import invalidate_header_summary
 import requests
 from django.conf import settings
 
@@ -23,6 +29,8 @@ from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 from .models import OfflineReceipt, ReceiptItem
 from .forms_receipt import ReceiptForm, ReceiptItemFormSet, VoidReceiptForm, ReceiptFilterForm
 
@@ -42,9 +50,6 @@ def create_receipt(request):
             formset.instance = receipt
             formset.save()
             
-            # Generate QR code
-            receipt.generate_qr_code()
-            
             messages.success(request, f'Receipt {receipt.receipt_number} created successfully!')
             return redirect('receipt_print', receipt_id=receipt.id)
     else:
@@ -132,9 +137,8 @@ def search_products_api(request):
     if len(query) < 2:
         return JsonResponse({'products': []})
     
-    products = Product.objects.filter(
-        Q(name__icontains=query) | Q(brand__icontains=query)
-    )[:10]  # Limit to 10 results
+    from .search import search_products
+    products = search_products(Product.objects.all(), query)[:10]  # Limit to 10 results
     
     products_data = [{
         'id': product.id,
@@ -190,10 +194,43 @@ def create_correction(request, receipt_id):
 @staff_member_required  
 def receipt_pdf(request, receipt_id):
     """Generate PDF for receipt"""
-    # TODO: Implement PDF generation using reportlab or weasyprint
-    receipt = get_object_or_404(OfflineReceipt, id=receipt_id)
-    # For now, redirect to print view
-    return redirect('receipt_print', receipt_id=receipt.id)
+    from . import receipt_pdf as pdf
+
+    receipt = get_object_or_404(OfflineReceipt.objects.prefetch_related('items'), id=receipt_id)
+    return pdf.pdf_response(pdf.from_offline(receipt, pdf.get_layout().currency))
+
+
+@staff_member_required
+def receipt_pdf_batch(request):
+    """
+    All receipts of a financial year and/or date range as one PDF or a zip of PDFs.
+
+    GET: kind=offline|orders, format=pdf|zip, financial_year, date_from, date_to
+    (the receipt list filters).
+    """
+    from . import receipt_pdf as pdf
+
+    filter_form = ReceiptFilterForm(request.GET)
+    if not filter_form.is_valid():
+        messages.error(request, "Invalid filters for the PDF export.")
+        return redirect('receipt_list')
+    filters = filter_form.cleaned_data
+    if not (filters.get('financial_year') or filters.get('date_from') or filters.get('date_to')):
+        messages.error(request, "Choose a financial year or a date range to export.")
+        return redirect('receipt_list')
+
+    kind = 'orders' if request.GET.get('kind') == 'orders' else 'offline'
+    queryset = pdf.batch_queryset(
+        kind,
+        financial_year=filters.get('financial_year'),
+        date_from=filters.get('date_from'),
+        date_to=filters.get('date_to'),
+    )
+    label = filters.get('financial_year') or f"{filters.get('date_from') or 'start'}_{filters.get('date_to') or 'today'}"
+    filename = f"{'order_receipts' if kind == 'orders' else 'receipts'}_{label}".replace('/', '-')
+    if request.GET.get('format') == 'zip':
+        return pdf.batch_zip_response(kind, queryset, filename)
+    return pdf.batch_pdf_response(kind, queryset, filename)
 
 
 @login_required
@@ -212,6 +249,18 @@ def order_receipt_print(request, order_id):
     })
 
 
+@login_required
+def order_receipt_pdf(request, order_id):
+    """Order receipt as a PDF (owner or staff)"""
+    from . import receipt_pdf as pdf
+
+    order = get_object_or_404(Order.objects.select_related('user').prefetch_related('items__product'), id=order_id)
+    if not request.user.is_staff and order.user != request.user:
+        messages.error(request, "Access denied. This receipt belongs to another user.")
+        return redirect('home')
+    return pdf.pdf_response(pdf.from_order(order, pdf.get_layout().currency))
+
+
 @login_required
 def order_receipt(request, order_id):
     """
@@ -353,13 +402,15 @@ def google_login_redirect(request):
 @login_required
 def checkout(request):
     cart, created = Cart.objects.get_or_create(user=request.user)
-    if not cart.items.exists():
+    # Lines and products are loaded once and reused for the checks, the total and the order
+    contents = cart_checkout.CartContents(cart)
+    if not contents:
         messages.warning(request, "Your cart is empty.")
         return redirect('product_list')
 
     # Initial estimates
     delivery_charge = 0 # Will be calculated on POST
-    total_amount = cart.total_price 
+    total_amount = contents.total_price 
     dist_km = 0
 
     if request.method == 'POST':
@@ -368,11 +419,11 @@ def checkout(request):
             # Get fulfillment type
             fulfillment_type = form.cleaned_data.get('fulfillment_type', 'DELIVERY')
             
-            # Check stock availability
-            for item in cart.items.all():
-                if item.product.stock_quantity < item.quantity:
-                    messages.error(request, f"{item.product.name} is out of stock.")
-                    return redirect('view_cart')
+            # Check stock availability (re-checked under lock when the order is placed)
+            short = contents.short_products()
+            if short:
+                messages.error(request, f"{short[0]} is out of stock.")
+                return redirect('view_cart')
             
             # Initialize variables
             full_address = ""
@@ -422,71 +473,62 @@ def checkout(request):
                     except ValueError:
                         dist_km, _, error_msg, lat, lng = calculate_distance_and_price(search_address)
                 else:
-                    dist_km, _, error_msg, lat, lng = calculate_distance_and_price(search_address)
+                    dist_km = None
+                    if lat_post and lng_post:
+                        # Client sent coordinates only: estimate road distance offline
+                        try:
+                            lat = float(lat_post)
+                            lng = float(lng_post)
+                            dist_km = estimate_distance_km(lat, lng)
+                        except ValueError:
+                            pass
+                    if dist_km is None:
+                        dist_km, _, error_msg, lat, lng = calculate_distance_and_price(search_address)
 
-                # Apply New Delivery Charge Rules
+                # Apply Delivery Charge Rules (pricing.DELIVERY_TIERS)
                 # 0-3 KM: 50, 3-5 KM: 70, 5-7 KM: 80, >7 or Fail: 0 (Pending)
                 if dist_km > 0:
-                    if dist_km <= 3.0:
-                        delivery_charge = 50
-                    elif dist_km <= 5.0:
-                        delivery_charge = 70
-                    elif dist_km <= 7.0:
-                        delivery_charge = 80
-                    else:
-                        delivery_charge = 0 # Out of range, admin to confirm
+                    delivery_charge = pricing.delivery_charge_for_distance(dist_km) or 0  # Out of range, admin to confirm
                 
                 delivery_charge = Decimal(str(delivery_charge))
 
                 # Free Delivery Logic: If user hasn't used free delivery yet AND within 2 KM
-                if request.user.free_delivery_used_count == 0 and dist_km <= 2.0:
+                if request.user.free_delivery_used_count == 0 and dist_km <= pricing.FREE_DELIVERY_MAX_KM:
                     delivery_charge = Decimal('0.00')
                     is_free_delivery = True
             
-            total_amount = cart.total_price + delivery_charge
+            total_amount = contents.total_price + delivery_charge
             
             # Get user notes from form
             user_notes = request.POST.get('user_notes', '')
 
-            # Create Enquiry-Based Order (prices hidden from user)
-            order = Order.objects.create(
-                user=request.user,
-                address=full_address,
-                latitude=lat,
-                longitude=lng,
-                # Fulfillment Type - PICKUP or DELIVERY
-                fulfillment_type=fulfillment_type,
-                # Enquiry-based: prices are 0 until admin confirms
-                total_price=Decimal('0.00'),  # Admin will set this
-                delivery_charge=Decimal('0.00'),  # Admin will set this (0 for pickup)
-                distance_km=dist_km,
-                final_price=None,
-                # Enquiry-based order status
-                order_type='enquiry',
-                status='Pending Enquiry',
-                pricing_confirmed=False,
-                user_notes=user_notes,
-                payment_method='COD',  # Default to COD
-                free_delivery_applied=False,
-                delivery_charge_status='ESTIMATED' if fulfillment_type == 'DELIVERY' else 'CONFIRMED'
-            )
-            
-            # Create Order Items (without prices - admin will set them)
-            for item in cart.items.all():
-                OrderItem.objects.create(
-                    order=order,
-                    product=item.product,
-                    quantity=item.quantity,
-                    price=Decimal('0.00')  # Price to be set by admin
+            # Create Enquiry-Based Order (prices hidden from user), its items and counters in one transaction
+            try:
+                order = cart_checkout.place_enquiry(
+                    request.user,
+                    contents,
+                    address=full_address,
+                    latitude=lat,
+                    longitude=lng,
+                    # Fulfillment Type - PICKUP or DELIVERY
+                    fulfillment_type=fulfillment_type,
+                    # Enquiry-based: prices are 0 until admin confirms
+                    total_price=Decimal('0.00'),  # Admin will set this
+                    delivery_charge=Decimal('0.00'),  # Admin will set this (0 for pickup)
+                    distance_km=dist_km,
+                    final_price=None,
+                    # Enquiry-based order status
+                    order_type='enquiry',
+                    status='Pending Enquiry',
+                    pricing_confirmed=False,
+                    user_notes=user_notes,
+                    payment_method='COD',  # Default to COD
+                    free_delivery_applied=False,
+                    delivery_charge_status='ESTIMATED' if fulfillment_type == 'DELIVERY' else 'CONFIRMED'
                 )
-                # NOTE: Stock is NOT reduced until admin confirms the order
-            
-            # Update User Enquiry Count
-            request.user.total_orders_count += 1
-            request.user.save()
-
-            # Clear Cart
-            cart.items.all().delete()
+            except cart_checkout.OutOfStock as e:
+                messages.error(request, f"{e.products[0]} is out of stock.")
+                return redirect('view_cart')
             
             # Success message based on fulfillment type
             if fulfillment_type == 'PICKUP':
@@ -518,8 +560,10 @@ def checkout(request):
     return render(request, 'firstApp/checkout.html', {
         'form': form, 
         'cart': cart, 
+        'cart_items': contents.items,
+        'cart_total': contents.total_price,
         'delivery_charge': "Calculated at checkout", 
-        'total_amount': cart.total_price,
+        'total_amount': contents.total_price,
         'is_first_order': is_free_delivery_eligible,  # Using same variable name for template compatibility
         'GOOGLE_PLACES_API_KEY': settings.GOOGLE_PLACES_API_KEY
     })
@@ -540,11 +584,11 @@ def confirm_delivery_otp(request):
             if order.delivery_otp and order.delivery_otp == otp.strip():
                 order.status = 'Delivered'
                 
-                # Generate receipt number if not exists
-                if not order.receipt_number:
-                    order.generate_receipt_number()
-                    
-                order.save()
+                # Number and save together, so a failed save doesn't use up a receipt number
+                with transaction.atomic():
+                    if not order.receipt_number:
+                        order.generate_receipt_number()
+                    order.save()
                 messages.success(request, f"Order #{order_id} marked as Delivered.")
             else:
                 messages.error(request, "Invalid OTP or Order not ready for delivery.")
@@ -558,13 +602,18 @@ def home(request):
     
     categories = Category.objects.all().order_by('name')
     # Filter Trending Products - only show visible products
-    trending_products = Product.objects.filter(
+    trending_products = list(Product.objects.filter(
         is_trending=True, 
         is_visible_on_website=True
-    ).order_by('-created_at')[:8]
+    ).order_by('-created_at')[:8])
     
     # Get electricians visible on home page
     electricians = Electrician.get_visible_electricians()
+
+    # Look up resized image variants for the whole page in one go
+    images.prefetch(
+        [c.image.name for c in categories] + [p.image.name for p in trending_products]
+    )
     
     # Context for template
     context = {
@@ -584,28 +633,47 @@ def home(request):
 
 
 def product_list(request):
+    from .catalog import paginate_catalogue, get_page_size
+    from .search import search_products
+
     # Only show products visible on website for regular users
     # Admin/staff can see all products in admin panel
-    products = Product.objects.filter(is_visible_on_website=True)
+    products = Product.objects.filter(is_visible_on_website=True).select_related('category')
     query = request.GET.get('q')
     category_id = request.GET.get('category')
     sort_by = request.GET.get('sort')
     
     if query:
-        products = products.filter(Q(name__icontains=query) | Q(description__icontains=query))
+        products = search_products(products, query)
+        if not sort_by:
+            sort_by = 'relevance'  # keep the search ranking order
     
     if category_id:
         products = products.filter(category_id=category_id)
         
-    if sort_by == 'price_low':
-        products = products.order_by('price')
-    elif sort_by == 'price_high':
-        products = products.order_by('-price')
-    elif sort_by == 'newest':
-        products = products.order_by('-created_at')
-        
+    # newest / price_low / price_high use keyset pagination (?after=<cursor>), others use ?page=N
+    catalogue_page = paginate_catalogue(
+        products,
+        sort_by,
+        cursor=request.GET.get('after'),
+        page_number=request.GET.get('page'),
+        page_size=get_page_size(request.GET.get('per_page')),
+    )
+
+    # Query string without pagination params, for building page links
+    base_params = request.GET.copy()
+    base_params.pop('after', None)
+    base_params.pop('page', None)
+
+    images.prefetch(p.image.name for p in catalogue_page.object_list)
+
     categories = Category.objects.all().order_by('name')
-    return render(request, 'firstApp/product_list.html', {'products': products, 'categories': categories})
+    return render(request, 'firstApp/product_list.html', {
+        'products': catalogue_page.object_list,
+        'catalogue_page': catalogue_page,
+        'base_query': base_params.urlencode(),
+        'categories': categories,
+    })
 
 def product_detail(request, pk):
     product = get_object_or_404(Product, pk=pk)
@@ -781,6 +849,7 @@ def add_to_cart(request, product_id):
     if not item_created:
         cart_item.quantity += 1
         cart_item.save()
+    invalidate_header_summary(request.user.pk)
     
     messages.success(request, f"{product.name} added to cart.")
     return redirect('view_cart')
@@ -806,6 +875,7 @@ def buy_now(request, product_id):
     
     # Add this product to cart
     CartItem.objects.create(cart=cart, product=product, quantity=1)
+    invalidate_header_summary(request.user.pk)
     
     # Redirect to checkout
     return redirect('checkout')
@@ -825,12 +895,14 @@ def update_cart(request, item_id):
             cart_item.save()
         else:
             cart_item.delete()
+        invalidate_header_summary(request.user.pk)
     return redirect('view_cart')
 
 @login_required
 def remove_from_cart(request, item_id):
     cart_item = get_object_or_404(CartItem, pk=item_id, cart__user=request.user)
     cart_item.delete()
+    invalidate_header_summary(request.user.pk)
     messages.success(request, "Item removed from cart.")
     return redirect('view_cart')
 
@@ -1192,7 +1264,6 @@ def get_service_price(request):
     Now uses the new ServiceType model with distance-based pricing.
     """
     from django.http import JsonResponse
-    from .models import ServiceType
     
     service_id = request.GET.get('service_id', '')
     distance_km = request.GET.get('distance_km', '')
@@ -1209,32 +1280,19 @@ def get_service_price(request):
             'error': 'Service ID is required'
         })
     
-    try:
-        service = ServiceType.objects.get(id=service_id, is_active=True)
-    except ServiceType.DoesNotExist:
+    # Compiled per-worker tier table: no database query per request
+    service = pricing.get_service(service_id)
+    if service is None:
         return JsonResponse({
             'success': False,
             'error': 'Service not found'
         })
     
     # Get pricing based on distance
-    charge, is_confirmed = service.get_charge_for_distance(distance)
+    charge, is_confirmed = pricing.charge_for_tiers(service, distance)
     
     # Determine which distance slab applies
-    distance_slab = 'default'
-    if distance is not None:
-        if distance <= 0.5:
-            distance_slab = '500m'
-        elif distance <= 1:
-            distance_slab = '1km'
-        elif distance <= 3:
-            distance_slab = '3km'
-        elif distance <= 5:
-            distance_slab = '5km'
-        elif distance <= 7:
-            distance_slab = '7km'
-        else:
-            distance_slab = 'above_7km'
+    distance_slab = pricing.distance_slab(distance)
     
     return JsonResponse({
         'success': True,
@@ -1245,13 +1303,34 @@ def get_service_price(request):
         'distance_slab': distance_slab,
         'charge': charge,
         'is_confirmed': is_confirmed,
-        'default_charge': float(service.default_charge),
+        'default_charge': service.default_charge,
         'requires_confirmation': service.pricing_mode == 'confirm',
         'message': 'Charges will be confirmed by admin after booking via call/email' if service.pricing_mode == 'confirm' else None,
     })
 
 
 
+def _price_matrix_etag(request):
+    return pricing.get_table().etag
+
+
+def _price_matrix_last_modified(request):
+    return pricing.get_table().last_modified
+
+
+@condition(etag_func=_price_matrix_etag, last_modified_func=_price_matrix_last_modified)
+def service_price_matrix(request):
+    """
+    API endpoint returning the full price matrix (every active service, its
+    distance slabs and the area price table) in one response.
+    The book appointment page downloads it once and prices locally; repeat
+    requests are answered with 304 Not Modified via ETag/Last-Modified.
+    """
+    response = HttpResponse(pricing.get_table().matrix_json, content_type='application/json')
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
 @login_required
 def my_appointments(request):
     appointments = Appointment.objects.filter(user=request.user).order_by('-created_at')
@@ -1318,6 +1397,7 @@ def ajax_add_to_cart(request):
                     return JsonResponse({'success': False, 'message': 'Maximum stock reached'})
                 cart_item.quantity += 1
                 cart_item.save()
+            invalidate_header_summary(request.user.pk)
             
             cart_count = cart.items.count()
             return JsonResponse({'success': True, 'cart_count': cart_count})
@@ -1345,6 +1425,7 @@ def ajax_update_cart(request):
                 cart_item.save()
             else:
                 cart_item.delete()
+            invalidate_header_summary(request.user.pk)
             
             cart = cart_item.cart
             cart_count = cart.items.count()
@@ -1364,13 +1445,22 @@ def ajax_update_cart(request):
 
 def ajax_search(request):
     """AJAX endpoint for search suggestions."""
+    from . import typeahead
+
     query = request.GET.get('q', '').strip()
     
     if len(query) < 2:
         return JsonResponse({ 'results': []})
     
-    products = Product.objects.filter(
-        Q(name__icontains=query) | Q(description__icontains=query)
+    # Served from the per-worker in-memory index; None means it is still warming up
+    results = typeahead.suggest(query)
+    if results is not None:
+        return JsonResponse({'results': results})
+
+    from .search import search_products
+    products = search_products(
+        Product.objects.filter(is_visible_on_website=True).only('id', 'name', 'brand', 'price', 'discount_price', 'image'),
+        query
     )[:5]
     
     results = []
@@ -1378,6 +1468,7 @@ def ajax_search(request):
         results.append({
             'id': product.id,
             'name': product.name,
+            'brand': product.brand or '',
             'price': float(product.final_price),
             'image': product.image.url if product.image else ''
         })